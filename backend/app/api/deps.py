@@ -1,8 +1,14 @@
-from collections.abc import Generator
+import os
+import secrets
+from collections.abc import AsyncGenerator, Generator
+from typing import Annotated
 
+from fastapi import Header, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db import SessionLocal
+from app.core.read_pin import pinned_to_primary, track_writes
+from app.db import AsyncSessionLocal, SessionLocal, read_session_factory
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -11,3 +17,25 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        # 書き込みを commit したら、このクライアントの読み取りをしばらくプライマリに向ける
+        track_writes(db, request)
+        yield db
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """読み取りだけのエンドポイント用（レプリカがあればそちら。書き込みの直後はプライマリ）"""
+    async with read_session_factory(pinned_to_primary(request))() as db:
+        yield db
+
+
+def require_admin(x_admin_token: Annotated[str | None, Header()] = None) -> None:
+    """管理 API 用のトークンチェック（ADMIN_TOKEN 未設定なら管理 API は無効）"""
+    expected = os.getenv("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from app.utils.response_cache import etag_matches
+from app.utils.storage import CONTENT_TYPES, LOCAL_OBJECT_NAME, get_local_storage
+
+# STORAGE_BACKEND=local のときだけ /api/v1 の外（MEDIA_BASE_URL）に置く
+router = APIRouter(tags=["media"])
+
+# 名前が内容のハッシュなので、同じ URL の中身は変わらない
+_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/media/{name}", include_in_schema=False)
+def read_media(name: str, request: Request) -> Response:
+    """
+    ローカルに保存した画像を返す（Range・If-None-Match・If-Range に対応）
+
+    ETag は名前のハッシュそのもの。304 はここで返し、Range は FileResponse に任せる。
+    """
+    storage = get_local_storage()
+    m = LOCAL_OBJECT_NAME.match(name)
+    path = storage.path_of(name) if storage is not None and m is not None else None
+    if m is None or path is None or not path.is_file():
+        raise HTTPException(status_code=404, detail="Not found")
+
+    etag = f'"{m.group(1)}"'
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=CONTENT_TYPES[m.group(2)], headers=headers)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+
+from app.core.metrics import CONTENT_TYPE, REGISTRY
+
+# /api/v1 の外（Prometheus の既定のパス）に置く
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics() -> Response:
+    """Prometheus のテキスト形式でメトリクスを返す"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
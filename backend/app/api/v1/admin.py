@@ -0,0 +1,34 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_db, require_admin
+from app.core.jobs import JOB_KIND_RESCORE, enqueue_job
+from app.models.job import Job
+from app.schemas.job import JobOut, RescoreRequest
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/rescore", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+def start_rescore(req: RescoreRequest, db: Annotated[Session, Depends(get_db)]) -> Job:
+    """
+    全日記のスコア再計算を開始する
+
+    実処理はワーカーが rescore ジョブとして行い、1 ジョブごとに続きのジョブを積む。
+    """
+    job = enqueue_job(
+        db, JOB_KIND_RESCORE, {"after_id": req.after_id, "batch_size": req.batch_size}
+    )
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+def read_job(job_id: int, db: Annotated[Session, Depends(get_db)]) -> Job:
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,53 +1,49 @@
-from collections.abc import Sequence
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import func, select
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import not_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db
+from app.api.deps import get_read_db
+from app.core.query_stats import query_budget
+from app.models.diary import Diary
 from app.models.image import Image
+from app.models.load_profiles import IMAGE_ONLY
 from app.schemas.image import ImageOut
+from app.utils.response_cache import IMAGES_SCOPE, cache_key, response_cache, to_response
 
 router = APIRouter(prefix="/all_images", tags=["all_images"])
 
+_IMAGE_LIST = TypeAdapter(list[ImageOut])
 
-@router.get("/", response_model=list[ImageOut])
-def get_latest_image_per_diary(db: Annotated[Session, Depends(get_db)]) -> Sequence[Image]:
-    # 各 diary_id の中で updated_at DESC, id DESC の順に並べ、先頭(rn=1)だけを取る
-    rn = (
-        func.row_number()
-        .over(
-            partition_by=Image.diary_id,
-            order_by=(Image.updated_at.desc(), Image.id.desc()),
-        )
-        .label("rn")
-    )
-
-    ranked = (
-        select(
-            Image.id,
-            Image.diary_id,
-            Image.uri,
-            Image.created_at,
-            Image.updated_at,
-            Image.is_deleted,
-            rn,
-        )
-        .where(Image.is_deleted.is_(False), Image.diary_id.is_not(None))
-        .subquery()
-    )
 
+@router.get("/", response_model=list[ImageOut])
+@query_budget(2)
+async def get_latest_image_per_diary(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+) -> Response:
+    # キャッシュのバージョンが変わっていなければ一覧は読まずに返す（ETag 一致なら 304）
+    key = cache_key(request)
+    version = await response_cache.version(db, IMAGES_SCOPE)
+    cached = response_cache.get(key, version)
+    if cached is not None:
+        return to_response(request, cached)
+
+    # 各日記の最新画像は diaries.latest_image_id が指しているので、主キーで結合するだけ
     stmt = (
         select(Image)
-        .join(ranked, Image.id == ranked.c.id)
-        .where(ranked.c.rn == 1)
-        .order_by(Image.diary_id.asc())
+        .options(*IMAGE_ONLY)
+        .join(Diary, Diary.latest_image_id == Image.id)
+        .where(not_(Diary.is_deleted))
+        .order_by(Diary.id.asc())
     )
 
-    images = db.execute(stmt).scalars().all()
+    images = (await db.execute(stmt)).scalars().all()
 
     # 空配列を返すか 404 にするかは好み。API的には 200 + [] が一般的。
     # if not images:
     #     raise HTTPException(status_code=404, detail="Image not found")
-    return images
+    body = _IMAGE_LIST.dump_json(_IMAGE_LIST.validate_python(images, from_attributes=True))
+    return to_response(request, response_cache.put(key, version, body))
@@ -1,176 +1,320 @@
-import logging
-from collections.abc import Sequence
-from io import BytesIO
-from typing import (
-    Annotated,
-    Any,
-    NotRequired,
-    Required,
-    TypedDict,
-)
-from uuid import uuid4
-
-import cloudinary
-import cloudinary.uploader
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
-from PIL.Image import Image as PILImage
-from sqlalchemy import desc, not_
-from sqlalchemy.orm import Session
-
-from app.api.deps import get_db
-from app.db import SessionLocal
+import asyncio
+import base64
+import binascii
+import os
+from collections.abc import AsyncIterator
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import and_, insert, not_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_async_db, get_read_db
+from app.core.current_image import statements_for_removed_diary
+from app.core.events import EVENTS_HEARTBEAT_SECONDS, latest_progress, subscribe
+from app.core.jobs import enqueue_generation, generation_job_rows
+from app.core.query_stats import allow_repeated_queries, query_budget
+from app.core.read_pin import pinned_to_primary
+from app.db import AsyncSessionLocal, read_session_factory
 from app.models.diary import Diary
-from app.models.image import Image
+from app.models.job import Job
+from app.models.load_profiles import DIARY_ONLY
 from app.schemas.diary import (
     DiaryBase,
     DiaryCreate,
+    DiaryExport,
+    DiaryImport,
+    DiaryImportResult,
     DiaryOut,
     PostAndPutDiaryResponse,
 )
-from app.utils.generate_diary_score import generate_diary_score_using_Gemini
-from app.utils.generate_image import generate_image
 from app.utils.parse_image import parse_date
+from app.utils.response_cache import (
+    DIARIES_SCOPE,
+    IMAGES_SCOPE,
+    bump_versions,
+    cache_key,
+    response_cache,
+    to_response,
+)
+from app.utils.scorers import provisional_score, provisional_scores
+from app.utils.text import normalize_body
+
+# GET /diaries の 1 ページの件数（デフォルト / 上限）
+DIARIES_PAGE_DEFAULT = int(os.getenv("DIARIES_PAGE_DEFAULT", "100"))
+DIARIES_PAGE_MAX = int(os.getenv("DIARIES_PAGE_MAX", "500"))
+# エクスポートでサーバーサイドカーソルから 1 度に読む行数
+DIARIES_EXPORT_BATCH_SIZE = int(os.getenv("DIARIES_EXPORT_BATCH_SIZE", "1000"))
+# インポートで 1 回の INSERT（executemany）にまとめる行数。このたびに commit する
+DIARIES_IMPORT_BATCH_SIZE = int(os.getenv("DIARIES_IMPORT_BATCH_SIZE", "500"))
+# インポートの 1 行の最大バイト数
+DIARIES_IMPORT_MAX_LINE_BYTES = int(os.getenv("DIARIES_IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
 
+router = APIRouter(prefix="/diaries", tags=["diaries"])
 
-class CloudinaryUploadResult(TypedDict):
-    public_id: Required[str]
-    secure_url: Required[str]
-    width: NotRequired[int]
-    height: NotRequired[int]
-    format: NotRequired[str]
-    bytes: NotRequired[int]
-    resource_type: NotRequired[str]
-    url: NotRequired[str]
-    folder: NotRequired[str]
-    original_filename: NotRequired[str]
-    version: NotRequired[int]
-    placeholder: NotRequired[bool]
+_DIARY_LIST = TypeAdapter(list[DiaryOut])
+_EXPORT_LINE = TypeAdapter(DiaryExport)
 
 
-router = APIRouter(prefix="/diaries", tags=["diaries"])
+def _encode_cursor(date: int, diary_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{date}:{diary_id}".encode()).decode().rstrip("=")
 
 
-def upload_pil_to_cloudinary(
-    img: PILImage,
-    *,
-    folder: str = "generated",
-    filename: str | None = None,
-    quality: int = 85,
-) -> CloudinaryUploadResult:
-    """
-    Pillow画像をCloudinaryへアップロードして、Cloudinaryのレスポンス(dict)を返す。
-    返り値の主要キー: public_id, secure_url, width, height, format, bytes
-    """
-    # 透過があるのにJPEGにすると黒/白背景になるので、適切なフォーマットを選ぶ
-    fmt = (img.format or "PNG").upper()
-    if fmt == "JPEG" and (img.mode in ("RGBA", "LA", "P")):
-        fmt = "PNG"  # 透過維持したい場合はPNG/WEBPに
-
-    # JPEG保存時はRGBに変換しておく
-    work = img.convert("RGB") if fmt == "JPEG" and img.mode != "RGB" else img
-
-    buf = BytesIO()
-    save_kwargs: dict[str, Any] = {"format": fmt}
-    if fmt == "JPEG":
-        save_kwargs.update({"quality": quality, "optimize": True, "progressive": True})
-    work.save(buf, **save_kwargs)
-    buf.seek(0)
-
-    # ファイル名（public_idベース）を決める
-    base_name = filename or str(uuid4())
-    # Cloudinaryは拡張子不要でもOKだが、付けておくと分かりやすい
-    public_id = f"{folder}/{base_name}"
-
-    # アップロード（file-like をそのまま渡せる）
-    # resource_type='image' を明示
-    res = cloudinary.uploader.upload(  # type: ignore
-        buf,
-        resource_type="image",
-        public_id=public_id,  # unique_filename=False にしない限り上書きされません
-        overwrite=False,
-        use_filename=True,
-        folder=folder,
-    )
-    return res
+def _decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date, diary_id = raw.split(":")
+        return int(date), int(diary_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
 
 
-def process_generated_image(user_id: int, diary_id: int, body: str) -> None:
-    log = logging.getLogger("app.bg")
-    log.info("BG start user_id=%s diary_id=%s", user_id, diary_id)
+@router.get("/", response_model=list[DiaryOut])
+@query_budget(2)
+async def read_diaries(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    limit: Annotated[int, Query(ge=1, le=DIARIES_PAGE_MAX)] = DIARIES_PAGE_DEFAULT,
+    cursor: Annotated[str | None, Query()] = None,
+    from_date: Annotated[int | None, Query(description="YYYYMMDD（この日を含む）")] = None,
+    to_date: Annotated[int | None, Query(description="YYYYMMDD（この日を含む）")] = None,
+) -> Response:
+    """日記一覧取得（(date, id) 昇順のキーセットページング）
+
+    続きがある場合はレスポンスヘッダ `X-Next-Cursor` を返すので、
+    それを `cursor` に渡して次のページを取得する。
+    キャッシュのバージョン（しばらくはプロセス内で覚えたもの）が変わっていなければ
+    レスポンスキャッシュから返す（ETag 一致なら 304）。
+    """
+    key = cache_key(request)
+    version = await response_cache.version(db, DIARIES_SCOPE)
+    cached = response_cache.get(key, version)
+    if cached is not None:
+        return to_response(request, cached)
 
-    db = SessionLocal()
     try:
-        # --- A) 最新画像URIを取得 ---
-        latest_image = (
-            db.query(Image)
-            .filter(not_(Image.is_deleted))
-            .order_by(desc(Image.updated_at))
-            .first()
+        stmt = (
+            Diary.select_active()
+            .options(*DIARY_ONLY)
+            .order_by(Diary.date, Diary.id)
+            .limit(limit + 1)
         )
-        if latest_image is None:
-            log.error("No image found for the user user_id=%s", user_id)
-            return
-        image_uri = latest_image.uri
+        if from_date is not None:
+            stmt = stmt.where(Diary.date >= from_date)
+        if to_date is not None:
+            stmt = stmt.where(Diary.date <= to_date)
+        if cursor is not None:
+            after_date, after_id = _decode_cursor(cursor)
+            stmt = stmt.where(
+                or_(
+                    Diary.date > after_date,
+                    and_(Diary.date == after_date, Diary.id > after_id),
+                )
+            )
+
+        diaries = (await db.execute(stmt)).scalars().all()
+        headers: dict[str, str] = {}
+        if len(diaries) > limit:
+            diaries = diaries[:limit]
+            last = diaries[-1]
+            headers["X-Next-Cursor"] = _encode_cursor(last.date, last.id)
+        body = _DIARY_LIST.dump_json(_DIARY_LIST.validate_python(diaries, from_attributes=True))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching items: {str(e)}",
+        ) from e
 
-        # --- B) スコア計算（外部API） ---
-        log.info("Generating diary score using Gemini")
-        score = generate_diary_score_using_Gemini(body)
+    return to_response(request, response_cache.put(key, version, body, headers))
 
-        # --- C) スコアだけを先に確定コミット ---
-        diary = db.query(Diary).filter(Diary.id == diary_id).first()
-        if diary is None:
-            log.error("Diary not found id=%s", diary_id)
-            return
-        diary.score = score
-        db.add(diary)
-        db.commit()  # ★ ここで確定
-        log.info("Score updated diary_id=%s score=%s", diary_id, score)
-
-        # --- D) 画像生成 & アップロード（失敗してもスコアは残る）---
-        log.info("Generating image with score=%s", score)
-        gen_img = generate_image(score, image_uri)
-
-        log.info("Uploading generated image to Cloudinary")
-        res = upload_pil_to_cloudinary(gen_img, folder="generated")
-        secure_url = res.get("secure_url")
-        if not secure_url:
-            log.error("Upload returned no secure_url")
-            return
-
-        # --- E) 画像レコードを保存（別トランザクション）---
-        img_row = Image(diary_id=diary_id, uri=secure_url)  # ← 固定 1 をやめる
-        db.add(img_row)
-        db.commit()
-        log.info("Image saved diary_id=%s url=%s", diary_id, secure_url)
-
-    except Exception:
-        log.exception("BG failed user_id=%s diary_id=%s", user_id, diary_id)
-        db.rollback()
-        # ここでraiseしてもOK/しなくてもOK（好み）
-    finally:
-        db.close()
-        log.info("BG done user_id=%s diary_id=%s", user_id, diary_id)
 
+@router.get("/export")
+async def export_diaries(
+    request: Request,
+    from_date: Annotated[int | None, Query(description="YYYYMMDD（この日を含む）")] = None,
+    to_date: Annotated[int | None, Query(description="YYYYMMDD（この日を含む）")] = None,
+) -> StreamingResponse:
+    """日記を (date, id) 昇順に NDJSON（1 行 1 件、DiaryExport）で流す
+
+    サーバーサイドカーソルから DIARIES_EXPORT_BATCH_SIZE 行ずつ読んでは書き出すので、
+    件数が増えてもメモリは一定。出力はそのまま POST /diaries/import に渡せる。
+    """
+    stmt = (
+        select(Diary.body, Diary.date, Diary.score, Diary.created_at, Diary.updated_at)
+        .where(not_(Diary.is_deleted))
+        .order_by(Diary.date, Diary.id)
+        .execution_options(yield_per=DIARIES_EXPORT_BATCH_SIZE)
+    )
+    if from_date is not None:
+        stmt = stmt.where(Diary.date >= from_date)
+    if to_date is not None:
+        stmt = stmt.where(Diary.date <= to_date)
+
+    async def stream() -> AsyncIterator[bytes]:
+        # レスポンスを返し終わるまで読み続けるので、リクエストのセッションではなく自前で開く
+        async with read_session_factory(pinned_to_primary(request))() as db:
+            result = await db.stream(stmt)
+            async for rows in result.partitions():
+                yield b"".join(
+                    _EXPORT_LINE.dump_json(_EXPORT_LINE.validate_python(row, from_attributes=True))
+                    + b"\n"
+                    for row in rows
+                )
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="diaries.ndjson"'},
+    )
+
+
+async def _read_lines(request: Request) -> AsyncIterator[tuple[int, bytes]]:
+    """リクエストボディを行ごとに（行番号, 行）で返す。全体はメモリに載せない"""
+    buffer = b""
+    line_no = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, line
+        if len(buffer) > DIARIES_IMPORT_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Line {line_no + 1} is too long")
+    if buffer:
+        yield line_no + 1, buffer
+
+
+async def _import_batch(
+    db: AsyncSession, user_id: int, batch: list[DiaryImport], generate: bool
+) -> tuple[int, int]:
+    """1 バッチ分を追加して commit する。(追加した数, ジョブを積んだ数) を返す"""
+    # 同じ日付の日記が既にあるもの・バッチ内で日付が重なるもの（後の行）は追加しない
+    dates = {d.date for d in batch}
+    existing = set(
+        (
+            await db.execute(
+                select(Diary.date).where(Diary.date.in_(dates), not_(Diary.is_deleted))
+            )
+        ).scalars()
+    )
+    new: dict[int, DiaryImport] = {}
+    for d in batch:
+        if d.date not in existing and d.date not in new:
+            new[d.date] = d
+    if not new:
+        return 0, 0
+
+    # 点数がなければ仮のスコア（無効なら 0）。ワーカーの採点で上書きされる。
+    # バッチ分の採点はイベントループを止めないようスレッドプールでまとめて行う
+    unscored = [d for d in new.values() if d.score is None]
+    provisional: dict[int, int] = {}
+    if unscored:
+        scores = await run_in_threadpool(provisional_scores, [d.body for d in unscored])
+        provisional = dict(zip((d.date for d in unscored), scores or (), strict=False))
+    rows = [
+        {
+            "user_id": user_id,
+            "body": d.body,
+            "date": d.date,
+            "score": d.score if d.score is not None else provisional.get(d.date, 0),
+        }
+        for d in new.values()
+    ]
+    # ORM の add ではなく Core の executemany で流す
+    await db.execute(insert(Diary), rows)
+
+    queued = 0
+    if generate:
+        # MySQL は executemany で id を返さないので、日付で引き直す
+        inserted = (
+            await db.execute(
+                select(Diary.id, Diary.body).where(
+                    Diary.date.in_(new.keys()), not_(Diary.is_deleted)
+                )
+            )
+        ).all()
+        jobs = generation_job_rows([(user_id, r.id, r.body) for r in inserted])
+        await db.execute(insert(Job), jobs)
+        queued = len(jobs)
+    await db.commit()
+    await bump_versions(db, DIARIES_SCOPE)
+    return len(rows), queued
+
+
+@router.post("/import", response_model=DiaryImportResult)
+@allow_repeated_queries
+async def import_diaries(
+    request: Request,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
+    generate: Annotated[bool, Query(description="採点・画像生成のジョブを積む")] = True,
+) -> DiaryImportResult:
+    """NDJSON（1 行 1 件、DiaryImport）の日記をまとめて追加する
+
+    ボディは読みながら DIARIES_IMPORT_BATCH_SIZE 行ずつ executemany で INSERT し、
+    バッチごとに commit する。同じ日付の日記が既にある行は飛ばす。採点と画像生成は
+    その場では行わず、日記ごとにジョブを積んでワーカーに任せる（generate=false なら積まない）。
+    不正な行があればそこで 400 を返す（それより前のバッチは追加済み）。
+    """
+    user_id = 1  # 仮のユーザーID
+    imported = skipped = queued = 0
+    batch: list[DiaryImport] = []
+
+    async def flush() -> None:
+        nonlocal imported, skipped, queued
+        added, jobs = await _import_batch(db, user_id, batch, generate)
+        imported += added
+        skipped += len(batch) - added
+        queued += jobs
+        batch.clear()
 
-@router.get("/", response_model=list[DiaryOut])
-def read_diaries(db: Annotated[Session, Depends(get_db)]) -> Sequence[Diary]:
-    """全日記取得"""
     try:
-        diaries = db.query(Diary).filter(not_(Diary.is_deleted)).all()
-        return diaries
+        async for line_no, line in _read_lines(request):
+            if not line.strip():
+                continue
+            try:
+                diary = DiaryImport.model_validate_json(line)
+            except ValidationError as e:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid line {line_no} (imported {imported}): {e.errors()[0]['msg']}",
+                ) from e
+            try:
+                _, month, day = parse_date(diary.date)
+            except ValueError:
+                month = day = 0
+            if month < 1 or month > 12 or day < 1 or day > 31:
+                raise HTTPException(
+                    status_code=400, detail=f"Invalid date on line {line_no} (imported {imported})"
+                )
+            batch.append(diary)
+            if len(batch) >= DIARIES_IMPORT_BATCH_SIZE:
+                await flush()
+        if batch:
+            await flush()
     except HTTPException:
+        await db.rollback()
         raise
     except Exception as e:
+        await db.rollback()
         raise HTTPException(
             status_code=500,
-            detail=f"Error fetching items: {str(e)}",
+            detail=f"Error importing diaries (imported {imported}): {str(e)}",
         ) from e
 
+    return DiaryImportResult(imported=imported, skipped=skipped, queued=queued)
+
 
 @router.get("/{diary_id}", response_model=DiaryOut)
-def read_diary(diary_id: int, db: Annotated[Session, Depends(get_db)]) -> Diary:
+@query_budget(1)
+async def read_diary(diary_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]) -> Diary:
     try:
-        diary = db.query(Diary).filter(Diary.id == diary_id, not_(Diary.is_deleted)).first()
+        stmt = Diary.select_active().options(*DIARY_ONLY).where(Diary.id == diary_id)
+        diary = (await db.execute(stmt)).scalars().first()
         if diary is None:
             raise HTTPException(status_code=404, detail="Diary not found")
         return diary
@@ -183,11 +327,59 @@ def read_diary(diary_id: int, db: Annotated[Session, Depends(get_db)]) -> Diary:
         ) from e
 
 
+@router.get("/{diary_id}/events")
+async def stream_diary_events(diary_id: int, request: Request) -> StreamingResponse:
+    """画像生成の進み具合を Server-Sent Events で返す
+
+    queued → scored → generated → uploaded → saved（または failed）の順に
+    `event: <段階>` を送り、saved / failed を送ったら閉じる。接続した時点の段階を
+    最初に 1 件送るので、保存直後に接続すれば取りこぼさない。
+    再接続時は Last-Event-ID より古いイベントを送らない。
+
+    ストリームは長く開いたままになるので、リクエストのセッション（依存関係）は使わず、
+    存在の確認だけ短く開いたセッションで行う（接続プールを占有しない）。
+    """
+    async with AsyncSessionLocal() as db:
+        exists = (
+            await db.execute(select(Diary.id).where(Diary.id == diary_id, not_(Diary.is_deleted)))
+        ).scalar()
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Diary not found")
+    last_event_id = request.headers.get("last-event-id", "")
+    seen = int(last_event_id) if last_event_id.isdigit() else 0
+
+    async def stream() -> AsyncIterator[bytes]:
+        nonlocal seen
+        async with subscribe(diary_id) as queue:
+            snapshot = await latest_progress(diary_id)
+            pending = [snapshot] if snapshot is not None else []
+            while True:
+                for event in pending:
+                    if event.id <= seen:
+                        continue
+                    seen = event.id
+                    yield event.to_sse()
+                    if event.terminal:
+                        return
+                if await request.is_disconnected():
+                    return
+                try:
+                    pending = [await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT_SECONDS)]
+                except TimeoutError:
+                    pending = []
+                    yield b": ping\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/", response_model=PostAndPutDiaryResponse)
 async def create_diary(
     diary_in: DiaryCreate,
-    db: Annotated[Session, Depends(get_db)],
-    background: BackgroundTasks,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
 ) -> Diary:
     try:
         # 必須項目のチェック
@@ -200,20 +392,29 @@ async def create_diary(
             raise HTTPException(status_code=400, detail="Invalid date")
 
         # すでに同じ日付の日記が存在するか確認
-        existing_diary = (
-            db.query(Diary).filter(Diary.date == diary_in.date, not_(Diary.is_deleted)).first()
+        # 存在確認だけなので id だけ読む
+        existing_stmt = (
+            select(Diary.id).where(Diary.date == diary_in.date, not_(Diary.is_deleted)).limit(1)
         )
+        existing_diary = (await db.execute(existing_stmt)).scalar()
         if existing_diary:
             raise HTTPException(status_code=400, detail="Diary for this date already exists")
 
         user_id = 1  # 仮のユーザーID
 
         diary = Diary(**diary_in.model_dump(), user_id=user_id)
+        # ワーカーの採点が終わるまでの仮スコア（有効な場合のみ。NumPy で計算するのでスレッドで）
+        provisional = await run_in_threadpool(provisional_score, diary.body)
+        if provisional is not None:
+            diary.score = provisional
         db.add(diary)
-        db.commit()
-        db.refresh(diary)
+        await db.flush()
 
-        background.add_task(process_generated_image, user_id, diary.id, diary.body)
+        # 日記と同じトランザクションでジョブを積む（実処理はワーカー）
+        enqueue_generation(db, user_id, diary.id, diary.body)
+        await db.commit()
+        await bump_versions(db, DIARIES_SCOPE)
+        await db.refresh(diary)
 
         return diary
     except HTTPException:
@@ -226,26 +427,35 @@ async def create_diary(
 
 
 @router.put("/{diary_id}", response_model=PostAndPutDiaryResponse)
-def update_diary(
+async def update_diary(
     diary_id: int,
     diary_update: DiaryBase,
-    db: Annotated[Session, Depends(get_db)],
-    background: BackgroundTasks,
+    db: Annotated[AsyncSession, Depends(get_async_db)],
 ) -> Diary:
     try:
-        diary = Diary.active(db).filter(Diary.id == diary_id).first()
+        stmt = Diary.select_active().options(*DIARY_ONLY).where(Diary.id == diary_id)
+        diary = (await db.execute(stmt)).scalars().first()
         if diary is None:
             raise HTTPException(status_code=404, detail="Diary not found")
 
+        # 本文が（正規化して）変わっていなければ再生成しない
+        body_changed = normalize_body(diary.body) != normalize_body(diary_update.body)
+
         # 変更可能なのは bodyのみ
         diary.body = diary_update.body
         # それ以外は変更不可
 
-        db.add(diary)
-        db.commit()
-        db.refresh(diary)
+        if body_changed:
+            provisional = await run_in_threadpool(provisional_score, diary.body)
+            if provisional is not None:
+                diary.score = provisional
 
-        background.add_task(process_generated_image, diary.user_id, diary.id, diary_update.body)
+        db.add(diary)
+        if body_changed:
+            enqueue_generation(db, diary.user_id, diary.id, diary_update.body)
+        await db.commit()
+        await bump_versions(db, DIARIES_SCOPE)
+        await db.refresh(diary)
 
         return diary
     except HTTPException:
@@ -259,12 +469,13 @@ def update_diary(
 
 # responseは204 No Content
 @router.delete("/{diary_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_diary(
+async def delete_diary(
     diary_id: int,
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
 ) -> None:
     try:
-        diary = Diary.active(db).filter(Diary.id == diary_id).first()
+        stmt = Diary.select_active().options(*DIARY_ONLY).where(Diary.id == diary_id)
+        diary = (await db.execute(stmt)).scalars().first()
         if diary is None:
             raise HTTPException(status_code=404, detail="Diary not found")
 
@@ -272,7 +483,13 @@ def delete_diary(
         diary.is_deleted = True
 
         db.add(diary)
-        db.commit()
+        await db.flush()
+        # ユーザーの「今の画像」がこの日記のものなら付け替える
+        for pointer_stmt in statements_for_removed_diary(diary.user_id):
+            await db.execute(pointer_stmt)
+        await db.commit()
+        # 一覧・全画像一覧から消え、ユーザーの最新画像も変わるかもしれない
+        await bump_versions(db, DIARIES_SCOPE, IMAGES_SCOPE, diary.user_id)
         return None
     except HTTPException:
         raise
@@ -284,9 +501,11 @@ def delete_diary(
 
 
 @router.get("/date/{date}", response_model=DiaryOut)
-def read_diary_by_date(date: int, db: Annotated[Session, Depends(get_db)]) -> Diary:
+@query_budget(1)
+async def read_diary_by_date(date: int, db: Annotated[AsyncSession, Depends(get_read_db)]) -> Diary:
     try:
-        diary = db.query(Diary).filter(Diary.date == date, not_(Diary.is_deleted)).first()
+        stmt = Diary.select_active().options(*DIARY_ONLY).where(Diary.date == date)
+        diary = (await db.execute(stmt)).scalars().first()
         if diary is None:
             raise HTTPException(status_code=404, detail="Diary not found")
         return diary
@@ -1,114 +1,160 @@
 import os
-from typing import Annotated
-
-import cloudinary
-import cloudinary.uploader
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from sqlalchemy import desc, not_, select
-from sqlalchemy.orm import Session
-
-from app.api.deps import get_db
+from collections.abc import Callable, Coroutine
+from functools import partial
+from typing import Annotated, Any, cast
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_async_db, get_read_db
+from app.core.jobs import enqueue_prewarm
+from app.core.prewarm import IMAGE_PREWARM_DELAY, IMAGE_PREWARM_ENABLED
+from app.core.query_stats import query_budget
 from app.models.image import Image
-from app.models.diary import Diary
+from app.models.load_profiles import IMAGE_ONLY, USER_ONLY
 from app.models.user import User
 from app.schemas.image import ImageCreateOut, ImageOut
+from app.utils.encode_image import transcode_to_webp
+from app.utils.response_cache import cache_key, response_cache, to_response
+from app.utils.storage import get_storage
+
+# 受け付けるアップロードの最大バイト数（変換前）
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+# multipart の境界・ヘッダ等の分の余裕
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail="画像サイズが大きすぎます。")
+
+
+class UploadLimitRoute(APIRoute):
+    """リクエスト本文を UPLOAD_MAX_BYTES（+ multipart の余裕）までに制限するルート
+
+    UploadFile は FastAPI がハンドラを呼ぶ前に本文をすべて読んで一時ファイルに
+    置くので、ハンドラの中で数えても間に合わない。Content-Length で分かるものは
+    読む前に、chunked 等で分からないものは受け取りながら数えて、超えた時点で
+    413 にする（残りは読まない）。
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        limit = UPLOAD_MAX_BYTES + _MULTIPART_OVERHEAD
+
+        async def limited_handler(request: Request) -> Response:
+            content_length = request.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > limit:
+                raise _too_large()
 
-cloudinary.config(  # type: ignore
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-)
+            receive = request.receive
+            received = 0
 
-router = APIRouter(prefix="/images", tags=["images"])
+            async def limited_receive() -> dict[str, Any]:
+                nonlocal received
+                message = cast(dict[str, Any], await receive())
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > limit:
+                        raise _too_large()
+                return message
+
+            return await handler(Request(request.scope, limited_receive))
+
+        return limited_handler
+
+
+router = APIRouter(prefix="/images", tags=["images"], route_class=UploadLimitRoute)
 
 
 @router.get("/", response_model=ImageOut)
-def get_latest_image(user_id: int, db: Annotated[Session, Depends(get_db)]) -> Image:
+@query_budget(2)
+async def get_latest_image(
+    request: Request, user_id: int, db: Annotated[AsyncSession, Depends(get_read_db)]
+) -> Response:
     """
     指定した user_id の最新の画像を取得
 
-    処理の流れ:
-    1. user_id に紐づく最新の日記 (diary) を取得
-    2. その diary_id に紐づく最新の画像 (image) を取得
+    users.current_image_id（ユーザーの日記についた画像のうち最新のもの）を主キーで引く。
+    キャッシュのバージョン（しばらくはプロセス内で覚えたもの）が変わっていなければ
+    レスポンスキャッシュから返す（ETag 一致なら 304）。
     """
-    # Step 1: 最新の日記を取得
-    diary_stmt = (
-        select(Diary)
-        .where(Diary.user_id == user_id, not_(Diary.is_deleted))
-        .order_by(desc(Diary.updated_at))
-        .limit(1)
-    )
-    latest_diary = db.execute(diary_stmt).scalars().first()
+    key = cache_key(request)
+    version = await response_cache.version(db, user_id)
+    cached = response_cache.get(key, version)
+    if cached is not None:
+        return to_response(request, cached)
 
-    if latest_diary is None:
-        raise HTTPException(status_code=404, detail="Diary not found for this user")
-
-    # Step 2: その日記に紐づく最新画像を取得
-    image_stmt = (
+    stmt = (
         select(Image)
-        .where(Image.diary_id == latest_diary.id, not_(Image.is_deleted))
-        .order_by(desc(Image.updated_at))
-        .limit(1)
+        .options(*IMAGE_ONLY)
+        .join(User, User.current_image_id == Image.id)
+        .where(User.id == user_id)
     )
-    image = db.execute(image_stmt).scalars().first()
+    image = (await db.execute(stmt)).scalars().first()
 
     if image is None:
-        raise HTTPException(status_code=404, detail="Image not found for this diary")
+        raise HTTPException(status_code=404, detail="Image not found for this user")
 
-    return image
+    body = ImageOut.model_validate(image).model_dump_json().encode()
+    return to_response(request, response_cache.put(key, version, body))
 
 
 @router.post("/", response_model=ImageCreateOut)
 async def upload_image(
     file: Annotated[UploadFile, File(...)],
-    db: Annotated[Session, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_async_db)],
     folder: Annotated[str | None, Form()] = "uploads",
 ) -> ImageCreateOut:
     """
-    Cloudinary に画像をアップロードし、
+    画像を保存先（Cloudinary かローカル。app.utils.storage）にアップロードし、
     取得した URL を user_id=1 の User.image_url に保存して返す
+
+    アップロード前に長辺・バイト数の上限に収まる WebP へ変換する。
+    変換とアップロードはワーカースレッドで行い、イベントループを止めない。
+    IMAGE_PREWARM_ENABLED なら生成画像の事前生成ジョブも同じトランザクションで積む。
     """
-    # 1) MIME チェック
+    # 1) MIME / サイズチェック（本文全体の上限は UploadLimitRoute が受信中に見ている）
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="画像のみアップロード可能です。")
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise _too_large()
 
-    # 2) Cloudinary へアップロード
+    # 2) 縮小 + WebP 変換（CPU 処理なのでスレッドで）
+    # file.file は受信時に書いた一時ファイル（先頭に戻してある）をそのまま読む
     try:
-        res = cloudinary.uploader.upload(  # type: ignore
-            file.file,
-            folder=folder,
-            resource_type="image",
-            use_filename=True,
-            unique_filename=True,
-            overwrite=False,
-        )
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Cloudinary upload failed: {e}") from e
+        webp = await run_in_threadpool(transcode_to_webp, file.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
-    secure_url = res.get("secure_url")
-    if not secure_url:
-        raise HTTPException(status_code=500, detail="Cloudinary response is missing secure_url.")
+    # 3) 保存先（Cloudinary かローカル）へアップロード（同期処理なのでスレッドで）
+    storage = get_storage()
+    try:
+        stored = await run_in_threadpool(partial(storage.put, webp, fmt="webp", folder=folder))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Image upload failed: {e}") from e
+    secure_url = stored.uri
 
-    # 3) DB に保存
+    # 4) DB に保存
     try:
         target_user_id = 1
-        user = db.get(User, target_user_id)
+        user = await db.get(User, target_user_id, options=USER_ONLY)
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
         # userのimage_urlをsecure_urlに更新
         user.image_url = secure_url
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        if IMAGE_PREWARM_ENABLED:
+            # 新しい元画像で出そうなスコアの画像を、ワーカーの手が空いたときに作っておく
+            enqueue_prewarm(db, target_user_id, delay=IMAGE_PREWARM_DELAY)
+        # 元画像はキャッシュしているレスポンスには含まれないので、バージョンは上げない
+        await db.commit()
     except Exception as e:
-        db.rollback()
-        # 失敗した場合 Cloudinary をクリーンアップ
-        public_id = res.get("public_id")
-        if public_id:
-            try:
-                cloudinary.uploader.destroy(public_id, resource_type="image")  # type: ignore
-            except Exception:
-                pass
+        await db.rollback()
+        # 失敗した場合アップロードしたものをクリーンアップ
+        await run_in_threadpool(storage.delete, stored.object_id)
         raise HTTPException(status_code=500, detail=f"DB保存に失敗しました: {e}") from e
 
     return ImageCreateOut(image_url=secure_url)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from . import all_images, diaries, images
+from . import admin, all_images, diaries, images
 
 api_router = APIRouter(prefix="/api/v1")
 api_router.include_router(diaries.router)
@@ -8,3 +8,4 @@ api_router.include_router(diaries.router)
 api_router.include_router(images.router)
 # api_router.include_router(users.router)
 api_router.include_router(all_images.router)
+api_router.include_router(admin.router)
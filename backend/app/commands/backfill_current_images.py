@@ -0,0 +1,51 @@
+"""
+「表示する画像」ポインタの作り直しコマンド
+
+    python -m app.commands.backfill_current_images [--batch-size 1000]
+
+diaries.latest_image_id → users.current_image_id の順に、id の範囲ごとに
+別トランザクションで計算し直す（長いロックを取らない）。何度実行してもよい。
+"""
+
+import argparse
+from collections.abc import Callable
+
+from sqlalchemy import Update, func, select
+from sqlalchemy.orm import InstrumentedAttribute
+
+from app.core.current_image import backfill_diaries, backfill_users
+from app.db import engine
+from app.models.diary import Diary
+from app.models.user import User
+
+
+def _backfill(
+    label: str,
+    id_column: InstrumentedAttribute[int],
+    build: Callable[[int, int], Update],
+    batch_size: int,
+) -> None:
+    with engine.connect() as conn:
+        max_id = conn.execute(select(func.max(id_column))).scalar() or 0
+
+    updated = 0
+    for first_id in range(1, max_id + 1, batch_size):
+        last_id = min(first_id + batch_size - 1, max_id)
+        with engine.begin() as conn:
+            updated += conn.execute(build(first_id, last_id)).rowcount
+        print(f"{label}: id <= {last_id} / {max_id}")
+    print(f"{label}: {updated} rows changed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild latest/current image pointers")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    # ユーザーのポインタは日記のポインタから計算するので、日記が先
+    _backfill("diaries", Diary.id, backfill_diaries, args.batch_size)
+    _backfill("users", User.id, backfill_users, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
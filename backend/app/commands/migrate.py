@@ -0,0 +1,60 @@
+"""
+スキーママイグレーションの適用コマンド
+
+    python -m app.commands.migrate [--dry-run]
+
+db/migrations/*.sql をファイル名順に見て、schema_migrations に記録されていない
+ものだけを適用する。新規に db/init/01_init.sql から作った DB は全て適用済みとして
+記録されているので、既存の DB を追いつかせるときに使う。
+"""
+
+import argparse
+from pathlib import Path
+
+from sqlalchemy import text
+
+from app.db import engine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "db" / "migrations"
+
+
+def _split_statements(sql: str) -> list[str]:
+    """コメント行を除き、; 区切りで文に分ける（手続きは含まない前提）"""
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply pending SQL migrations")
+    parser.add_argument("--dry-run", action="store_true", help="list pending migrations only")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version VARCHAR(128) PRIMARY KEY,"
+            " applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+        )
+        applied = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+    pending = [p for p in sorted(MIGRATIONS_DIR.glob("*.sql")) if p.stem not in applied]
+    if not pending:
+        print("No pending migrations")
+        return
+
+    for path in pending:
+        print(f"{'Pending' if args.dry_run else 'Applying'} {path.name}")
+        if args.dry_run:
+            continue
+        # MySQL の DDL は暗黙コミットされるので、ファイル単位で記録する
+        with engine.begin() as conn:
+            for stmt in _split_statements(path.read_text(encoding="utf-8")):
+                conn.exec_driver_sql(stmt)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+                {"version": path.stem},
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+日記スコアの一括再計算コマンド
+
+    python -m app.commands.rescore [--batch-size 50] [--concurrency 8] [--after-id 0]
+
+途中で止めた場合は、最後に出力された last_id を --after-id に渡せば続きから再開できる。
+"""
+
+import argparse
+import logging
+import time
+
+from app.core.clients import close_clients, init_clients
+from app.core.rescore import RESCORE_BATCH_SIZE, RESCORE_CONCURRENCY, rescore_diaries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rescore diaries in batches with Gemini")
+    parser.add_argument("--batch-size", type=int, default=RESCORE_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=RESCORE_CONCURRENCY)
+    parser.add_argument("--after-id", type=int, default=0)
+    parser.add_argument("--max-rounds", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="score but do not write back")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    init_clients()
+    scored = missed = 0
+    after_id = args.after_id
+    try:
+        while True:
+            result = rescore_diaries(
+                after_id,
+                batch_size=args.batch_size,
+                concurrency=args.concurrency,
+                max_rounds=args.max_rounds,
+                dry_run=args.dry_run,
+            )
+            scored += result.scored
+            missed += result.missed
+            after_id = result.last_id
+            if result.retry_after is None:
+                break
+            # CLI なので、混んでいる間はそのまま待って続きから再開する
+            print(f"Gemini is busy; resuming after id={after_id} in {result.retry_after:.0f}s")
+            time.sleep(result.retry_after)
+    finally:
+        close_clients()
+    print(f"last_id={after_id} scored={scored} missed={missed} finished={result.finished}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+外部サービス用の共有クライアント
+
+Gemini / 画像ダウンロード / Cloudinary への接続をプロセス内で使い回し、
+ジョブごとの TCP / TLS ハンドシェイクをなくす。API では lifespan で、
+ワーカーでは起動時に `init_clients()` し、終了時に `close_clients()` する。
+
+google.genai は import だけで 0.5 秒ほどかかるので、Gemini のクライアントは
+初めて `.genai` を使うときに作る（Gemini を呼ばない API プロセスでは読み込まない）。
+
+環境変数:
+  - HTTP_MAX_CONNECTIONS (default: 20) 接続プールの最大接続数
+  - HTTP_MAX_KEEPALIVE (default: 10) keep-alive で保持する接続数
+  - HTTP_KEEPALIVE_EXPIRY (default: 30) 空き接続を保持する秒数
+  - HTTP_TIMEOUT (default: 30) タイムアウト秒数
+  - HTTP2_ENABLED (default: true) HTTP/2 を使う（h2 が必要）
+  - CLOUDINARY_POOL_MAXSIZE (default: 10) Cloudinary SDK の接続プールサイズ
+  - GEMINI_API_KEY
+  - GEMINI_BASE_URL (default: なし) Gemini API の接続先を差し替える（ベンチマークの偽サーバー用）
+"""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from importlib.util import find_spec
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+    from google import genai
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+CLOUDINARY_POOL_MAXSIZE = int(os.getenv("CLOUDINARY_POOL_MAXSIZE", "10"))
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+
+log = logging.getLogger("app.clients")
+
+
+@dataclass
+class Clients:
+    http: "httpx.Client"
+    http2: bool
+    limits: "httpx.Limits"
+    _genai: "genai.Client | None" = field(default=None, repr=False)
+
+    @property
+    def genai(self) -> "genai.Client":
+        if self._genai is None:
+            with _lock:
+                if self._genai is None:
+                    self._genai = _build_genai(self.http2, self.limits)
+        return self._genai
+
+
+_clients: Clients | None = None
+_lock = threading.Lock()
+
+
+def _http2_available() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    if find_spec("h2") is None:
+        log.warning("HTTP2_ENABLED but 'h2' is not installed; falling back to HTTP/1.1")
+        return False
+    return True
+
+
+def configure_cloudinary_pool() -> None:
+    """Cloudinary SDK はモジュール内の urllib3 PoolManager を使い回すので、サイズだけ合わせる"""
+    import cloudinary
+    import cloudinary.uploader
+    import cloudinary.utils
+
+    get_http_connector = getattr(cloudinary.utils, "get_http_connector", None)
+    if get_http_connector is None or not hasattr(cloudinary.uploader, "_http"):
+        return
+    options = {**cloudinary.CERT_KWARGS, "maxsize": CLOUDINARY_POOL_MAXSIZE}
+    cloudinary.uploader._http = get_http_connector(cloudinary.config(), options)
+
+
+def _build_genai(http2: bool, limits: "httpx.Limits") -> "genai.Client":
+    from google import genai
+    from google.genai import types as genai_types
+
+    log.info("Gemini client ready base_url=%s", GEMINI_BASE_URL or "(default)")
+    return genai.Client(
+        api_key=os.getenv("GEMINI_API_KEY"),
+        http_options=genai_types.HttpOptions(
+            base_url=GEMINI_BASE_URL, client_args={"http2": http2, "limits": limits}
+        ),
+    )
+
+
+def _build_clients() -> Clients:
+    import httpx
+
+    http2 = _http2_available()
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+    http = httpx.Client(http2=http2, limits=limits, timeout=HTTP_TIMEOUT, follow_redirects=True)
+
+    log.info(
+        "Shared clients ready http2=%s max_connections=%s keepalive=%s",
+        http2,
+        HTTP_MAX_CONNECTIONS,
+        HTTP_MAX_KEEPALIVE,
+    )
+    return Clients(http=http, http2=http2, limits=limits)
+
+
+def init_clients() -> Clients:
+    global _clients
+    with _lock:
+        if _clients is None:
+            _clients = _build_clients()
+        return _clients
+
+
+def get_clients() -> Clients:
+    """共有クライアントを返す（未初期化なら初期化する）"""
+    if _clients is not None:
+        return _clients
+    return init_clients()
+
+
+def close_clients() -> None:
+    global _clients
+    with _lock:
+        if _clients is None:
+            return
+        _clients.http.close()
+        close = getattr(_clients._genai, "close", None)
+        if callable(close):
+            close()
+        _clients = None
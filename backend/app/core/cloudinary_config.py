@@ -0,0 +1,19 @@
+import os
+
+
+def configure_cloudinary() -> None:
+    """環境変数から Cloudinary の認証情報を設定する
+
+    API プロセスとワーカープロセスの両方から呼ばれる。
+    CLOUDINARY_UPLOAD_PREFIX を設定すると API の接続先を差し替える（ベンチマークの偽サーバー用）。
+    """
+    import cloudinary
+
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+        api_key=os.getenv("CLOUDINARY_API_KEY"),
+        api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+    )
+    upload_prefix = os.getenv("CLOUDINARY_UPLOAD_PREFIX")
+    if upload_prefix:
+        cloudinary.config(upload_prefix=upload_prefix)
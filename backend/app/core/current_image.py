@@ -0,0 +1,97 @@
+"""
+「表示する画像」へのポインタの管理
+
+  - diaries.latest_image_id: その日記の論理削除されていない画像のうち id が最大のもの
+  - users.current_image_id: ユーザーの論理削除されていない日記の latest_image_id のうち最大のもの
+
+読み取り側はこれを主キーで引くだけにする。画像の追加・論理削除、日記の論理削除と
+同じトランザクションで、ここで作る UPDATE 文を実行して更新すること（同期/非同期
+どちらのセッションでも `execute` できる）。ずれた場合は
+`python -m app.commands.backfill_current_images` で作り直せる。
+
+ポインタの更新で updated_at が変わると「最新の日記」の並びが変わるので、据え置く。
+"""
+
+from sqlalchemy import Update, func, not_, or_, select, update
+
+from app.models.diary import Diary
+from app.models.image import Image
+from app.models.user import User
+
+# ORM のエンティティで組むが、セッションのオブジェクトとは同期させない
+# （どのセッションで実行しても追加の SELECT を出さない）
+_NO_SYNC = {"synchronize_session": False}
+
+
+def _latest_image_of_diary() -> Update:
+    """diaries の各行について latest_image_id を計算し直す UPDATE（WHERE は呼び出し側）"""
+    latest = (
+        select(func.max(Image.id))
+        .where(Image.diary_id == Diary.id, not_(Image.is_deleted))
+        .scalar_subquery()
+    )
+    return (
+        update(Diary)
+        .values(latest_image_id=latest, updated_at=Diary.updated_at)
+        .execution_options(**_NO_SYNC)
+    )
+
+
+def _current_image_of_user() -> Update:
+    """users の各行について current_image_id を計算し直す UPDATE（WHERE は呼び出し側）"""
+    current = (
+        select(func.max(Diary.latest_image_id))
+        .where(Diary.user_id == User.id, not_(Diary.is_deleted))
+        .scalar_subquery()
+    )
+    return (
+        update(User)
+        .values(current_image_id=current, updated_at=User.updated_at)
+        .execution_options(**_NO_SYNC)
+    )
+
+
+def statements_for_new_image(image_id: int, diary_id: int, user_id: int) -> list[Update]:
+    """画像を追加したとき（新しい画像が最大の id なので、計算し直さずに差し替える）
+
+    同時に追加された場合でも大きい id が残るよう、今より大きいときだけ更新する。
+    """
+    return [
+        update(Diary)
+        .where(
+            Diary.id == diary_id,
+            or_(Diary.latest_image_id.is_(None), Diary.latest_image_id < image_id),
+        )
+        .values(latest_image_id=image_id, updated_at=Diary.updated_at)
+        .execution_options(**_NO_SYNC),
+        update(User)
+        .where(
+            User.id == user_id,
+            or_(User.current_image_id.is_(None), User.current_image_id < image_id),
+        )
+        .values(current_image_id=image_id, updated_at=User.updated_at)
+        .execution_options(**_NO_SYNC),
+    ]
+
+
+def statements_for_removed_image(diary_id: int, user_id: int) -> list[Update]:
+    """画像を論理削除したとき（日記 → ユーザーの順に計算し直す）"""
+    return [
+        _latest_image_of_diary().where(Diary.id == diary_id),
+        _current_image_of_user().where(User.id == user_id),
+    ]
+
+
+def statements_for_removed_diary(user_id: int) -> list[Update]:
+    """日記を論理削除したとき（日記自身のポインタはそのまま残す）"""
+    return [_current_image_of_user().where(User.id == user_id)]
+
+
+def backfill_diaries(first_id: int, last_id: int) -> Update:
+    """diaries.id が [first_id, last_id] の範囲の latest_image_id を作り直す"""
+    return _latest_image_of_diary().where(Diary.id.between(first_id, last_id))
+
+
+def backfill_users(first_id: int, last_id: int) -> Update:
+    """users.id が [first_id, last_id] の範囲の current_image_id を作り直す"""
+    return _current_image_of_user().where(User.id.between(first_id, last_id))
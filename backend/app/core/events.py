@@ -0,0 +1,313 @@
+"""
+画像生成の進み具合の配信（Server-Sent Events 用）
+
+ワーカーは `process_generated_image` の段階ごとに `publish_progress` を呼び、
+API は `GET /api/v1/diaries/{id}/events` で購読しているクライアントに流す。
+クライアントは /images や /all_images をポーリングしなくてよい。
+
+  queued → scored → generated → uploaded → saved（終了）
+                                      └ failed（リトライを使い切った。終了）
+
+生成画像のキャッシュに当たった場合は generated / uploaded を飛ばして saved になる。
+
+配信はプロセス内の pub/sub（`InProcessBroker`）で行う。ワーカーは別プロセスなので、
+EVENTS_BROKER=db（デフォルト）では
+
+  ワーカー: generation_events テーブルに 1 行追加する
+  API     : `DbEventRelay` が 1 プロセスに 1 つだけテーブルを id の順に読み、
+            InProcessBroker に流す（購読者が何人いてもクエリは 1 本）。
+            採番とコミットの順が入れ替わった行を取りこぼさないよう、末尾の少し
+            手前から読み直し、流した id で重複を除く
+
+とつなぐ。Redis などのブローカーに置き換える場合は、publish を差し替えて
+InProcessBroker に流すリレーを書けばよい（購読側は変わらない）。
+EVENTS_BROKER=memory はワーカーと API が同じプロセスのとき用（テーブルを使わない）。
+
+環境変数:
+  - EVENTS_BROKER (default: db) db / memory
+  - EVENTS_POLL_INTERVAL (default: 0.5) リレーがテーブルを読む間隔（秒）
+    購読者がいないときは読まない
+  - EVENTS_RETENTION_SECONDS (default: 3600) これより古いイベントは消す
+  - EVENTS_HEARTBEAT_SECONDS (default: 15) 何も無いときにコメント行を送る間隔
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db import AsyncSessionLocal, SessionLocal
+from app.models.generation_event import GenerationEvent
+from app.utils.lru_cache import LRUCache
+
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "db")
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "0.5"))
+EVENTS_RETENTION_SECONDS = int(os.getenv("EVENTS_RETENTION_SECONDS", "3600"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+STAGE_QUEUED = "queued"
+STAGE_SCORED = "scored"
+STAGE_GENERATED = "generated"
+STAGE_UPLOADED = "uploaded"
+STAGE_SAVED = "saved"
+STAGE_FAILED = "failed"
+TERMINAL_STAGES = frozenset({STAGE_SAVED, STAGE_FAILED})
+
+# リレーが 1 回に読む最大件数
+_RELAY_BATCH = 500
+# id の採番（INSERT）とコミットの順は入れ替わることがあるので、読んだ末尾の id より
+# これだけ手前から毎回読み直す（流した id は覚えておき、二重には流さない）
+_RELAY_RESCAN = 200
+# 古いイベントを消す間隔（秒）
+_PURGE_INTERVAL = 60.0
+
+log = logging.getLogger("app.events")
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    diary_id: int
+    stage: str
+    data: dict[str, Any] = field(default_factory=dict)
+    # SSE の id（Last-Event-ID で再接続したときに重複を飛ばす）
+    id: int = 0
+
+    @property
+    def terminal(self) -> bool:
+        return self.stage in TERMINAL_STAGES
+
+    def to_sse(self) -> bytes:
+        payload = json.dumps(
+            {"diary_id": self.diary_id, "stage": self.stage, **self.data}, ensure_ascii=False
+        )
+        return f"id: {self.id}\nevent: {self.stage}\ndata: {payload}\n\n".encode()
+
+
+def _from_row(row: GenerationEvent) -> ProgressEvent:
+    return ProgressEvent(row.diary_id, row.stage, row.data or {}, row.id)
+
+
+class InProcessBroker:
+    """diary_id ごとの購読者（asyncio.Queue）に配る。publish はどのスレッドから呼んでもよい"""
+
+    def __init__(self, history: int = 1024) -> None:
+        self._subscribers: dict[
+            int, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue[ProgressEvent]]]
+        ] = defaultdict(set)
+        self._latest: LRUCache[int, ProgressEvent] = LRUCache(history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def publish(self, event: ProgressEvent) -> None:
+        with self._lock:
+            self._latest.set(event.diary_id, event)
+            subscribers = list(self._subscribers.get(event.diary_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # 購読側のループが閉じている（切断済み）
+                pass
+
+    def latest(self, diary_id: int) -> ProgressEvent | None:
+        return self._latest.get(diary_id)
+
+    def has_subscribers(self) -> bool:
+        with self._lock:
+            return bool(self._subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self, diary_id: int) -> AsyncIterator[asyncio.Queue[ProgressEvent]]:
+        queue: asyncio.Queue[ProgressEvent] = asyncio.Queue()
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers[diary_id].add(entry)
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(diary_id)
+                if subscribers is not None:
+                    subscribers.discard(entry)
+                    if not subscribers:
+                        del self._subscribers[diary_id]
+
+
+class DbEventRelay:
+    """generation_events を id の順に読んで broker に流す（API プロセスに 1 つ）"""
+
+    def __init__(self, broker: InProcessBroker, interval: float = EVENTS_POLL_INTERVAL) -> None:
+        self.broker = broker
+        self.interval = interval
+        self._task: asyncio.Task[None] | None = None
+        self._last_id: int | None = None
+        # 読み直す範囲（_last_id - _RELAY_RESCAN より後）で、もう流した id
+        self._seen: set[int] = set()
+        self._last_purge = 0.0
+
+    def ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="events-relay")
+
+    async def prime(self) -> None:
+        """購読者を登録した後、スナップショットを読む前に呼ぶ（読み始める位置を今の末尾にする）"""
+        self.ensure_started()
+        if self._last_id is not None:
+            return
+        async with AsyncSessionLocal() as db:
+            recent = (
+                await db.execute(
+                    select(GenerationEvent.id)
+                    .order_by(GenerationEvent.id.desc())
+                    .limit(_RELAY_RESCAN)
+                )
+            ).scalars()
+            seen = set(recent)
+        if self._last_id is None:
+            # 今ある行は流さない（購読開始時の段階は latest_progress で読む）
+            self._seen = seen
+            self._last_id = max(seen, default=0)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if not self.broker.has_subscribers():
+                    # 次の購読開始時に末尾から読み直す（誰も見ていない間の分は流さない）
+                    self._last_id = None
+                    self._seen.clear()
+                elif self._last_id is not None:
+                    await self._poll()
+                    await self._purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Event relay poll failed")
+            await asyncio.sleep(self.interval)
+
+    async def _poll(self) -> None:
+        if self._last_id is None:
+            return
+        last_id = self._last_id
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(GenerationEvent)
+                    .where(GenerationEvent.id > last_id - _RELAY_RESCAN)
+                    .order_by(GenerationEvent.id)
+                    .limit(_RELAY_RESCAN + _RELAY_BATCH)
+                )
+            ).scalars()
+            for row in rows:
+                if row.id in self._seen:
+                    continue
+                # 末尾より前の id は、後からコミットされて見えるようになった行
+                self._seen.add(row.id)
+                last_id = max(last_id, row.id)
+                self.broker.publish(_from_row(row))
+        self._last_id = last_id
+        self._seen = {i for i in self._seen if i > last_id - _RELAY_RESCAN}
+
+    async def _purge(self) -> None:
+        now = time.monotonic()
+        if now - self._last_purge < _PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(GenerationEvent).where(
+                    GenerationEvent.created_at
+                    < func.timestampadd(text("SECOND"), -EVENTS_RETENTION_SECONDS, func.now())
+                )
+            )
+            await db.commit()
+
+
+broker = InProcessBroker()
+_relay = DbEventRelay(broker) if EVENTS_BROKER == "db" else None
+
+
+def publish_progress(diary_id: int, stage: str, **data: Any) -> None:
+    """段階が進んだことを知らせる（ワーカーから呼ぶ。失敗しても処理は止めない）"""
+    if _relay is None:
+        broker.publish(ProgressEvent(diary_id, stage, data, broker.next_id()))
+        return
+    try:
+        with SessionLocal() as db:
+            db.add(GenerationEvent(diary_id=diary_id, stage=stage, data=data or None))
+            db.commit()
+    except Exception:
+        log.exception("Failed to publish progress diary_id=%s stage=%s", diary_id, stage)
+
+
+def add_queued_event(db: Session | AsyncSession, diary_id: int) -> None:
+    """ジョブを積んだことを記録する（ジョブと同じトランザクションで確定する）
+
+    古い実行の saved を購読開始時のスナップショットとして返さないよう、
+    再生成のたびに queued から始める。
+    """
+    if _relay is None:
+        broker.publish(ProgressEvent(diary_id, STAGE_QUEUED, {}, broker.next_id()))
+        return
+    db.add(GenerationEvent(diary_id=diary_id, stage=STAGE_QUEUED))
+
+
+async def latest_progress(diary_id: int) -> ProgressEvent | None:
+    """日記の今の段階（まだ一度も生成していなければ None）
+
+    ストリームの中から呼ぶので、リクエストのセッションではなく自前で短く開く。
+    """
+    if _relay is None:
+        return broker.latest(diary_id)
+    async with AsyncSessionLocal() as db:
+        row = (
+            await db.execute(
+                select(GenerationEvent)
+                .where(GenerationEvent.diary_id == diary_id)
+                .order_by(GenerationEvent.id.desc())
+                .limit(1)
+            )
+        ).scalar()
+    return _from_row(row) if row is not None else None
+
+
+@asynccontextmanager
+async def subscribe(diary_id: int) -> AsyncIterator[asyncio.Queue[ProgressEvent]]:
+    """日記の進み具合を購読する
+
+    これ以降に publish されたものが queue に入る。`latest_progress` はこの中で読むこと
+    （読んだ後に来たイベントを取りこぼさない。重複は id で飛ばす）。
+    """
+    async with broker.subscribe(diary_id) as queue:
+        if _relay is not None:
+            await _relay.prime()
+        yield queue
+
+
+async def stop_relay() -> None:
+    if _relay is not None:
+        await _relay.stop()
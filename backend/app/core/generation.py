@@ -0,0 +1,253 @@
+"""
+日記スコア計算 + 画像生成パイプライン
+
+ワーカー（`app.worker`）からジョブ単位で呼ばれる。API プロセスの中では実行しない。
+
+環境変数:
+  - CLOUDINARY_UPLOAD_CONCURRENCY (default: 4) 変種を並行してアップロードする数
+    （STORAGE_BACKEND が local でも使う）
+  - GENERATED_*（配信用のエンコード。app.utils.image_variants を参照）
+"""
+
+import logging
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from uuid import uuid4
+
+from app.core.clients import get_clients
+from app.core.current_image import statements_for_new_image
+from app.core.events import (
+    STAGE_FAILED,
+    STAGE_GENERATED,
+    STAGE_SAVED,
+    STAGE_SCORED,
+    STAGE_UPLOADED,
+    publish_progress,
+)
+from app.core.jobs import JobLeaseLost, JobSuperseded
+from app.core.metrics import stage_timer
+from app.core.rate_limit import UpstreamBusy
+from app.db import SessionLocal
+from app.models.diary import Diary
+from app.models.image import Image
+from app.models.load_profiles import USER_ONLY
+from app.models.user import User
+from app.utils.generate_image import GEMINI_IMAGE_MODEL, IMAGE_PROMPT_VERSION, generate_image
+from app.utils.generated_image_cache import (
+    GeneratedImage,
+    generated_image_key,
+    get_generated_image,
+    score_bucket,
+    source_image_hash,
+    store_generated_image,
+)
+from app.utils.image_variants import EncodedVariant, encode_variants
+from app.utils.response_cache import DIARIES_SCOPE, IMAGES_SCOPE, bump_versions_sync
+from app.utils.scorers import score_diary
+from app.utils.storage import StoredObject, get_storage
+
+CLOUDINARY_UPLOAD_CONCURRENCY = int(os.getenv("CLOUDINARY_UPLOAD_CONCURRENCY", "4"))
+
+
+@dataclass(frozen=True)
+class UploadedImage:
+    image: GeneratedImage
+    # 消すときに使う（本体と変種すべて）
+    object_ids: list[str]
+
+
+def destroy_uploaded(object_ids: list[str]) -> None:
+    """使われなくなったアップロードを消す（失敗しても無視する）"""
+    storage = get_storage()
+    for object_id in object_ids:
+        storage.delete(object_id)
+
+
+def upload_variants(variants: list[EncodedVariant], *, folder: str = "generated") -> UploadedImage:
+    """
+    エンコード済みの変種を保存先（app.utils.storage）へ並行してアップロードする。
+    1 つでも失敗したら、アップロードできた分を消してから例外を投げる。
+    """
+    storage = get_storage()
+    base_id = f"{folder}/{uuid4()}"
+
+    def public_id(v: EncodedVariant) -> str:
+        # 本体はそのまま、それ以外は幅と形式を付ける（public_id は形式が違っても衝突する）
+        return base_id if v.primary else f"{base_id}_{v.width}w_{v.format}"
+
+    def put(v: EncodedVariant) -> StoredObject:
+        return storage.put(v.data, fmt=v.format, public_id=public_id(v))
+
+    with ThreadPoolExecutor(max_workers=min(len(variants), CLOUDINARY_UPLOAD_CONCURRENCY)) as pool:
+        futures = [pool.submit(put, v) for v in variants]
+    errors = [e for f in futures if (e := f.exception()) is not None]
+    if errors:
+        destroy_uploaded([f.result().object_id for f in futures if f.exception() is None])
+        raise errors[0]
+    results = [f.result() for f in futures]
+
+    records: list[dict[str, Any]] = [
+        {
+            "uri": res.uri,
+            "format": v.format,
+            "width": v.width,
+            "height": v.height,
+            "bytes": len(v.data),
+        }
+        for v, res in zip(variants, results, strict=True)
+    ]
+    uri = next(r["uri"] for v, r in zip(variants, records, strict=True) if v.primary)
+    return UploadedImage(GeneratedImage(uri, records), [r.object_id for r in results])
+
+
+def generate_bucket_image(
+    source_uri: str,
+    source_hash: str,
+    bucket: int,
+    *,
+    ensure_current: Callable[[], None] = lambda: None,
+    on_stage: Callable[[str], None] = lambda stage: None,
+) -> GeneratedImage:
+    """元画像 + スコアのバケットの生成画像（URL と配信用の変種）を返す
+
+    generated_image_cache にあればそれを返す（Gemini もアップロードも呼ばない）。
+    無ければ生成してアップロードし、キャッシュに登録してから返す。登録した後で
+    ジョブが置き換えられても、画像は次の日記で使えるので消さない。
+    on_stage は生成・アップロードが終わるたびに段階名（app.core.events）で呼ばれる。
+    """
+    log = logging.getLogger("app.bg")
+    key = generated_image_key(source_hash, bucket, GEMINI_IMAGE_MODEL, IMAGE_PROMPT_VERSION)
+    cached = get_generated_image(key)
+    if cached is not None:
+        log.info("Generated image cache hit bucket=%s", bucket)
+        return cached
+
+    ensure_current()
+    log.info("Generating image with score=%s", bucket)
+    with stage_timer("generate"):
+        data = generate_image(bucket, source_uri)
+
+    on_stage(STAGE_GENERATED)
+
+    # 1 回だけデコードして、本体（WebP かそのまま）・AVIF・サムネイルを作る
+    with stage_timer("encode"):
+        variants = encode_variants(data)
+
+    ensure_current()
+    log.info("Uploading %s generated image variants to %s", len(variants), get_storage().name)
+    with stage_timer("upload"):
+        uploaded = upload_variants(variants, folder="generated")
+    on_stage(STAGE_UPLOADED)
+
+    stored = store_generated_image(
+        key, source_hash, bucket, GEMINI_IMAGE_MODEL, IMAGE_PROMPT_VERSION, uploaded.image
+    )
+    if stored.uri != uploaded.image.uri:
+        # 別のワーカーが同じバケットを先に登録していた。こちらは使われないので消す
+        destroy_uploaded(uploaded.object_ids)
+    return stored
+
+
+def process_generated_image(
+    user_id: int,
+    diary_id: int,
+    body: str,
+    *,
+    ensure_current: Callable[[], None] = lambda: None,
+) -> None:
+    """スコア計算 → 画像生成 → アップロード → 保存 を行う
+
+    失敗時は例外をそのまま投げる（ワーカーがリトライ状態を記録する）。
+    ensure_current は外部 API を呼ぶ前と結果を書き込む前に呼ぶ。同じ日記が
+    もう一度編集されていれば JobSuperseded が投げられ、ここで打ち切る。
+
+    画像はユーザーの元画像（users.image_url、スコア 0 の状態）から、スコアを
+    バケットに丸めて生成する。同じ元画像・同じバケットの画像は使い回す。
+    """
+    log = logging.getLogger("app.bg")
+    log.info("BG start user_id=%s diary_id=%s", user_id, diary_id)
+
+    db = SessionLocal()
+    try:
+        # --- A) 元画像 URI を取得 ---
+        user = db.get(User, user_id, options=USER_ONLY)
+        if user is None or not user.image_url:
+            log.error("No image found for the user user_id=%s", user_id)
+            publish_progress(diary_id, STAGE_FAILED, error="no_source_image")
+            return
+        image_uri = user.image_url
+
+        # --- B) スコア計算（外部API） ---
+        ensure_current()
+        log.info("Generating diary score")
+        with stage_timer("score"):
+            score = score_diary(body)
+
+        # --- C) スコアだけを先に確定コミット ---
+        diary = db.query(Diary).filter(Diary.id == diary_id).first()
+        if diary is None:
+            log.error("Diary not found id=%s", diary_id)
+            publish_progress(diary_id, STAGE_FAILED, error="diary_not_found")
+            return
+        # 計算している間に編集されていたら、古い本文のスコアは書かない
+        ensure_current()
+        diary.score = score
+        db.add(diary)
+        with stage_timer("db"):
+            db.commit()  # ★ ここで確定
+            # API プロセスの日記一覧のキャッシュも次の読み取りで無効になる
+            bump_versions_sync(db, DIARIES_SCOPE)
+        log.info("Score updated diary_id=%s score=%s", diary_id, score)
+        publish_progress(diary_id, STAGE_SCORED, score=score)
+
+        # --- D) 生成画像（キャッシュに無ければ生成 & アップロード。失敗してもスコアは残る）---
+        with stage_timer("source"):
+            source_hash = source_image_hash(image_uri, get_clients().http)
+        generated = generate_bucket_image(
+            image_uri,
+            source_hash,
+            score_bucket(score),
+            ensure_current=ensure_current,
+            on_stage=lambda stage: publish_progress(diary_id, stage),
+        )
+
+        # --- E) 画像レコードを保存（別トランザクション）---
+        ensure_current()
+        with stage_timer("db"):
+            img_row = Image(diary_id=diary_id, uri=generated.uri, variants=generated.variants)
+            db.add(img_row)
+            db.flush()
+            image_id = img_row.id
+            # 日記・ユーザーの「最新画像」ポインタも同じトランザクションで更新する
+            for stmt in statements_for_new_image(image_id, diary_id, user_id):
+                db.execute(stmt)
+            db.commit()
+            # API プロセスの全画像一覧・ユーザーの最新画像のキャッシュも無効になる
+            bump_versions_sync(db, IMAGES_SCOPE, user_id)
+        publish_progress(
+            diary_id,
+            STAGE_SAVED,
+            image_id=image_id,
+            uri=generated.uri,
+            variants=generated.variants,
+        )
+        log.info("Image saved diary_id=%s url=%s", diary_id, generated.uri)
+
+    except (JobSuperseded, JobLeaseLost) as e:
+        log.info("BG stopped user_id=%s diary_id=%s: %s", user_id, diary_id, type(e).__name__)
+        db.rollback()
+        raise
+    except UpstreamBusy as e:
+        log.info("BG deferred user_id=%s diary_id=%s: %s", user_id, diary_id, e)
+        db.rollback()
+        raise
+    except Exception:
+        log.exception("BG failed user_id=%s diary_id=%s", user_id, diary_id)
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        log.info("BG done user_id=%s diary_id=%s", user_id, diary_id)
@@ -0,0 +1,320 @@
+"""
+DB をバックエンドにしたジョブキュー
+
+API 側は `enqueue_job` で jobs テーブルに行を追加するだけ（日記の保存と同じ
+トランザクションで確定する）。実処理はワーカー（`python -m app.worker`）が
+`claim_job` で 1 件ずつ取り出し、`complete_job` / `fail_job` で結果を記録する。
+
+環境変数:
+  - JOB_MAX_ATTEMPTS (default: 3)
+  - JOB_VISIBILITY_TIMEOUT (default: 300) 実行中ジョブのリース秒数。段階の区切り
+    （`raise_if_superseded`）ごとに延長するので、1 段階がこれを超えると他のワーカーに
+    取り直される
+  - JOB_RETRY_BASE_SECONDS (default: 10) リトライ間隔の基準秒数（指数的に伸ばす）
+  - JOB_DEBOUNCE_SECONDS (default: 3) 画像生成ジョブを実行可能にするまでの待ち秒数
+
+同じ日記の画像生成ジョブは coalesce_key でまとめる。編集のたびにジョブは積むが、
+実行するのは最新の 1 件だけ:
+
+  - 取り出した時点で同じキーのより新しいジョブがあれば、実行せずに cancelled にする
+  - 実行中も段階ごとに `raise_if_superseded` で確認し、新しいジョブがあれば
+    `JobSuperseded` で打ち切る（ワーカーが cancelled にする）
+
+続けて編集しても、デバウンスの間に来た古いジョブは Gemini を呼ぶ前に捨てられる。
+
+終わりの記録（complete / fail / cancel / defer）は、そのジョブをまだ自分が
+持っているとき（locked_by が自分で status が running）だけ行う。リースが切れて
+他のワーカーに取り直されたジョブを、元のワーカーが上書きしないようにするため。
+"""
+
+import math
+import os
+from typing import Any
+
+from sqlalchemy import ColumnElement, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.events import STAGE_FAILED, add_queued_event, publish_progress
+from app.db import SessionLocal
+from app.models.job import JOB_CANCELLED, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, Job
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_DEBOUNCE_SECONDS = int(os.getenv("JOB_DEBOUNCE_SECONDS", "3"))
+
+# ジョブ種別
+JOB_KIND_GENERATE_IMAGE = "generate_image"
+JOB_KIND_RESCORE = "rescore"
+JOB_KIND_PREWARM_IMAGES = "prewarm_images"
+
+
+class JobSuperseded(Exception):
+    """同じ coalesce_key のより新しいジョブがあるので、このジョブの結果は不要"""
+
+
+class JobLeaseLost(Exception):
+    """リースが切れて他のワーカーに取り直された。このワーカーは結果を書かずに手を引く"""
+
+
+class JobDeferred(Exception):
+    """今は実行しない。retry_after 秒後にやり直す（試行回数には数えない）"""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _seconds_from_now(seconds: int) -> ColumnElement[Any]:
+    """DB サーバーの時計で NOW() + seconds を表す式（ワーカー間の時計ずれを避ける）"""
+    return func.timestampadd(text("SECOND"), seconds, func.now())
+
+
+def enqueue_job(
+    db: Session | AsyncSession,
+    kind: str,
+    payload: dict[str, Any],
+    *,
+    coalesce_key: str | None = None,
+    delay: int = 0,
+) -> Job:
+    """ジョブを追加する（commit は呼び出し側で行う。同期/非同期どちらのセッションでも可）
+
+    coalesce_key を付けると、同じキーのジョブは最新のものだけが実行される。
+    delay 秒後から実行可能になる。
+    """
+    job = Job(kind=kind, payload=payload, max_attempts=JOB_MAX_ATTEMPTS, coalesce_key=coalesce_key)
+    if delay > 0:
+        job.run_after = _seconds_from_now(delay)
+    db.add(job)
+    return job
+
+
+def generation_key(diary_id: int) -> str:
+    return f"diary:{diary_id}"
+
+
+def enqueue_generation(db: Session | AsyncSession, user_id: int, diary_id: int, body: str) -> Job:
+    """スコア計算 + 画像生成ジョブを追加する（同じ日記の古いジョブは実行されなくなる）"""
+    add_queued_event(db, diary_id)
+    return enqueue_job(
+        db,
+        JOB_KIND_GENERATE_IMAGE,
+        {"user_id": user_id, "diary_id": diary_id, "body": body},
+        coalesce_key=generation_key(diary_id),
+        delay=JOB_DEBOUNCE_SECONDS,
+    )
+
+
+def generation_job_rows(items: list[tuple[int, int, str]]) -> list[dict[str, Any]]:
+    """(user_id, diary_id, 本文) ごとの画像生成ジョブを insert(Job) の executemany 用の行にする
+
+    一括インポート用。enqueue_generation と同じジョブだが、デバウンスは付けず
+    （その後に編集されることはない）、queued の進み具合も記録しない。
+    """
+    return [
+        {
+            "kind": JOB_KIND_GENERATE_IMAGE,
+            "payload": {"user_id": user_id, "diary_id": diary_id, "body": body},
+            "max_attempts": JOB_MAX_ATTEMPTS,
+            "coalesce_key": generation_key(diary_id),
+        }
+        for user_id, diary_id, body in items
+    ]
+
+
+def prewarm_key(user_id: int) -> str:
+    return f"prewarm:user:{user_id}"
+
+
+def enqueue_prewarm(db: Session | AsyncSession, user_id: int, delay: int = 0) -> Job:
+    """生成画像の事前生成ジョブを追加する（同じユーザーの古いジョブは実行されなくなる）"""
+    return enqueue_job(
+        db,
+        JOB_KIND_PREWARM_IMAGES,
+        {"user_id": user_id},
+        coalesce_key=prewarm_key(user_id),
+        delay=delay,
+    )
+
+
+def has_runnable_jobs(db: Session, *, exclude_kind: str) -> bool:
+    """exclude_kind 以外で、今すぐ実行できる queued のジョブがあるか"""
+    pending = db.execute(
+        select(Job.id)
+        .where(Job.status == JOB_QUEUED, Job.run_after <= func.now(), Job.kind != exclude_kind)
+        .limit(1)
+    ).scalar()
+    return pending is not None
+
+
+def is_superseded(db: Session, job_id: int, coalesce_key: str | None) -> bool:
+    """同じ coalesce_key でこのジョブより新しいジョブが積まれているか"""
+    if coalesce_key is None:
+        return False
+    newer = db.execute(
+        select(Job.id).where(Job.coalesce_key == coalesce_key, Job.id > job_id).limit(1)
+    ).scalar()
+    return newer is not None
+
+
+def _owned_job(db: Session, job_id: int, worker_id: str) -> Job | None:
+    """自分が実行中のジョブをロックして返す（取り直されていれば None）"""
+    return (
+        db.execute(
+            select(Job)
+            .where(Job.id == job_id, Job.locked_by == worker_id, Job.status == JOB_RUNNING)
+            .with_for_update()
+        )
+        .scalars()
+        .first()
+    )
+
+
+def extend_lease(db: Session, job_id: int, worker_id: str) -> bool:
+    """まだ自分が持っているジョブのリースを JOB_VISIBILITY_TIMEOUT 秒延ばす"""
+    job = _owned_job(db, job_id, worker_id)
+    if job is None:
+        db.rollback()
+        return False
+    job.locked_until = _seconds_from_now(JOB_VISIBILITY_TIMEOUT)
+    db.commit()
+    return True
+
+
+def raise_if_superseded(job_id: int, worker_id: str, coalesce_key: str | None) -> None:
+    """実行中のジョブから段階ごとに呼ぶ
+
+    リースを延ばし、取り直されていれば JobLeaseLost、新しいジョブがあれば JobSuperseded。
+    """
+    with SessionLocal() as db:
+        if not extend_lease(db, job_id, worker_id):
+            raise JobLeaseLost(f"job {job_id} is no longer held by {worker_id}")
+        if is_superseded(db, job_id, coalesce_key):
+            raise JobSuperseded(f"superseded by a newer job for {coalesce_key}")
+
+
+def claim_job(db: Session, worker_id: str) -> Job | None:
+    """実行可能なジョブを 1 件ロックして running にする
+
+    - queued かつ run_after を過ぎたもの
+    - running だが可視性タイムアウトが切れたもの（ワーカーが落ちた等）
+    のどちらかを `FOR UPDATE SKIP LOCKED` で取るので、複数ワーカーでも
+    同じジョブを二重に取ることはない。
+    """
+    candidates = (
+        select(Job)
+        .where(Job.status == JOB_RUNNING, Job.locked_until < func.now())
+        .order_by(Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True),
+        select(Job)
+        .where(Job.status == JOB_QUEUED, Job.run_after <= func.now())
+        .order_by(Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True),
+    )
+
+    for stmt in candidates:
+        while True:
+            job = db.execute(stmt).scalars().first()
+            if job is None:
+                db.rollback()
+                break
+
+            if is_superseded(db, job.id, job.coalesce_key):
+                # 新しい編集が来ているので、モデルを呼ぶ前に捨てる
+                job.status = JOB_CANCELLED
+                job.locked_until = None
+                db.commit()
+                continue
+
+            if job.attempts >= job.max_attempts:
+                # タイムアウトで戻ってきたが、もう試行回数が残っていない
+                job.status = JOB_FAILED
+                job.locked_until = None
+                job.last_error = job.last_error or "visibility timeout exceeded"
+                # commit で属性が読み直しになる前に取っておく
+                diary_id = (
+                    job.payload.get("diary_id") if job.kind == JOB_KIND_GENERATE_IMAGE else None
+                )
+                db.commit()
+                if diary_id is not None:
+                    # ワーカーが落ちたまま終わったので、待っているクライアントに終わりを知らせる
+                    publish_progress(diary_id, STAGE_FAILED, error="lease_expired")
+                continue
+
+            job.status = JOB_RUNNING
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_until = _seconds_from_now(JOB_VISIBILITY_TIMEOUT)
+            db.commit()
+            db.refresh(job)
+            return job
+
+    return None
+
+
+def complete_job(db: Session, job_id: int, worker_id: str) -> bool:
+    """done にする。自分が持っていなければ何もせず False"""
+    job = _owned_job(db, job_id, worker_id)
+    if job is None:
+        db.rollback()
+        return False
+    job.status = JOB_DONE
+    job.locked_until = None
+    job.last_error = None
+    db.commit()
+    return True
+
+
+def fail_job(db: Session, job_id: int, worker_id: str, error: str) -> bool:
+    """失敗を記録し、試行回数が残っていればバックオフ付きで queued に戻す
+
+    試行回数を使い切って failed になったら True を返す（自分が持っていなければ
+    何もせず False）。
+    """
+    job = _owned_job(db, job_id, worker_id)
+    if job is None:
+        db.rollback()
+        return False
+    job.last_error = error[:4000]
+    job.locked_until = None
+    failed = job.attempts >= job.max_attempts
+    if failed:
+        job.status = JOB_FAILED
+    else:
+        job.status = JOB_QUEUED
+        delay = JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+        job.run_after = _seconds_from_now(delay)
+    db.commit()
+    return failed
+
+
+def cancel_job(db: Session, job_id: int, worker_id: str, reason: str) -> bool:
+    """新しいジョブに置き換えられたジョブを cancelled にする（リトライしない）"""
+    job = _owned_job(db, job_id, worker_id)
+    if job is None:
+        db.rollback()
+        return False
+    job.status = JOB_CANCELLED
+    job.locked_until = None
+    job.last_error = reason[:4000]
+    db.commit()
+    return True
+
+
+def defer_job(db: Session, job_id: int, worker_id: str, delay: float, reason: str) -> bool:
+    """上流が混んでいるので delay 秒後に積み直す（試行回数には数えない）"""
+    job = _owned_job(db, job_id, worker_id)
+    if job is None:
+        db.rollback()
+        return False
+    job.status = JOB_QUEUED
+    job.attempts = max(job.attempts - 1, 0)
+    job.locked_until = None
+    job.last_error = reason[:4000]
+    job.run_after = _seconds_from_now(math.ceil(delay))
+    db.commit()
+    return True
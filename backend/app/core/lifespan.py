@@ -3,9 +3,22 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from app.core.clients import close_clients, init_clients
+from app.core.events import stop_relay
+from app.db import close_db, init_db, prewarm_pools
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     """アプリのライフサイクル管理"""
+    # DB エンジンと外部サービス用の keep-alive クライアントを起動時に 1 度だけ作る
+    # （Gemini・Cloudinary の SDK は初めて使うときに読み込む）
+    init_db()
+    init_clients()
+    # DB_POOL_PREWARM 本ずつ接続を開いておく（0 なら何もしない）
+    await prewarm_pools()
     yield
-    # 終了時処理は特になし
+    # SSE 用のイベントリレー（購読があったときだけ動いている）
+    await stop_relay()
+    close_clients()
+    await close_db()
@@ -0,0 +1,361 @@
+"""
+Prometheus 形式のメトリクス
+
+外部ライブラリは使わず、カウンタ・ゲージ・ヒストグラムだけを持つ小さなレジストリを
+プロセス内に置く。記録はロック 1 回 + 加算（ヒストグラムは bisect）なので、
+ホットパスに入れても無視できる程度のコストで済む。
+
+  - API: `GET /metrics`（app.api.metrics）と、ルートごとのレイテンシを記録する
+    `MetricsMiddleware`
+  - ワーカー: 別プロセスなので WORKER_METRICS_PORT で自前の /metrics を開く
+    （`start_metrics_server`）
+
+主なメトリクス:
+  - http_request_duration_seconds{method,route,status}  API のレイテンシ
+  - generation_stage_seconds{stage}  画像生成パイプラインの段階ごとの所要時間
+    （source = 元画像の取得 / score / generate / encode / upload / db = コミット）
+  - job_duration_seconds{kind}  ジョブ 1 回の所要時間（結果によらない）
+  - jobs_total{kind,outcome}  ジョブの結果
+    （done / retried / failed / cancelled / deferred / lease_lost = 他のワーカーに取り直された）
+  - upstream_calls_total{upstream,outcome}  Gemini の呼び出し
+    （ok / error / throttled = 429 / rejected = 呼ぶ前に流量制御で断った）
+  - cache_requests_total{cache,result}  各キャッシュの hit / miss
+    （score / generated_image / source_image / response）
+  - db_pool_*{engine}  接続プールの状態（scrape 時に読む）
+  - db_n_plus_one_total{route} / db_query_budget_exceeded_total{route}
+    SQL の N+1・件数の予算超過（app.core.query_stats）
+
+環境変数:
+  - METRICS_ENABLED (default: true) false なら /metrics とミドルウェアを無効にする
+  - WORKER_METRICS_PORT (default: 9101) ワーカーの /metrics のポート。0 で開かない
+"""
+
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator, Sequence
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from sqlalchemy.pool import Pool
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# API のリクエスト用（秒）
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 外部 API を含む生成パイプライン用（秒）
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+log = logging.getLogger("app.metrics")
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """exposition 形式のサンプル行（HELP / TYPE を除く）"""
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(f"{line}\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """値は set するか、scrape のたびに callback で読む"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Callable[[], dict[LabelValues, float]] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._callback is not None:
+            try:
+                values.update(self._callback())
+            except Exception:
+                log.exception("Gauge callback failed name=%s", self.name)
+        for key, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = HTTP_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [各バケットの件数..., +Inf の件数], 合計
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[i] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """with の中の所要時間を記録する（例外で抜けても記録する）"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(k, list(c), self._sums[k]) for k, c in self._counts.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                labels = _format_labels(self.labelnames, key, le)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_count{labels} {cumulative}"
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "".join(m.render() for m in self._metrics)
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "API request latency by route template",
+        ("method", "route", "status"),
+        HTTP_BUCKETS,
+    )
+)
+GENERATION_STAGE_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "generation_stage_seconds",
+        "Time spent in each stage of the image generation pipeline",
+        ("stage",),
+        STAGE_BUCKETS,
+    )
+)
+JOB_DURATION_SECONDS: Histogram = REGISTRY.register(
+    Histogram("job_duration_seconds", "Wall time of one job attempt", ("kind",), STAGE_BUCKETS)
+)
+JOBS_TOTAL: Counter = REGISTRY.register(
+    Counter("jobs_total", "Finished job attempts by outcome", ("kind", "outcome"))
+)
+UPSTREAM_CALLS_TOTAL: Counter = REGISTRY.register(
+    Counter(
+        "upstream_calls_total", "Gemini calls through the rate limiter", ("upstream", "outcome")
+    )
+)
+CACHE_REQUESTS_TOTAL: Counter = REGISTRY.register(
+    Counter("cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+)
+N_PLUS_ONE_TOTAL: Counter = REGISTRY.register(
+    Counter("db_n_plus_one_total", "Requests that repeated one statement too often", ("route",))
+)
+QUERY_BUDGET_EXCEEDED_TOTAL: Counter = REGISTRY.register(
+    Counter("db_query_budget_exceeded_total", "Requests over their query budget", ("route",))
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS_TOTAL.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def stage_timer(stage: str) -> Any:
+    """`with stage_timer("score"):` で生成パイプラインの段階の所要時間を記録する"""
+    return GENERATION_STAGE_SECONDS.time(stage=stage)
+
+
+# --- DB 接続プール（scrape 時に読む）---
+
+_pools: dict[str, Pool] = {}
+
+
+def register_pool(engine_name: str, pool: Pool) -> None:
+    _pools[engine_name] = pool
+
+
+def _pool_stat(attr: str) -> Callable[[], dict[LabelValues, float]]:
+    def read() -> dict[LabelValues, float]:
+        values: dict[LabelValues, float] = {}
+        for name, pool in _pools.items():
+            stat = getattr(pool, attr, None)
+            if callable(stat):
+                values[(name,)] = float(stat())
+        return values
+
+    return read
+
+
+for _attr, _doc in (
+    ("size", "Configured pool size"),
+    ("checkedout", "Connections currently checked out"),
+    ("checkedin", "Idle connections in the pool"),
+    ("overflow", "Connections opened beyond the pool size"),
+):
+    REGISTRY.register(Gauge(f"db_pool_{_attr}", _doc, ("engine",), callback=_pool_stat(_attr)))
+
+
+# --- API 用のミドルウェア ---
+
+
+class MetricsMiddleware:
+    """ルートのテンプレート（/api/v1/diaries/{diary_id} など）ごとにレイテンシを記録する
+
+    BaseHTTPMiddleware を使わない素の ASGI ミドルウェアなので、SSE のような
+    ストリーミングのレスポンスもそのまま流れる（時間はレスポンスを返し終えるまで）。
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            # 一致しなかったパスはラベルにしない（件数が増え続けるのを防ぐ）
+            template = getattr(route, "path", None) or "<unmatched>"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=template,
+                status=str(status),
+            )
+
+
+# --- ワーカー用の /metrics サーバー ---
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # scrape のたびにアクセスログを出さない
+        pass
+
+
+def start_metrics_server(port: int = WORKER_METRICS_PORT) -> ThreadingHTTPServer | None:
+    """バックグラウンドのスレッドで /metrics を開く（port が 0 なら何もしない）"""
+    if not METRICS_ENABLED or port <= 0:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    log.info("Metrics server listening on :%s", port)
+    return server
@@ -0,0 +1,96 @@
+"""
+生成画像の事前生成
+
+ユーザーが元画像をアップロードしたら、そのユーザーの日記で出そうなスコアの
+バケットを、ワーカーが空いている間に先に生成して generated_image_cache に入れておく。
+日記を保存したときには、たいていキャッシュから画像が返る。
+
+出そうなバケットは、直近の日記のスコアを IMAGE_SCORE_BUCKET_SIZE で丸めたものの
+多い順（日記がまだ無ければ 0）。1 バケットごとに
+
+  - 新しい元画像がアップロードされていれば打ち切る（JobSuperseded）
+  - 他に実行できるジョブがあれば、そちらを優先して積み直す（JobDeferred）
+
+を確認してから生成する。生成済みのバケットは飛ばすので、積み直しても無駄にならない。
+
+環境変数:
+  - IMAGE_PREWARM_ENABLED (default: false) アップロード時に事前生成ジョブを積む
+  - IMAGE_PREWARM_DELAY (default: 60) アップロードから実行可能にするまでの秒数
+  - IMAGE_PREWARM_BUCKETS (default: 3) 事前生成するバケットの数
+  - IMAGE_PREWARM_HISTORY (default: 30) バケットを選ぶのに見る直近の日記の件数
+  - IMAGE_PREWARM_IDLE_RETRY (default: 30) 他のジョブがあったときに積み直す秒数
+"""
+
+import logging
+import os
+from collections import Counter
+from collections.abc import Callable
+from typing import Any
+
+from sqlalchemy import not_, select
+
+from app.core.clients import get_clients
+from app.core.generation import generate_bucket_image
+from app.core.jobs import JOB_KIND_PREWARM_IMAGES, JobDeferred, has_runnable_jobs
+from app.db import SessionLocal
+from app.models.diary import Diary
+from app.models.load_profiles import USER_ONLY
+from app.models.user import User
+from app.utils.generate_image import GEMINI_IMAGE_MODEL, IMAGE_PROMPT_VERSION
+from app.utils.generated_image_cache import cached_buckets, score_bucket, source_image_hash
+
+IMAGE_PREWARM_ENABLED = os.getenv("IMAGE_PREWARM_ENABLED", "false").lower() == "true"
+IMAGE_PREWARM_DELAY = int(os.getenv("IMAGE_PREWARM_DELAY", "60"))
+IMAGE_PREWARM_BUCKETS = int(os.getenv("IMAGE_PREWARM_BUCKETS", "3"))
+IMAGE_PREWARM_HISTORY = int(os.getenv("IMAGE_PREWARM_HISTORY", "30"))
+IMAGE_PREWARM_IDLE_RETRY = float(os.getenv("IMAGE_PREWARM_IDLE_RETRY", "30"))
+
+log = logging.getLogger("app.prewarm")
+
+
+def likely_buckets(scores: list[int], limit: int = IMAGE_PREWARM_BUCKETS) -> list[int]:
+    """直近のスコアから、出そうなバケットを多い順に返す（同数なら 0 に近い方）"""
+    counts = Counter(score_bucket(s) for s in scores or [0])
+    ranked = sorted(counts, key=lambda b: (-counts[b], abs(b)))
+    return ranked[:limit]
+
+
+def _ensure_idle() -> None:
+    with SessionLocal() as db:
+        if has_runnable_jobs(db, exclude_kind=JOB_KIND_PREWARM_IMAGES):
+            raise JobDeferred("other jobs are waiting", IMAGE_PREWARM_IDLE_RETRY)
+
+
+def prewarm_user_images(user_id: int, *, ensure_current: Callable[[], None] = lambda: None) -> int:
+    """ユーザーの出そうなバケットを生成し、新しく生成した数を返す"""
+    with SessionLocal() as db:
+        user = db.get(User, user_id, options=USER_ONLY)
+        if user is None or not user.image_url:
+            log.info("Prewarm skipped, no image user_id=%s", user_id)
+            return 0
+        image_uri = user.image_url
+        scores = list(
+            db.execute(
+                select(Diary.score)
+                .where(Diary.user_id == user_id, not_(Diary.is_deleted))
+                .order_by(Diary.id.desc())
+                .limit(IMAGE_PREWARM_HISTORY)
+            ).scalars()
+        )
+
+    source_hash = source_image_hash(image_uri, get_clients().http)
+    done = cached_buckets(source_hash, GEMINI_IMAGE_MODEL, IMAGE_PROMPT_VERSION)
+    generated = 0
+    for bucket in likely_buckets(scores):
+        if bucket in done:
+            continue
+        ensure_current()
+        _ensure_idle()
+        generate_bucket_image(image_uri, source_hash, bucket, ensure_current=ensure_current)
+        generated += 1
+    log.info("Prewarm done user_id=%s generated=%s", user_id, generated)
+    return generated
+
+
+def run_prewarm_job(payload: dict[str, Any], ensure_current: Callable[[], None]) -> None:
+    prewarm_user_images(payload["user_id"], ensure_current=ensure_current)
@@ -0,0 +1,240 @@
+"""
+リクエストごとの SQL の件数・時間の計測
+
+エンジンの before/after_cursor_execute イベントで、いま計測中のリクエスト
+（contextvars で持つ）に件数・DB 時間・文ごとの回数を足していく。計測していない
+ところ（ワーカーなど）ではコンテキスト変数を 1 回読むだけで何もしない。
+
+`QueryStatsMiddleware` がリクエストごとに計測し、
+
+  - 同じ文（パラメータ違い）が QUERY_N_PLUS_ONE_THRESHOLD 回以上あれば N+1 として警告する
+  - ルーター関数に `@query_budget(n)` が付いていれば、n 件を超えたときに警告する
+  - `@allow_repeated_queries` を付けたルーター関数（一括インポートのように、
+    バッチごとに同じ文を繰り返すもの）は N+1 の判定から外す
+    （QUERY_BUDGET_STRICT=true なら `QueryBudgetExceeded` を投げる。テスト・CI 用）
+  - QUERY_STATS_HEADERS=true ならレスポンスヘッダに件数と時間を付ける（デバッグ用）
+
+    @router.get("/")
+    @query_budget(1)
+    async def read_diaries(...): ...
+
+ルーターを通さずに確かめるときは `assert_max_queries` を、ルーターを一通り呼んで
+確かめるときは `observe_requests` を使う（tools/query_budget_check.py）。
+
+    with assert_max_queries(2):
+        load_something(db)
+
+環境変数:
+  - QUERY_STATS_HEADERS (default: false) X-DB-Query-Count / X-DB-Time-Ms /
+    X-DB-Duplicate-Queries を返す
+  - QUERY_N_PLUS_ONE_THRESHOLD (default: 5) N+1 とみなす同じ文の回数。0 で判定しない
+  - QUERY_BUDGET_STRICT (default: false) 予算を超えたら例外にする
+"""
+
+import logging
+import os
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+from app.core.metrics import N_PLUS_ONE_TOTAL, QUERY_BUDGET_EXCEEDED_TOTAL
+
+QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "false").lower() == "true"
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+
+# ルーター関数に予算を付ける属性名
+_BUDGET_ATTR = "__query_budget__"
+_REPEATS_ATTR = "__query_repeats_allowed__"
+
+log = logging.getLogger("app.query_stats")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class QueryBudgetExceeded(AssertionError):
+    """クエリの件数が予算を超えた"""
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    # 文（パラメータを含まない SQL）ごとの実行回数
+    statements: Counter[str] = field(default_factory=Counter)
+
+    def duplicates(self, threshold: int = QUERY_N_PLUS_ONE_THRESHOLD) -> list[tuple[str, int]]:
+        """threshold 回以上実行された文（多い順）"""
+        if threshold <= 0:
+            return []
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+
+@dataclass(frozen=True)
+class RequestReport:
+    label: str  # "GET /api/v1/diaries/" など
+    endpoint: str  # ルーター関数の名前
+    stats: QueryStats
+    budget: int | None
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.stats.count > self.budget
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+# observe_requests で集めている一覧
+# （TestClient はアプリを別スレッドで動かすので ContextVar にしない）
+_observers: list[list[RequestReport]] = []
+
+
+def _before_execute(
+    conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, many: bool
+) -> None:
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_execute(
+    conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, many: bool
+) -> None:
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info.get("query_started")
+    if started:
+        stats.seconds += time.perf_counter() - started.pop()
+    stats.count += 1
+    stats.statements[statement] += 1
+
+
+def install(*engines: Engine) -> None:
+    """エンジンにイベントを登録する（非同期エンジンは sync_engine を渡す）"""
+    for engine in engines:
+        if not event.contains(engine, "after_cursor_execute", _after_execute):
+            event.listen(engine, "before_cursor_execute", _before_execute)
+            event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """with の中で発行された SQL を数える（入れ子にすると内側だけ数える）"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = "block") -> Iterator[QueryStats]:
+    """with の中の SQL が limit 件を超えたら QueryBudgetExceeded を投げる"""
+    with track_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        raise QueryBudgetExceeded(_describe(label, stats, limit))
+
+
+@contextmanager
+def observe_requests() -> Iterator[list[RequestReport]]:
+    """with の中で処理したリクエストごとの集計を集める（予算超過でも例外にしない）"""
+    reports: list[RequestReport] = []
+    _observers.append(reports)
+    try:
+        yield reports
+    finally:
+        _observers.remove(reports)
+
+
+def query_budget(limit: int) -> Callable[[F], F]:
+    """ルーター関数が 1 リクエストで発行してよい SQL の件数（@router.get の下に付ける）"""
+
+    def decorator(fn: F) -> F:
+        setattr(fn, _BUDGET_ATTR, limit)
+        return fn
+
+    return decorator
+
+
+def budget_of(endpoint: Any) -> int | None:
+    return getattr(endpoint, _BUDGET_ATTR, None)
+
+
+def allow_repeated_queries(fn: F) -> F:
+    """同じ文を何度も発行するのが正しいルーター関数（N+1 として警告しない）"""
+    setattr(fn, _REPEATS_ATTR, True)
+    return fn
+
+
+def _describe(label: str, stats: QueryStats, limit: int) -> str:
+    lines = [f"{label} issued {stats.count} queries (budget {limit})"]
+    lines += [f"  {n}x {s.splitlines()[0][:160]}" for s, n in stats.statements.most_common(5)]
+    return "\n".join(lines)
+
+
+class QueryStatsMiddleware:
+    """リクエストごとに SQL を数え、N+1 と予算超過を報告する（素の ASGI ミドルウェア）"""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+
+            async def send_wrapper(message: dict[str, Any]) -> None:
+                if QUERY_STATS_HEADERS and message["type"] == "http.response.start":
+                    # ストリーミングのレスポンスでは、ヘッダを送るまでの分だけになる
+                    headers = list(message.get("headers", []))
+                    headers += [
+                        (b"x-db-query-count", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.seconds * 1000:.1f}".encode()),
+                        (b"x-db-duplicate-queries", str(len(stats.duplicates())).encode()),
+                    ]
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        route = scope.get("route")
+        if route is not None:
+            self._report(route, stats)
+
+    @staticmethod
+    def _report(route: Any, stats: QueryStats) -> None:
+        label = f"{'/'.join(sorted(getattr(route, 'methods', None) or ()))} {route.path}"
+        endpoint = getattr(route, "endpoint", None)
+        limit = budget_of(endpoint)
+        if _observers:
+            report = RequestReport(label, getattr(endpoint, "__name__", "?"), stats, limit)
+            for reports in _observers:
+                reports.append(report)
+            return
+        duplicates = [] if getattr(endpoint, _REPEATS_ATTR, False) else stats.duplicates()
+        for statement, n in duplicates:
+            N_PLUS_ONE_TOTAL.inc(route=route.path)
+            log.warning(
+                "Possible N+1 in %s: %s identical statements\n  %s",
+                label,
+                n,
+                statement.splitlines()[0][:160],
+            )
+
+        if limit is None or stats.count <= limit:
+            return
+        QUERY_BUDGET_EXCEEDED_TOTAL.inc(route=route.path)
+        message = _describe(label, stats, limit)
+        if QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        log.warning("Query budget exceeded: %s", message)
@@ -0,0 +1,301 @@
+"""
+Gemini 呼び出しの流量制御
+
+プロセス内で共有するガード（テキスト用・画像用）を通してから Gemini を呼ぶ。
+
+    with gemini_text_guard.slot():
+        client.models.generate_content(...)
+
+ガードは次の 3 つを組み合わせる:
+
+  1. トークンバケット: 1 分あたりのリクエスト数（クォータ）を超えないようにする
+  2. AIMD の同時実行数: 成功してレイテンシが目標以下なら上限を少しずつ上げ、
+     429 や目標超えのレイテンシで半分に下げる
+  3. サーキットブレーカー: 5xx・タイムアウトが続いたら一定時間は呼ばずに失敗させる
+
+待ちきれない場合（トークン・枠が GEMINI_MAX_WAIT 秒以内に取れない、429 が返った、
+ブレーカーが開いている）は `UpstreamBusy` を投げる。スレッドで長く sleep して待つ代わりに、
+ワーカーはジョブを retry_after 秒後に積み直す（試行回数には数えない）。
+GEMINI_MAX_WAIT は短くしておく（その間はワーカーのスレッドが止まる）。
+retry_after はジッター付きの指数バックオフなので、一斉に再開することはない。
+
+環境変数:
+  - GEMINI_TEXT_RPM (default: 60) / GEMINI_TEXT_BURST (default: 10)
+  - GEMINI_IMAGE_RPM (default: 10) / GEMINI_IMAGE_BURST (default: 2)
+  - GEMINI_MAX_CONCURRENCY (default: 8) 同時実行数の上限（下限は 1）
+  - GEMINI_TEXT_TARGET_LATENCY (default: 10) / GEMINI_IMAGE_TARGET_LATENCY (default: 60)
+    これを超えたら同時実行数を下げる秒数
+  - GEMINI_MAX_WAIT (default: 0.5) トークン・枠を待つ最大秒数。これより長くかかるなら
+    待たずに UpstreamBusy を投げる
+  - GEMINI_BACKOFF_BASE (default: 2) / GEMINI_BACKOFF_CAP (default: 120) 積み直しの秒数
+  - GEMINI_BREAKER_THRESHOLD (default: 5) ブレーカーを開く連続失敗回数
+  - GEMINI_BREAKER_RESET (default: 30) ブレーカーを開いておく秒数
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from app.core.metrics import UPSTREAM_CALLS_TOTAL
+
+GEMINI_TEXT_RPM = float(os.getenv("GEMINI_TEXT_RPM", "60"))
+GEMINI_TEXT_BURST = int(os.getenv("GEMINI_TEXT_BURST", "10"))
+GEMINI_IMAGE_RPM = float(os.getenv("GEMINI_IMAGE_RPM", "10"))
+GEMINI_IMAGE_BURST = int(os.getenv("GEMINI_IMAGE_BURST", "2"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_TEXT_TARGET_LATENCY = float(os.getenv("GEMINI_TEXT_TARGET_LATENCY", "10"))
+GEMINI_IMAGE_TARGET_LATENCY = float(os.getenv("GEMINI_IMAGE_TARGET_LATENCY", "60"))
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", "0.5"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "2"))
+GEMINI_BACKOFF_CAP = float(os.getenv("GEMINI_BACKOFF_CAP", "120"))
+GEMINI_BREAKER_THRESHOLD = int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+
+log = logging.getLogger("app.rate_limit")
+
+
+class UpstreamBusy(Exception):
+    """今は呼べない。retry_after 秒後にやり直す"""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(UpstreamBusy):
+    """クォータ・同時実行数の上限、または 429"""
+
+
+class CircuitOpen(UpstreamBusy):
+    """ブレーカーが開いている（上流が不調）"""
+
+
+class TokenBucket:
+    """rate 個/秒で補充され、capacity 個まで貯まるトークンバケット"""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """取れたら 0、取れなければ次の 1 個が貯まるまでの秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout: float) -> float:
+        """取れたら 0。timeout 秒以内に取れないなら待たずに、次の 1 個までの秒数を返す"""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._reserve()
+            if wait == 0:
+                return 0.0
+            if time.monotonic() + wait > deadline:
+                return wait
+            # 同時に待っているスレッドが一斉に起きないよう少しずらす
+            time.sleep(wait * random.uniform(1.0, 1.2))
+
+
+class AdaptiveConcurrency:
+    """AIMD で上限を調整するセマフォ"""
+
+    def __init__(self, maximum: int, target_latency: float, minimum: int = 1) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.limit = float(maximum)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._in_flight < int(self.limit), timeout):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency: float, throttled: bool) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if throttled or latency > self.target_latency:
+                # 同じ混雑で何度も下げないよう、目標レイテンシの間は 1 回だけ
+                if now - self._last_decrease > self.target_latency:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+                    log.info("Concurrency decreased to %.1f", self.limit)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """連続失敗で開き、reset_seconds 後に 1 件だけ試す（half-open）"""
+
+    def __init__(self, threshold: int, reset_seconds: float) -> None:
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise CircuitOpen("circuit breaker is open", max(remaining, 1.0))
+            self._probing = True
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def cancel_probe(self) -> None:
+        """呼ばずに終わったとき、half-open の試行枠を返す"""
+        with self._lock:
+            self._probing = False
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                if self._opened_at is None:
+                    log.warning("Circuit breaker opened after %s failures", self._failures)
+                self._opened_at = time.monotonic()
+
+
+def _is_throttled(e: BaseException) -> bool:
+    # slot の中では Gemini を呼んでいるので、どちらも読み込み済み
+    import httpx
+    from google.genai import errors as genai_errors
+
+    if isinstance(e, genai_errors.APIError):
+        return e.code == 429
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code == 429
+    return False
+
+
+def _is_upstream_failure(e: BaseException) -> bool:
+    import httpx
+    from google.genai import errors as genai_errors
+
+    if isinstance(e, genai_errors.APIError):
+        return e.code >= 500
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
+
+class UpstreamGuard:
+    """トークンバケット + AIMD + サーキットブレーカー"""
+
+    def __init__(
+        self,
+        name: str,
+        bucket: TokenBucket,
+        concurrency: AdaptiveConcurrency,
+        breaker: CircuitBreaker,
+        max_wait: float = GEMINI_MAX_WAIT,
+    ) -> None:
+        self.name = name
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.breaker = breaker
+        self.max_wait = max_wait
+        # 連続して絞られた回数（ワーカーの複数のスレッドから読み書きするので _lock の中で）
+        self._throttled_in_a_row = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def backoff(throttled_in_a_row: int) -> float:
+        """連続して絞られた回数に応じたジッター付きの待ち秒数"""
+        exp = min(GEMINI_BACKOFF_CAP, GEMINI_BACKOFF_BASE * 2**throttled_in_a_row)
+        return random.uniform(exp / 2, exp)
+
+    def _throttled(
+        self, message: str, outcome: str = "rejected", at_least: float = 0.0
+    ) -> RateLimited:
+        UPSTREAM_CALLS_TOTAL.inc(upstream=self.name, outcome=outcome)
+        with self._lock:
+            n = self._throttled_in_a_row
+            self._throttled_in_a_row += 1
+        retry_after = max(at_least, self.backoff(n))
+        return RateLimited(f"{self.name}: {message}", retry_after)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """1 回の呼び出し分の枠を取る。取れなければ UpstreamBusy"""
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            UPSTREAM_CALLS_TOTAL.inc(upstream=self.name, outcome="rejected")
+            raise
+        wait = self.bucket.acquire(self.max_wait)
+        if wait > 0:
+            self.breaker.cancel_probe()
+            # 次のトークンが貯まる前に積み直しても、また断られるだけ
+            raise self._throttled("request quota exhausted", at_least=wait)
+        if not self.concurrency.acquire(self.max_wait):
+            self.breaker.cancel_probe()
+            raise self._throttled("too many concurrent requests")
+
+        started = time.monotonic()
+        throttled = False
+        try:
+            yield
+        except Exception as e:
+            if _is_upstream_failure(e):
+                UPSTREAM_CALLS_TOTAL.inc(upstream=self.name, outcome="error")
+                self.breaker.on_failure()
+                raise
+            # 429 やアプリ側の例外は、上流が応答している（ブレーカーとしては成功）
+            self.breaker.on_success()
+            if _is_throttled(e):
+                throttled = True
+                raise self._throttled("upstream returned 429", "throttled") from e
+            UPSTREAM_CALLS_TOTAL.inc(upstream=self.name, outcome="error")
+            raise
+        else:
+            UPSTREAM_CALLS_TOTAL.inc(upstream=self.name, outcome="ok")
+            self.breaker.on_success()
+            with self._lock:
+                self._throttled_in_a_row = 0
+        finally:
+            self.concurrency.release(time.monotonic() - started, throttled)
+
+
+def _guard(name: str, rpm: float, burst: int, target_latency: float) -> UpstreamGuard:
+    return UpstreamGuard(
+        name,
+        TokenBucket(rpm / 60, burst),
+        AdaptiveConcurrency(GEMINI_MAX_CONCURRENCY, target_latency),
+        CircuitBreaker(GEMINI_BREAKER_THRESHOLD, GEMINI_BREAKER_RESET),
+    )
+
+
+gemini_text_guard = _guard(
+    "gemini-text", GEMINI_TEXT_RPM, GEMINI_TEXT_BURST, GEMINI_TEXT_TARGET_LATENCY
+)
+gemini_image_guard = _guard(
+    "gemini-image", GEMINI_IMAGE_RPM, GEMINI_IMAGE_BURST, GEMINI_IMAGE_TARGET_LATENCY
+)
@@ -0,0 +1,105 @@
+"""
+読み取りレプリカの read-your-writes（クライアントごとにプライマリへ固定する）
+
+書き込みを commit したリクエストのレスポンスに、固定の期限（UNIX 時刻）を
+`db_pin` クッキーと `X-DB-Pin` ヘッダで付ける。期限までの読み取りでクライアントが
+どちらかを送り返すと、そのクライアントの読み取りだけプライマリで行う
+（app.api.deps.get_read_db）。ほかのクライアントはレプリカから読むまま。
+
+クッキーを送らないクロスオリジンの fetch では、受け取った X-DB-Pin を次の
+リクエストのヘッダに付ける。レプリカがない（DB_REPLICA_HOST 未設定）ときは何も付けない。
+
+書き込みは commit の時点で記録する。yield の依存の後始末はレスポンスを送った後に
+走るので、そこで決めてもヘッダには間に合わない。
+"""
+
+import math
+import time
+from typing import Any
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from app.db import DB_REPLICA_HOST, DB_REPLICA_PIN_SECONDS
+
+PIN_COOKIE = "db_pin"
+PIN_HEADER = "X-DB-Pin"
+
+# request.state（scope["state"]）に置く固定の期限
+_STATE_KEY = "db_pinned_until"
+
+
+def track_writes(db: AsyncSession, request: Request) -> None:
+    """db が書き込みを commit したら、request のクライアントをプライマリに固定する"""
+    if not DB_REPLICA_HOST:
+        return
+    session = db.sync_session
+    session.info["read_pin_request"] = request
+    event.listen(session, "do_orm_execute", _on_execute)
+    event.listen(session, "after_flush", _on_flush)
+    event.listen(session, "after_commit", _on_commit)
+    event.listen(session, "after_rollback", _on_rollback)
+
+
+def _on_execute(state: ORMExecuteState) -> None:
+    # session.execute(insert(...)) のような Core の文は flush を通らない
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info["read_pin_wrote"] = True
+
+
+def _on_flush(session: Session, flush_context: Any) -> None:
+    session.info["read_pin_wrote"] = True
+
+
+def _on_commit(session: Session) -> None:
+    if session.info.pop("read_pin_wrote", False):
+        request: Request = session.info["read_pin_request"]
+        setattr(request.state, _STATE_KEY, time.time() + DB_REPLICA_PIN_SECONDS)
+
+
+def _on_rollback(session: Session) -> None:
+    session.info.pop("read_pin_wrote", None)
+
+
+def pinned_to_primary(request: Request) -> bool:
+    """クライアントが送り返した固定の期限がまだ切れていなければ True"""
+    value = request.cookies.get(PIN_COOKIE) or request.headers.get(PIN_HEADER)
+    if not value:
+        return False
+    try:
+        remaining = float(value) - time.time()
+    except ValueError:
+        return False
+    # 手で作った遠い期限でずっとプライマリに向かないよう、それより先の期限は無視する
+    return 0 < remaining <= DB_REPLICA_PIN_SECONDS
+
+
+class ReadPinMiddleware:
+    """書き込みを commit したリクエストのレスポンスに固定の期限を付ける（素の ASGI ミドルウェア）"""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not DB_REPLICA_HOST:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            until = scope.get("state", {}).get(_STATE_KEY)
+            if until is not None and message["type"] == "http.response.start":
+                cookie = (
+                    f"{PIN_COOKIE}={until:.3f}; Max-Age={math.ceil(DB_REPLICA_PIN_SECONDS)}; "
+                    "Path=/; SameSite=Lax"
+                )
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"set-cookie", cookie.encode()),
+                    (PIN_HEADER.lower().encode(), f"{until:.3f}".encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
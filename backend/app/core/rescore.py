@@ -0,0 +1,156 @@
+"""
+過去の日記スコアの一括再計算
+
+プロンプトやモデルを変えたあとに Diary.score を付け直すための処理。
+id 順のキーセットで日記を読み、`RESCORE_BATCH_SIZE` 件ずつ 1 リクエストにまとめて
+`RESCORE_CONCURRENCY` 本並列に採点し、結果はまとめて UPDATE する。
+採点には DIARY_SCORER で選んだスコアラー（app.utils.scorers）を使う。
+
+CLI（`python -m app.commands.rescore`）と、管理 API から積まれる
+rescore ジョブ（ワーカーで実行）の両方から使う。
+
+環境変数:
+  - RESCORE_BATCH_SIZE (default: 50) 1 リクエストに詰める日記数
+  - RESCORE_CONCURRENCY (default: 8) 並列リクエスト数
+  - RESCORE_ROUNDS_PER_JOB (default: 10) ジョブ 1 件で処理するラウンド数
+"""
+
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import bindparam, not_, select, update
+
+from app.core.jobs import JOB_KIND_RESCORE, enqueue_job
+from app.core.rate_limit import UpstreamBusy
+from app.db import SessionLocal
+from app.models.diary import Diary
+from app.utils.response_cache import DIARIES_SCOPE, bump_versions_sync
+from app.utils.scorers import get_scorer
+
+RESCORE_BATCH_SIZE = int(os.getenv("RESCORE_BATCH_SIZE", "50"))
+RESCORE_CONCURRENCY = int(os.getenv("RESCORE_CONCURRENCY", "8"))
+RESCORE_ROUNDS_PER_JOB = int(os.getenv("RESCORE_ROUNDS_PER_JOB", "10"))
+
+log = logging.getLogger("app.rescore")
+
+
+# executemany で流す一括 UPDATE。
+# updated_at を自分自身に代入して ON UPDATE CURRENT_TIMESTAMP を止める
+# （「最新の日記」の判定が再採点で変わらないように）
+_UPDATE_SCORE = (
+    update(Diary)
+    .where(Diary.id == bindparam("b_id"))
+    .values(score=bindparam("b_score"), updated_at=Diary.updated_at)
+)
+
+
+@dataclass
+class RescoreResult:
+    last_id: int
+    scored: int
+    missed: int
+    finished: bool
+    # Gemini が混んでいて途中で止めた場合、再開までの秒数
+    retry_after: float | None = None
+
+
+def rescore_diaries(
+    after_id: int = 0,
+    *,
+    batch_size: int = RESCORE_BATCH_SIZE,
+    concurrency: int = RESCORE_CONCURRENCY,
+    max_rounds: int | None = None,
+    dry_run: bool = False,
+) -> RescoreResult:
+    """id が after_id より大きい日記を順に採点し直す
+
+    1 ラウンドで batch_size * concurrency 件を読み、concurrency 本の
+    バッチリクエストを並列に投げる。max_rounds を指定するとその回数で止まり、
+    続きは戻り値の last_id から再開できる。流量制御で断られたバッチがあれば、
+    成功した分を書き込んでそのバッチの手前で止め、retry_after を返す。
+    """
+    last_id = after_id
+    scored = 0
+    missed = 0
+    rounds = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, SessionLocal() as db:
+        while max_rounds is None or rounds < max_rounds:
+            rows = db.execute(
+                select(Diary.id, Diary.body)
+                .where(Diary.id > last_id, not_(Diary.is_deleted))
+                .order_by(Diary.id)
+                .limit(batch_size * concurrency)
+            ).all()
+            if not rows:
+                return RescoreResult(last_id, scored, missed, finished=True)
+
+            batches = [
+                [(r.id, r.body) for r in rows[i : i + batch_size]]
+                for i in range(0, len(rows), batch_size)
+            ]
+            scorer = get_scorer()
+            futures = [pool.submit(scorer.score_batch, batch) for batch in batches]
+            results: dict[int, int] = {}
+            busy: UpstreamBusy | None = None
+            done_up_to = rows[-1].id
+            for batch, future in zip(batches, futures, strict=True):
+                try:
+                    results.update(future.result())
+                except UpstreamBusy as e:
+                    if busy is None:
+                        busy = e
+                        done_up_to = batch[0][0] - 1
+
+            if results and not dry_run:
+                # ORM の bulk update ではなく Core の executemany で流す
+                db.connection().execute(
+                    _UPDATE_SCORE,
+                    [{"b_id": diary_id, "b_score": score} for diary_id, score in results.items()],
+                )
+                db.commit()
+                # 日記一覧のキャッシュを無効にする
+                bump_versions_sync(db, DIARIES_SCOPE)
+
+            scored += len(results)
+            missed += sum(1 for r in rows if r.id <= done_up_to and r.id not in results)
+            last_id = done_up_to
+            rounds += 1
+            log.info("Rescored up to id=%s scored=%s missed=%s", last_id, scored, missed)
+            if busy is not None:
+                return RescoreResult(
+                    last_id, scored, missed, finished=False, retry_after=busy.retry_after
+                )
+
+    return RescoreResult(last_id, scored, missed, finished=False)
+
+
+def run_rescore_job(payload: dict[str, Any]) -> None:
+    """rescore ジョブ 1 件分を実行し、残りがあれば続きのジョブを積む"""
+    batch_size = int(payload.get("batch_size", RESCORE_BATCH_SIZE))
+    result = rescore_diaries(
+        int(payload.get("after_id", 0)),
+        batch_size=batch_size,
+        max_rounds=RESCORE_ROUNDS_PER_JOB,
+    )
+    if result.finished:
+        total = int(payload.get("scored_total", 0)) + result.scored
+        log.info("Rescore finished scored_total=%s", total)
+        return
+
+    with SessionLocal() as db:
+        enqueue_job(
+            db,
+            JOB_KIND_RESCORE,
+            {
+                "after_id": result.last_id,
+                "batch_size": batch_size,
+                "scored_total": int(payload.get("scored_total", 0)) + result.scored,
+            },
+            delay=math.ceil(result.retry_after or 0),
+        )
+        db.commit()
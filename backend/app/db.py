@@ -11,14 +11,48 @@
   - DB_HOST (default: db)
   - DB_PORT (default: 3306)
   - DB_NAME
+  - DB_ASYNC_DRIVER (default: aiomysql) 非同期エンジンで使うドライバ（aiomysql / asyncmy）
+  - DB_POOL_PREWARM (default: 0) API の起動時に開いておく接続数（エンジンごと）
+  - DB_POOL_SIZE (default: 5) / DB_MAX_OVERFLOW (default: 10) 接続プールの大きさ（エンジンごと）
+  - DB_POOL_TIMEOUT (default: 30) プールが空いていないとき接続を待つ秒数
+  - DB_POOL_RECYCLE (default: -1) この秒数より古い接続は使う前に張り直す（-1 で無効）
+  - DB_POOL_PRE_PING (default: true) 接続を使う前に毎回 ping する。切るときは
+    DB_POOL_RECYCLE を MySQL の wait_timeout より短くする
+  - DB_REPLICA_HOST (default: なし) 読み取り用レプリカのホスト（ユーザー・DB 名は共通）
+  - DB_REPLICA_PORT (default: DB_PORT)
+  - DB_REPLICA_PIN_SECONDS (default: 5) 書き込んだクライアントの読み取りをプライマリで行う秒数
+
+同期エンジン（PyMySQL）はワーカーやコマンドから、非同期エンジンは
+async def のエンドポイントから使う。読み取りだけのエンドポイントは `ReadSessionLocal`
+（app.api.deps.get_read_db）を使い、レプリカがあればそちらに向く。
+
+レプリカは遅れて追いつくので、書き込みを commit したクライアントの読み取りは
+DB_REPLICA_PIN_SECONDS 秒プライマリに向ける（自分が書いたものが直後の読み取りで見える。
+クライアントの見分け方は app.core.read_pin）。
+
+エンジンは import では作らない。API は lifespan、ワーカーは起動時に `init_db()` する。
+それ以外（コマンド・ツール）は初めてセッションを作るか `engine` / `async_engine` を
+読んだときに作られる。環境変数の検証もそのときに行う。
 """
 
+import asyncio
 import os
-from collections.abc import Generator
+import threading
+from collections.abc import AsyncGenerator, Generator
+from typing import Any
 
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
+from app.core import query_stats
+from app.core.metrics import register_pool
+
 # -------------------------------------------------------------
 # データベース接続設定
 # -------------------------------------------------------------
@@ -28,19 +62,47 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST", "db")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME")
+DB_ASYNC_DRIVER = os.getenv("DB_ASYNC_DRIVER", "aiomysql")
+DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", "0"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST") or None
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", DB_PORT)
+DB_REPLICA_PIN_SECONDS = float(os.getenv("DB_REPLICA_PIN_SECONDS", "5"))
 
-# 必須の環境変数が設定されているかを検証
-missing_vars = [
-    var
-    for var, val in [("DB_USER", DB_USER), ("DB_PASSWORD", DB_PASSWORD), ("DB_NAME", DB_NAME)]
-    if not val
-]
-if missing_vars:
-    raise RuntimeError(f"Required environment variable(s) missing: {', '.join(missing_vars)}")
-# SQLAlchemy のデータベース URL を組み立て
-DATABASE_URL = (
-    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
-)
+
+def _pool_options() -> dict[str, Any]:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def _database_urls() -> tuple[str, str, str | None]:
+    """同期・非同期・レプリカ（非同期。なければ None）の URL"""
+    # 必須の環境変数が設定されているかを検証
+    missing_vars = [
+        var
+        for var, val in [("DB_USER", DB_USER), ("DB_PASSWORD", DB_PASSWORD), ("DB_NAME", DB_NAME)]
+        if not val
+    ]
+    if missing_vars:
+        raise RuntimeError(f"Required environment variable(s) missing: {', '.join(missing_vars)}")
+
+    # SQLAlchemy のデータベース URL を組み立て
+    def url(driver: str, host: str, port: str) -> str:
+        return f"mysql+{driver}://{DB_USER}:{DB_PASSWORD}@{host}:{port}/{DB_NAME}?charset=utf8mb4"
+
+    replica_url = (
+        url(DB_ASYNC_DRIVER, DB_REPLICA_HOST, DB_REPLICA_PORT) if DB_REPLICA_HOST else None
+    )
+    return url("pymysql", DB_HOST, DB_PORT), url(DB_ASYNC_DRIVER, DB_HOST, DB_PORT), replica_url
 
 
 # -------------------------------------------------------------
@@ -52,8 +114,109 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class _LazySessionMaker(sessionmaker[Session]):
+    """初めてセッションを作るときにエンジンを用意する"""
+
+    def __call__(self, **local_kw: Any) -> Session:
+        if self.kw.get("bind") is None:
+            init_db()
+        return super().__call__(**local_kw)
+
+
+class _LazyAsyncSessionMaker(async_sessionmaker[AsyncSession]):
+    def __call__(self, **local_kw: Any) -> AsyncSession:
+        if self.kw.get("bind") is None:
+            init_db()
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _LazySessionMaker(autocommit=False, autoflush=False)
+# commit 後に属性を読み直さない（非同期では暗黙の I/O が起きないようにする）
+AsyncSessionLocal = _LazyAsyncSessionMaker(autoflush=False, expire_on_commit=False)
+# 読み取り専用（レプリカがなければプライマリに結びつける）
+ReadSessionLocal = _LazyAsyncSessionMaker(autoflush=False, expire_on_commit=False)
+
+_engines: tuple[Engine, AsyncEngine] | None = None
+_replica_engine: AsyncEngine | None = None
+_lock = threading.Lock()
+
+
+def init_db() -> tuple[Engine, AsyncEngine]:
+    """エンジンを作ってセッションに結びつける（2 回目以降は作ったものを返す）"""
+    global _engines, _replica_engine
+    with _lock:
+        if _engines is not None:
+            return _engines
+        database_url, async_database_url, replica_url = _database_urls()
+        engine = create_engine(database_url, **_pool_options())
+        async_engine = create_async_engine(async_database_url, **_pool_options())
+        SessionLocal.configure(bind=engine)
+        AsyncSessionLocal.configure(bind=async_engine)
+
+        # 接続プールの状態を /metrics に出す（値は scrape のときに読む）
+        register_pool("sync", engine.pool)
+        register_pool("async", async_engine.sync_engine.pool)
+        # リクエストごとの SQL の件数・時間（計測中のときだけ数える）
+        query_stats.install(engine, async_engine.sync_engine)
+
+        if replica_url is not None:
+            _replica_engine = create_async_engine(replica_url, **_pool_options())
+            register_pool("replica", _replica_engine.sync_engine.pool)
+            query_stats.install(_replica_engine.sync_engine)
+        ReadSessionLocal.configure(bind=_replica_engine or async_engine)
+        _engines = engine, async_engine
+        return _engines
+
+
+def __getattr__(name: str) -> Any:
+    # `from app.db import engine` は従来どおり使える（そのときにエンジンを作る）
+    if name == "engine":
+        return init_db()[0]
+    if name == "async_engine":
+        return init_db()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def prewarm_pools(n: int = DB_POOL_PREWARM) -> None:
+    """接続を n 本ずつ開いてプールに戻しておく（最初のリクエストが接続を待たない）
+
+    プールの大きさ（pool_size）を超えた分は戻したときに閉じられる。
+    """
+    if n <= 0:
+        return
+    engine, async_engine = init_db()
+
+    async def _open_async(async_engine: AsyncEngine) -> None:
+        conns = await asyncio.gather(*(async_engine.connect().start() for _ in range(n)))
+        for conn in conns:
+            await conn.close()
+
+    def _open_sync() -> None:
+        conns = [engine.connect() for _ in range(n)]
+        for conn in conns:
+            conn.close()
+
+    await asyncio.gather(
+        _open_async(async_engine),
+        *([_open_async(_replica_engine)] if _replica_engine is not None else []),
+        asyncio.to_thread(_open_sync),
+    )
+
+
+async def close_db() -> None:
+    """プールの接続を閉じる（エンジンはそのまま。次に使うときに開き直す）"""
+    if _engines is None:
+        return
+    engine, async_engine = _engines
+    await async_engine.dispose()
+    if _replica_engine is not None:
+        await _replica_engine.dispose()
+    engine.dispose()
+
+
+def read_session_factory(primary: bool = False) -> async_sessionmaker[AsyncSession]:
+    """読み取りに使うセッション（primary ならプライマリ、それ以外はレプリカ）"""
+    return AsyncSessionLocal if primary else ReadSessionLocal
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -77,3 +240,17 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         # 使用後にセッションを閉じてリソースを解放
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """依存注入用の非同期 DB セッションジェネレータ
+
+    async def のエンドポイントで使う。クエリ中もイベントループを止めない。
+
+    使い方例:
+        async def endpoint(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(Diary))
+    """
+
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -3,8 +3,13 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api import media, metrics
 from app.api.v1.router import api_router
 from app.core.lifespan import lifespan
+from app.core.metrics import METRICS_ENABLED, MetricsMiddleware
+from app.core.query_stats import QueryStatsMiddleware
+from app.core.read_pin import PIN_HEADER, ReadPinMiddleware
+from app.utils.storage import STORAGE_BACKEND
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,10 +28,25 @@ def create_app() -> FastAPI:
         allow_origins=["*"],
         allow_methods=["*"],
         allow_headers=["*"],
+        # ページングのカーソル・ETag・レプリカの固定の期限をフロントから読めるようにする
+        expose_headers=["X-Next-Cursor", "ETag", PIN_HEADER],
     )
+    # 書き込んだクライアントの読み取りをしばらくプライマリに向ける（app.core.read_pin）
+    app.add_middleware(ReadPinMiddleware)
+
+    # リクエストごとの SQL の件数（N+1・予算超過の警告、デバッグ用のヘッダ）
+    app.add_middleware(QueryStatsMiddleware)
+    if METRICS_ENABLED:
+        # ルートごとのレイテンシ（最後に追加したものが一番外側になる）
+        app.add_middleware(MetricsMiddleware)
 
     # ルータ登録はここだけ
     app.include_router(api_router)
+    if METRICS_ENABLED:
+        app.include_router(metrics.router)
+    if STORAGE_BACKEND == "local":
+        # ローカルに保存した画像の配信（Cloudinary のときは CDN が配る）
+        app.include_router(media.router)
     return app
 
 
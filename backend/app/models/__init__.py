@@ -1,6 +1,11 @@
 # Base.metadata に全モデルを登録させるための import 集約
 from app.db import Base  # noqa: F401
 
+from .cache_version import CacheVersion  # noqa: F401
 from .diary import Diary  # noqa: F401
+from .generated_image import GeneratedImageCache  # noqa: F401
+from .generation_event import GenerationEvent  # noqa: F401
 from .image import Image  # noqa: F401
+from .job import Job  # noqa: F401
+from .score_cache import DiaryScoreCache  # noqa: F401
 from .user import User  # noqa: F401
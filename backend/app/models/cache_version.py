@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class CacheVersion(Base):
+    """レスポンスキャッシュのスコープごとのバージョン（app.utils.response_cache を参照）
+
+    書き込みを commit した後に上げる。DB に置くので、ワーカーや他の API プロセスの
+    書き込みもキャッシュの確認に届く。
+    """
+
+    __tablename__ = "cache_versions"
+
+    # "user:<id>"（最新画像）・"diaries"（日記一覧）・"images"（全画像一覧）
+    scope: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"CacheVersion(scope={self.scope!r}, version={self.version!r})"
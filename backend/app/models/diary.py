@@ -10,8 +10,10 @@ from sqlalchemy import (
     ForeignKey,
     Index,
     Integer,
+    Select,
     Text,
     not_,
+    select,
     text,
 )
 from sqlalchemy.orm import Mapped, Query, Session, mapped_column, relationship
@@ -50,17 +52,25 @@ class Diary(Base):
     )
     is_deleted: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text("FALSE"))
 
+    # この日記の最新画像（app.core.current_image が更新する。images とは循環するので FK は張らない）
+    latest_image_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     # リレーション
-    user: Mapped[User] = relationship(back_populates="diaries", lazy="joined")
+    # デフォルトでは読み込まない（アクセスすると例外）。必要なクエリで
+    # app.models.load_profiles のプロファイルを options() に渡す
+    user: Mapped[User] = relationship(back_populates="diaries", lazy="raise")
     images: Mapped[list[Image]] = relationship(
         back_populates="diary",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="raise",
     )
 
+    # 実際のアクセスパスに合わせた複合インデックス（db/migrations/002 を参照）
     __table_args__ = (
-        Index("ix_diaries_user_id", "user_id"),
-        Index("ix_diaries_is_deleted", "is_deleted"),
+        # 一覧（date, id 順のキーセット）・日付での検索
+        Index("ix_diaries_is_deleted_date", "is_deleted", "date"),
+        # ユーザーの最新の日記（updated_at 降順）
+        Index("ix_diaries_user_id_is_deleted_updated_at", "user_id", "is_deleted", "updated_at"),
         Index("ix_diaries_created_at", "created_at"),
         CheckConstraint("date BETWEEN 10000101 AND 99991231", name="ck_diaries_date_8digits"),
     )
@@ -71,3 +81,8 @@ class Diary(Base):
     @classmethod
     def active(cls: type[TD], session: Session) -> Query[TD]:
         return session.query(cls).filter(not_(cls.is_deleted))
+
+    @classmethod
+    def select_active(cls: type[TD]) -> Select[tuple[TD]]:
+        """論理削除されていない日記の select（AsyncSession 用）"""
+        return select(cls).where(not_(cls.is_deleted))
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import CHAR, JSON, TIMESTAMP, Index, Integer, String, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class GeneratedImageCache(Base):
+    """(元画像, スコアのバケット, プロンプト) -> アップロード済みの生成画像 URL
+
+    キーはモデル名・プロンプトバージョン・元画像の内容ハッシュ・バケットの SHA-256。
+    """
+
+    __tablename__ = "generated_image_cache"
+
+    cache_key: Mapped[str] = mapped_column(CHAR(64), primary_key=True)
+    source_hash: Mapped[str] = mapped_column(CHAR(64), nullable=False)
+    bucket: Mapped[int] = mapped_column(Integer, nullable=False)
+    model: Mapped[str] = mapped_column(String(64), nullable=False)
+    prompt_version: Mapped[str] = mapped_column(String(16), nullable=False)
+    uri: Mapped[str] = mapped_column(String(255), nullable=False)
+    variants: Mapped[list[dict[str, Any]] | None] = mapped_column(JSON, nullable=True)
+
+    created_at: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP, server_default=text("CURRENT_TIMESTAMP")
+    )
+
+    # 元画像ごとにどのバケットがあるか（事前生成で使う）
+    __table_args__ = (Index("ix_generated_image_cache_source_hash", "source_hash"),)
+
+    def __repr__(self) -> str:
+        return f"GeneratedImageCache(bucket={self.bucket!r}, uri={self.uri!r})"
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import JSON, TIMESTAMP, Index, Integer, String, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class GenerationEvent(Base):
+    """画像生成の進み具合（app.core.events を参照）
+
+    ワーカーが段階ごとに追加し、API プロセスが id の順に読んで SSE で配る。
+    古い行は EVENTS_RETENTION_SECONDS を過ぎたら消す。
+    """
+
+    __tablename__ = "generation_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    diary_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    stage: Mapped[str] = mapped_column(String(16), nullable=False)
+    data: Mapped[dict[str, Any] | None] = mapped_column(JSON, nullable=True)
+
+    created_at: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP, server_default=text("CURRENT_TIMESTAMP")
+    )
+
+    __table_args__ = (
+        # 日記ごとの最新の段階（購読開始時のスナップショット）
+        Index("ix_generation_events_diary_id_id", "diary_id", "id"),
+        Index("ix_generation_events_created_at", "created_at"),
+    )
+
+    def __repr__(self) -> str:
+        return f"GenerationEvent(id={self.id!r}, diary_id={self.diary_id!r}, stage={self.stage!r})"
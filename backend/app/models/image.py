@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-from sqlalchemy import TIMESTAMP, Boolean, ForeignKey, Index, Integer, String, text
+from sqlalchemy import JSON, TIMESTAMP, Boolean, ForeignKey, Index, Integer, String, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db import Base
@@ -20,6 +20,8 @@ class Image(Base):
         ForeignKey("diaries.id", ondelete="RESTRICT"), nullable=False
     )
     uri: Mapped[str] = mapped_column(String(255), nullable=False)
+    # 配信用の変種（形式・サイズ違い）。app.utils.image_variants を参照
+    variants: Mapped[list[dict[str, Any]] | None] = mapped_column(JSON, nullable=True)
 
     created_at: Mapped[datetime | None] = mapped_column(
         TIMESTAMP, server_default=text("CURRENT_TIMESTAMP")
@@ -32,11 +34,20 @@ class Image(Base):
     is_deleted: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text("FALSE"))
 
     # リレーション
-    diary: Mapped[Diary] = relationship(back_populates="images", lazy="joined")
+    diary: Mapped[Diary] = relationship(back_populates="images", lazy="raise")
 
+    # 実際のアクセスパスに合わせた複合インデックス（db/migrations/002 を参照）
     __table_args__ = (
-        Index("ix_images_diary_id", "diary_id"),
-        Index("ix_images_is_deleted", "is_deleted"),
+        # 日記ごとの最新画像（updated_at, id 降順）
+        Index(
+            "ix_images_diary_id_is_deleted_updated_at_id",
+            "diary_id",
+            "is_deleted",
+            "updated_at",
+            "id",
+        ),
+        # 全体での最新画像
+        Index("ix_images_is_deleted_updated_at", "is_deleted", "updated_at"),
         Index("ix_images_created_at", "created_at"),
     )
 
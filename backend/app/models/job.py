@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import (
+    JSON,
+    TIMESTAMP,
+    Index,
+    Integer,
+    String,
+    Text,
+    text,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+# ジョブの状態
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+# 同じ coalesce_key の新しいジョブに置き換えられた
+JOB_CANCELLED = "cancelled"
+
+
+class Job(Base):
+    """バックグラウンド処理のジョブ（DB をキューとして使う）
+
+    API は行を INSERT するだけで、実処理は `python -m app.worker` が
+    `SELECT ... FOR UPDATE SKIP LOCKED` で取り出して実行する。
+    """
+
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+
+    status: Mapped[str] = mapped_column(
+        String(16), nullable=False, server_default=text(f"'{JOB_QUEUED}'")
+    )
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("0"))
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("3"))
+
+    # この時刻以降に実行可能（リトライ時のバックオフに使う）
+    run_after: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP, server_default=text("CURRENT_TIMESTAMP")
+    )
+    # 実行中ジョブの可視性タイムアウト。過ぎたら他のワーカーが取り直せる
+    locked_until: Mapped[datetime | None] = mapped_column(TIMESTAMP, nullable=True)
+    locked_by: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # 同じキーのジョブは最新の 1 件だけを実行する（例: "diary:42"）
+    coalesce_key: Mapped[str | None] = mapped_column(String(64), nullable=True)
+
+    created_at: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP, server_default=text("CURRENT_TIMESTAMP")
+    )
+    updated_at: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP,
+        server_default=text("CURRENT_TIMESTAMP"),
+        server_onupdate=text("CURRENT_TIMESTAMP"),
+    )
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_status_locked_until", "status", "locked_until"),
+        # 「同じキーでより新しいジョブがあるか」を引く（InnoDB なので id も含まれる）
+        Index("ix_jobs_coalesce_key", "coalesce_key"),
+    )
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id!r}, kind={self.kind!r}, status={self.status!r})"
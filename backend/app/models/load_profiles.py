@@ -0,0 +1,27 @@
+"""
+クエリごとのリレーション読み込みプロファイル
+
+モデルのリレーションはすべて lazy="raise"（読み込まず、アクセスすると例外）に
+している。リレーションが必要なクエリだけ、ここで名前を付けたプロファイルを
+`.options(*PROFILE)` で明示的に渡す。
+
+    select(Diary).options(*DIARY_ONLY)
+    await db.get(User, user_id, options=USER_ONLY)
+"""
+
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from app.models.diary import Diary
+from app.models.image import Image
+
+# 列だけを返す（DiaryOut / ImageOut / 更新処理など）。リレーションには触らない
+DIARY_ONLY: tuple[LoaderOption, ...] = (raiseload("*"),)
+IMAGE_ONLY: tuple[LoaderOption, ...] = (raiseload("*"),)
+USER_ONLY: tuple[LoaderOption, ...] = (raiseload("*"),)
+
+# 日記とその画像一覧（画像は 1 回の IN クエリでまとめて読む）
+DIARY_WITH_IMAGES: tuple[LoaderOption, ...] = (selectinload(Diary.images), raiseload("*"))
+
+# 画像とその日記（JOIN で 1 クエリ）
+IMAGE_WITH_DIARY: tuple[LoaderOption, ...] = (joinedload(Image.diary), raiseload("*"))
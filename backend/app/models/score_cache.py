@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import CHAR, TIMESTAMP, Integer, String, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class DiaryScoreCache(Base):
+    """日記本文ハッシュ -> スコア の永続キャッシュ
+
+    キーは正規化した本文・モデル名・プロンプトバージョンの SHA-256。
+    """
+
+    __tablename__ = "diary_score_cache"
+
+    cache_key: Mapped[str] = mapped_column(CHAR(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(64), nullable=False)
+    prompt_version: Mapped[str] = mapped_column(String(16), nullable=False)
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    created_at: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP, server_default=text("CURRENT_TIMESTAMP")
+    )
+
+    def __repr__(self) -> str:
+        return f"DiaryScoreCache(cache_key={self.cache_key!r}, score={self.score!r})"
@@ -30,18 +30,18 @@ class User(Base):
     )
     is_deleted: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text("FALSE"))
 
+    # 今表示する画像（app.core.current_image が更新する）
+    current_image_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     # リレーション
     diaries: Mapped[list[Diary]] = relationship(
         back_populates="user",
         cascade="all, delete-orphan",
-        lazy="selectin",
+        lazy="raise",
     )
 
-    # あると便利なインデックス（論理削除フラグ・作成日）
-    __table_args__ = (
-        Index("ix_users_is_deleted", "is_deleted"),
-        Index("ix_users_created_at", "created_at"),
-    )
+    # あると便利なインデックス（作成日）
+    __table_args__ = (Index("ix_users_created_at", "created_at"),)
 
     def __repr__(self) -> str:
         return f"User(id={self.id!r}, name={self.name!r})"
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class DiaryBase(BaseModel):
@@ -70,3 +70,45 @@ class PostAndPutDiaryResponse(DiaryBase):
     is_deleted: bool
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class DiaryExport(DiaryBase):
+    """エクスポート（NDJSON）の 1 行
+
+    GET /diaries/export が 1 行に 1 件ずつ出力する。そのまま POST /diaries/import に
+    渡せる（created_at / updated_at は読み込み時に無視する）。
+    """
+
+    date: int
+    score: int
+    created_at: datetime | None
+    updated_at: datetime | None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DiaryImport(DiaryBase):
+    """インポート（NDJSON）の 1 行
+
+    属性:
+        body (str): 日記の内容。必須フィールド。
+        date (int): 8桁のYYYYMMDD形式。必須フィールド。
+        score (int | None): 省略するとワーカーが採点するまで仮のスコアになる
+    """
+
+    date: int
+    score: int | None = Field(default=None, ge=-100, le=100)
+
+
+class DiaryImportResult(BaseModel):
+    """インポートの結果
+
+    属性:
+        imported (int): 追加した日記の数
+        skipped (int): 同じ日付の日記が既にあったので追加しなかった行の数
+        queued (int): 採点・画像生成のジョブを積んだ数
+    """
+
+    imported: int
+    skipped: int
+    queued: int
@@ -16,6 +16,19 @@ class ImageBase(BaseModel):
     uri: str
 
 
+class ImageVariant(BaseModel):
+    """配信用の変種（形式・サイズ違い）
+
+    一覧ではサムネイル、大きく表示するときは本体、のように表示サイズに合わせて選ぶ。
+    """
+
+    uri: str
+    format: str
+    width: int
+    height: int
+    bytes: int
+
+
 class ImageOut(ImageBase):
     """レスポンス用スキーマ（Image出力）
 
@@ -30,6 +43,8 @@ class ImageOut(ImageBase):
     created_at: datetime | None
     updated_at: datetime | None
     is_deleted: bool
+    # 変種を作る前に保存された画像は None（uri だけ）
+    variants: list[ImageVariant] | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
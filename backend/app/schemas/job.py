@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class RescoreRequest(BaseModel):
+    """スコア一括再計算の開始リクエスト
+
+    属性:
+        batch_size (int): 1 回の Gemini リクエストに詰める日記数
+        after_id (int): この id より大きい日記から再計算する
+    """
+
+    batch_size: int = Field(default=50, ge=1, le=200)
+    after_id: int = Field(default=0, ge=0)
+
+
+class JobOut(BaseModel):
+    """レスポンス用スキーマ（ジョブ状態）"""
+
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    payload: dict[str, Any]
+    last_error: str | None
+    created_at: datetime | None
+    updated_at: datetime | None
+
+    model_config = ConfigDict(from_attributes=True)
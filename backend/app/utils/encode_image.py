@@ -0,0 +1,95 @@
+"""
+アップロード画像の縮小・WebP 変換
+
+スマホの写真をそのまま送ると数 MB になるので、Cloudinary へ送る前に
+最大辺と最大バイト数を守る WebP に変換する。CPU を使う処理なので
+イベントループからは `run_in_threadpool` 経由で呼ぶこと。
+
+環境変数:
+  - UPLOAD_MAX_SIDE (default: 2048) 変換後の長辺の最大ピクセル数
+  - UPLOAD_MAX_OUTPUT_BYTES (default: 1572864 = 1.5MB) 変換後の最大バイト数
+  - UPLOAD_WEBP_QUALITY (default: 85) WebP の初期品質
+"""
+
+import os
+from io import BytesIO
+from typing import BinaryIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from PIL.Image import Image as PILImage
+
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", "2048"))
+UPLOAD_MAX_OUTPUT_BYTES = int(os.getenv("UPLOAD_MAX_OUTPUT_BYTES", str(1536 * 1024)))
+UPLOAD_WEBP_QUALITY = int(os.getenv("UPLOAD_WEBP_QUALITY", "85"))
+
+# これ以上は品質を下げず、代わりに解像度を下げる
+_MIN_QUALITY = 50
+
+
+def normalize_mode(img: PILImage) -> PILImage:
+    """WebP / AVIF で保存できるモード（RGB か、透過があれば RGBA）にそろえる"""
+    if img.mode in ("RGB", "RGBA"):
+        return img
+    has_alpha = img.mode in ("LA", "PA") or "transparency" in img.info
+    return img.convert("RGBA" if has_alpha else "RGB")
+
+
+def _save_webp(img: PILImage, quality: int) -> bytes:
+    buf = BytesIO()
+    img.save(buf, format="WEBP", quality=quality, method=4)
+    return buf.getvalue()
+
+
+def transcode_to_webp(
+    src: BinaryIO,
+    *,
+    max_side: int = UPLOAD_MAX_SIDE,
+    max_bytes: int = UPLOAD_MAX_OUTPUT_BYTES,
+    quality: int = UPLOAD_WEBP_QUALITY,
+) -> bytes:
+    """
+    画像を縮小して WebP に変換する関数
+
+    長辺を max_side 以下にし、max_bytes を超える場合は品質、次に解像度を
+    段階的に下げる。
+
+    Args:
+        src (BinaryIO): 入力画像（ファイルオブジェクト）
+        max_side (int): 長辺の最大ピクセル数
+        max_bytes (int): 出力の最大バイト数
+        quality (int): WebP の初期品質
+    Returns:
+        bytes: WebP のバイト列
+    Raises:
+        ValueError: 画像として読めない・壊れている・画素数が大きすぎる、
+            または max_bytes に収まらない場合
+    """
+    # Image.open はヘッダを読むだけで、画素のデコードは thumbnail / exif_transpose の
+    # 中で起きる。壊れたファイルや巨大な画像はそこで失敗するので、まとめて ValueError にする
+    try:
+        img: PILImage = Image.open(src)
+        # JPEG は縮小サイズで直接デコードさせる（フルサイズを展開しない）
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img) or img
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        img = normalize_mode(img)
+    except Image.DecompressionBombError as e:
+        raise ValueError("画像の画素数が大きすぎます") from e
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise ValueError(f"画像を読み込めませんでした: {e}") from e
+
+    while True:
+        q = quality
+        data = _save_webp(img, q)
+        while len(data) > max_bytes and q > _MIN_QUALITY:
+            q -= 10
+            data = _save_webp(img, q)
+        if len(data) <= max_bytes:
+            return data
+
+        width, height = img.size
+        if max(width, height) <= 256:
+            raise ValueError("画像を指定サイズ以下に圧縮できませんでした")
+        img = img.resize(
+            (max(1, width * 3 // 4), max(1, height * 3 // 4)), Image.Resampling.LANCZOS
+        )
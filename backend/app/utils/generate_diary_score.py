@@ -1,8 +1,46 @@
-import os
-import time
+import json
+import logging
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
 
 from fastapi import HTTPException
-from google import genai
+from pydantic import BaseModel, ValidationError
+
+from app.core.clients import get_clients
+from app.core.rate_limit import gemini_text_guard
+from app.utils.score_cache import get_cached_score, score_cache_key, store_score
+
+if TYPE_CHECKING:
+    # import に時間がかかるので、実行時は Gemini を呼ぶときに読み込む
+    from google import genai
+
+GEMINI_SCORE_MODEL = "gemini-2.5-flash"
+# プロンプトを変えたら上げる（古いキャッシュを使わないため）
+SCORE_PROMPT_VERSION = "v1"
+
+SCORE_PROMPT = """以下は、ある日の日記です。日記の内容を読み、その内容に基づいて-100から100の範囲で整数のスコアをつけてください。活動的で前向きな内容には高いスコアを、消極的で否定的な内容には低いスコアをつけてください。整数値のみを返し、それ以外は何も含めないことを遵守してください。
+    ### 日記:
+    {diary_body}"""
+
+BATCH_SCORE_PROMPT = (
+    "以下は、複数の日記を JSON 配列にしたものです。"
+    "それぞれの日記の内容を読み、"
+    "その内容に基づいて-100から100の範囲で整数のスコアをつけてください。"
+    "活動的で前向きな内容には高いスコアを、"
+    "消極的で否定的な内容には低いスコアをつけてください。"
+    "各日記の id と score の組を、入力のすべての id について返してください。\n"
+    "    ### 日記一覧:\n"
+    "    {diaries}"
+)
+
+log = logging.getLogger("app.score")
+
+
+class DiaryScoreItem(BaseModel):
+    """バッチ採点で Gemini に返させる 1 件分の構造"""
+
+    id: int
+    score: int
 
 
 def check_response(response: str) -> bool:
@@ -22,28 +60,35 @@ def check_response(response: str) -> bool:
         return False
 
 
-def generate_diary_score_using_Gemini(diary_body: str) -> int:
+def generate_diary_score_using_Gemini(diary_body: str, client: "genai.Client | None" = None) -> int:
     """
     Geminiを使って日記のスコアを生成する関数
 
+    同じ本文（正規化後）・モデル・プロンプトの組み合わせはキャッシュから返し、
+    Gemini は呼ばない。呼び出しは共有の流量制御を通し、枠が取れなければ
+    UpstreamBusy を投げる（スレッドで待たず、ワーカーがジョブを積み直す）。
+
     Args:
         diary_body (str): 日記の内容
+        client (genai.Client | None): 使う Gemini クライアント。省略時は共有クライアント
     Returns:
         int: 生成されたスコア（-100~100）
     """
 
-    # API-KEYの設定
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    client = genai.Client(api_key=GEMINI_API_KEY)
+    cache_key = score_cache_key(diary_body, GEMINI_SCORE_MODEL, SCORE_PROMPT_VERSION)
+    cached = get_cached_score(cache_key)
+    if cached is not None:
+        return cached
 
-    prompt = f"""以下は、ある日の日記です。日記の内容を読み、その内容に基づいて-100から100の範囲で整数のスコアをつけてください。活動的で前向きな内容には高いスコアを、消極的で否定的な内容には低いスコアをつけてください。整数値のみを返し、それ以外は何も含めないことを遵守してください。
-    ### 日記:
-    {diary_body}"""
+    client = client or get_clients().genai
+
+    prompt = SCORE_PROMPT.format(diary_body=diary_body)
 
     i = 0
     while True:
         i += 1
-        response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
+        with gemini_text_guard.slot():
+            response = client.models.generate_content(model=GEMINI_SCORE_MODEL, contents=prompt)
 
         if not response:
             raise HTTPException(status_code=502, detail="Gemini response is empty")
@@ -55,8 +100,77 @@ def generate_diary_score_using_Gemini(diary_body: str) -> int:
         if is_correct_response:
             break
 
+        # 形式違いはすぐに取り直す（間隔はトークンバケットが空ける）
         if i >= 5:
             raise HTTPException(status_code=402, detail="Failed to get response from gemini")
-        time.sleep(1)
 
-    return int(response.text)
+    score = int(response.text)
+    store_score(cache_key, GEMINI_SCORE_MODEL, SCORE_PROMPT_VERSION, score)
+    return score
+
+
+def _parse_batch_response(text: str, ids: set[int]) -> dict[int, int]:
+    """バッチ採点のレスポンスを id -> score にする（不正な要素は捨てる）"""
+    try:
+        items = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    scores: dict[int, int] = {}
+    for raw in items:
+        try:
+            item = DiaryScoreItem.model_validate(raw)
+        except ValidationError:
+            continue
+        if item.id in ids and -100 <= item.score <= 100:
+            scores[item.id] = item.score
+    return scores
+
+
+def generate_diary_scores_batch(
+    diaries: Sequence[tuple[int, str]], client: "genai.Client | None" = None
+) -> dict[int, int]:
+    """
+    複数の日記を 1 回の Gemini リクエストでまとめて採点する関数
+
+    構造化出力（JSON）で id -> score を受け取る。返ってこなかった id は
+    残りだけでもう 1 度だけ問い合わせ、それでも無いものは結果に含めない。
+
+    Args:
+        diaries (Sequence[tuple[int, str]]): (日記ID, 本文) の並び
+        client (genai.Client | None): 使う Gemini クライアント。省略時は共有クライアント
+    Returns:
+        dict[int, int]: 日記ID -> スコア（-100~100）
+    """
+    from google.genai import types as genai_types
+
+    client = client or get_clients().genai
+    config = genai_types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=list[DiaryScoreItem],
+    )
+
+    scores: dict[int, int] = {}
+    pending = list(diaries)
+    for _ in range(2):
+        if not pending:
+            break
+        prompt = BATCH_SCORE_PROMPT.format(
+            diaries=json.dumps(
+                [{"id": diary_id, "body": body} for diary_id, body in pending],
+                ensure_ascii=False,
+            )
+        )
+        with gemini_text_guard.slot():
+            response = client.models.generate_content(
+                model=GEMINI_SCORE_MODEL, contents=prompt, config=config
+            )
+        if response and response.text:
+            scores.update(_parse_batch_response(response.text, {i for i, _ in pending}))
+        pending = [(i, body) for i, body in pending if i not in scores]
+
+    if pending:
+        log.warning("Batch scoring returned no score for %s diaries", len(pending))
+    return scores
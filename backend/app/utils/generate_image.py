@@ -1,22 +1,51 @@
-import os
+import logging
 from io import BytesIO
+from typing import TYPE_CHECKING
 from urllib.parse import urlparse
 
-import httpx
-from google import genai
-from google.genai import types as genai_types
 from PIL import Image, UnidentifiedImageError
-from PIL.Image import Image as PILImage
 
+from app.core.clients import get_clients
+from app.core.rate_limit import gemini_image_guard
+from app.utils.image_cache import get_image_cache
+from app.utils.storage import local_path_for
 
-def load_image_from_uri(img_uri: str) -> Image.Image:
-    """ローカルパス or http(s) どちらでも Image を返す"""
+if TYPE_CHECKING:
+    # import に時間がかかるので、実行時は共有クライアント（app.core.clients）が読み込む
+    import httpx
+    from google import genai
+    from google.genai import types as genai_types
+
+GEMINI_IMAGE_MODEL = "gemini-2.5-flash-image"
+# プロンプトを変えたら上げる（古い生成画像のキャッシュを使わないため）
+IMAGE_PROMPT_VERSION = "v1"
+
+log = logging.getLogger("app.generate_image")
+
+
+def load_image_from_uri(img_uri: str, http: "httpx.Client | None" = None) -> Image.Image:
+    """ローカルパス or http(s) どちらでも Image を返す
+
+    http を省略した場合は共有の keep-alive クライアントを使う。
+    local に保存した画像（MEDIA_BASE_URL の URL）はディスクから直接読み、
+    それ以外の http(s) の画像はローカルのディスクキャッシュ経由で読み込む。
+    """
+    path = local_path_for(img_uri)
+    if path is not None:
+        try:
+            return Image.open(path)
+        except UnidentifiedImageError as e:
+            raise ValueError(f"保存済みの画像を開けませんでした: {e}") from e
     parsed = urlparse(img_uri)
     if parsed.scheme in ("http", "https"):
-        with httpx.Client(timeout=15) as client:
-            r = client.get(img_uri)
-            r.raise_for_status()
+        http = http or get_clients().http
+        cache = get_image_cache()
         try:
+            if cache is not None:
+                # ファイルから開くので、全体をメモリに載せずに必要な分だけ読む
+                return Image.open(cache.fetch(img_uri, http).path)
+            r = http.get(img_uri, timeout=15)
+            r.raise_for_status()
             return Image.open(BytesIO(r.content))
         except UnidentifiedImageError as e:
             raise ValueError(f"URLの画像を開けませんでした: {e}") from e
@@ -25,31 +54,32 @@ def load_image_from_uri(img_uri: str) -> Image.Image:
         return Image.open(img_uri)
 
 
-def generate_image(score: int, img_uri: str) -> PILImage:
+def generate_image(score: int, img_uri: str, client: "genai.Client | None" = None) -> bytes:
     """
     スコアによって現在のユーザーの画像の変化後画像を生成する関数
 
     Args:
         score (int): 日記スコア
         img_uri (str): 入力画像のuri
+        client (genai.Client | None): 使う Gemini クライアント。省略時は共有クライアント
     Returns:
-        ImageFile: 生成した変化画像
+        bytes: 生成した変化画像（Gemini が返した inline_data をデコードせずにそのまま返す。
+            配信用の変換は app.utils.image_variants で行う）
     """
 
-    # API-KEYの設定
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    client = genai.Client(api_key=GEMINI_API_KEY)
+    client = client or get_clients().genai
 
     # prompt = f"Based on the score, please change the person's facial expression, background, age, and health status in the image. The score is defined as an integer value ranging from -100 to 100, assigned based on the content of a diary entry. The score for the uploaded image is 0. Active and positive content reflects a high score, while passive and negative content reflects a low score. The given score is{score}"
     prompt = f"Based on the score, please modify the person's facial expression, age, background, and health status in the image. Specifically, the health status score is defined as an integer score ranging from -100 to 100, based on the content of a diary. The score for the uploaded image is 0. Active and positive content reflects a high score, while passive and negative content reflects a low score.When adjusting health status, reflect the score through visible physical changes such as the amount of gray or white hair, facial fullness or thinness, and the presence or depth of wrinkles. A higher score should indicate a healthier, more energetic appearance, while a lower score should show signs of fatigue or aging.The given score is {score}"
 
     image = load_image_from_uri(img_uri)
+    contents: list[genai_types.PartUnionDict] = [prompt, image]
 
-    response: genai_types.GenerateContentResponse = client.models.generate_content(
-        model="gemini-2.5-flash-image",
-        contents=[prompt, image],
-    )
-    new_img_uri = "test3.png"
+    with gemini_image_guard.slot():
+        response: genai_types.GenerateContentResponse = client.models.generate_content(
+            model=GEMINI_IMAGE_MODEL,
+            contents=contents,
+        )
 
     if not response.candidates:
         raise ValueError("No candidates in Gemini response")
@@ -64,14 +94,14 @@ def generate_image(score: int, img_uri: str) -> PILImage:
 
     for part in parts:
         if part.text is not None:
-            print(part.text)
+            log.debug("Gemini text part: %s", part.text)
         elif part.inline_data is not None and part.inline_data.data is not None:
-            image = Image.open(BytesIO(part.inline_data.data))
-            image.save(os.path.join("/app/images", new_img_uri))
-    return image
+            return part.inline_data.data
+    raise ValueError("No image in Gemini response")
 
 
 if __name__ == "__main__":
     score = -50
     img_uri = "/app/images/young-woman-walking-through-neighborhood.jpg"
-    generate_image(score, img_uri)
+    with open("/app/images/test3.png", "wb") as f:
+        f.write(generate_image(score, img_uri))
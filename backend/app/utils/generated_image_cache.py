@@ -0,0 +1,120 @@
+"""
+生成画像のキャッシュ
+
+画像生成の結果は元画像とスコアだけで決まり、62 と 64 のような近いスコアでは
+見た目がほとんど変わらない。そこでスコアを `IMAGE_SCORE_BUCKET_SIZE` 刻みの
+バケットに丸めて生成し、(元画像の内容ハッシュ, バケット, モデル, プロンプト) ->
+アップロード済みの URL（と配信用の変種）を generated_image_cache テーブルに保存して使い回す。
+
+環境変数:
+  - IMAGE_SCORE_BUCKET_SIZE (default: 10) スコアを丸める幅（1 で丸めない）
+"""
+
+import hashlib
+import logging
+import math
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert
+
+from app.core.metrics import record_cache
+from app.db import SessionLocal
+from app.models.generated_image import GeneratedImageCache
+from app.utils.image_cache import get_image_cache
+from app.utils.storage import LOCAL_OBJECT_NAME, local_path_for
+
+if TYPE_CHECKING:
+    import httpx
+
+IMAGE_SCORE_BUCKET_SIZE = int(os.getenv("IMAGE_SCORE_BUCKET_SIZE", "10"))
+
+log = logging.getLogger("app.generated_image_cache")
+
+
+@dataclass(frozen=True)
+class GeneratedImage:
+    uri: str
+    variants: list[dict[str, Any]] | None
+
+
+def score_bucket(score: int, size: int = IMAGE_SCORE_BUCKET_SIZE) -> int:
+    """スコアをバケットの代表値に丸める（-100〜100 の範囲に収める）"""
+    if size <= 1:
+        return score
+    # round() は偶数丸めなので、ちょうど中間（65 など）は上のバケットにそろえる
+    return max(-100, min(100, math.floor(score / size + 0.5) * size))
+
+
+def source_image_hash(uri: str, http: "httpx.Client") -> str:
+    """元画像の内容ハッシュ（ディスクキャッシュ経由。無効なら毎回ダウンロード）"""
+    path = local_path_for(uri)
+    if path is not None:
+        # local の名前は内容の SHA-256 そのもの（ファイルも HTTP も読まなくてよい）
+        m = LOCAL_OBJECT_NAME.match(path.name)
+        if m is not None:
+            return m.group(1)
+    cache = get_image_cache()
+    if cache is not None:
+        return cache.fetch(uri, http).sha256
+    r = http.get(uri, timeout=15)
+    r.raise_for_status()
+    return hashlib.sha256(r.content).hexdigest()
+
+
+def generated_image_key(source_hash: str, bucket: int, model: str, prompt_version: str) -> str:
+    raw = f"{model}\0{prompt_version}\0{source_hash}\0{bucket}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_generated_image(key: str) -> GeneratedImage | None:
+    """キャッシュ済みの生成画像。無ければ（引けなければ）None"""
+    try:
+        with SessionLocal() as db:
+            row = db.get(GeneratedImageCache, key)
+    except Exception:
+        log.exception("Generated image cache lookup failed")
+        record_cache("generated_image", hit=False)
+        return None
+    record_cache("generated_image", hit=row is not None)
+    return GeneratedImage(row.uri, row.variants) if row is not None else None
+
+
+def cached_buckets(source_hash: str, model: str, prompt_version: str) -> set[int]:
+    """この元画像について生成済みのバケット"""
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(GeneratedImageCache.bucket).where(
+                GeneratedImageCache.source_hash == source_hash,
+                GeneratedImageCache.model == model,
+                GeneratedImageCache.prompt_version == prompt_version,
+            )
+        ).scalars()
+        return set(rows)
+
+
+def store_generated_image(
+    key: str, source_hash: str, bucket: int, model: str, prompt_version: str, image: GeneratedImage
+) -> GeneratedImage:
+    """保存して、そのキーの画像を返す（同時に生成された場合は先に保存された方を返す）"""
+    stmt = insert(GeneratedImageCache).values(
+        cache_key=key,
+        source_hash=source_hash,
+        bucket=bucket,
+        model=model,
+        prompt_version=prompt_version,
+        uri=image.uri,
+        variants=image.variants,
+    )
+    stmt = stmt.on_duplicate_key_update(uri=GeneratedImageCache.uri)
+    try:
+        with SessionLocal() as db:
+            db.execute(stmt)
+            db.commit()
+            row = db.get(GeneratedImageCache, key)
+            return GeneratedImage(row.uri, row.variants) if row is not None else image
+    except Exception:
+        log.exception("Generated image cache store failed")
+        return image
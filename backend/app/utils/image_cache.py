@@ -0,0 +1,206 @@
+"""
+元画像のローカルディスクキャッシュ
+
+画像生成の入力に使う画像（Cloudinary 上の URL）を毎回ダウンロードしないよう、
+ローカルに保存して使い回す。
+
+  <IMAGE_CACHE_DIR>/objects/<内容の sha256>   画像本体（同じ内容は 1 ファイル）
+  <IMAGE_CACHE_DIR>/refs/<URI の sha256>.json  URI -> 内容ハッシュ / ETag / Last-Modified
+
+2 回目以降は ETag / Last-Modified で条件付き GET を送り、304 ならローカルのファイルを
+そのまま使う。ダウンロードはストリーミングでファイルへ書き出し、読み込みもファイルから
+行う（Pillow が必要な分だけ読む）。合計サイズが上限を超えたら最終アクセスの古い順に消す。
+
+環境変数:
+  - IMAGE_CACHE_DIR (default: /tmp/app-image-cache)
+  - IMAGE_CACHE_MAX_BYTES (default: 536870912 = 512MB) 0 でキャッシュ無効
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from app.core.metrics import record_cache
+
+if TYPE_CHECKING:
+    import httpx
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "/tmp/app-image-cache")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_CHUNK_SIZE = 64 * 1024
+
+log = logging.getLogger("app.image_cache")
+
+
+@dataclass(frozen=True)
+class CachedImage:
+    path: Path
+    sha256: str
+    size: int
+
+
+class ImageCache:
+    """URI をキーにした、サイズ上限付きの LRU ディスクキャッシュ"""
+
+    def __init__(self, root: str | Path, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._objects = self.root / "objects"
+        self._refs = self.root / "refs"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._refs.mkdir(parents=True, exist_ok=True)
+        self._evict_lock = threading.Lock()
+
+    def fetch(self, uri: str, http: "httpx.Client") -> CachedImage:
+        """URI の画像をキャッシュ経由で取得し、ローカルファイルの情報を返す"""
+        import httpx
+
+        ref = self._read_ref(uri)
+        cached = self._lookup(ref)
+
+        headers: dict[str, str] = {}
+        if cached is not None and ref is not None:
+            if ref.get("etag"):
+                headers["If-None-Match"] = ref["etag"]
+            if ref.get("last_modified"):
+                headers["If-Modified-Since"] = ref["last_modified"]
+
+        try:
+            with http.stream("GET", uri, headers=headers, timeout=15) as r:
+                if r.status_code == 304 and cached is not None:
+                    record_cache("source_image", hit=True)
+                    self._touch(cached.path)
+                    return cached
+                r.raise_for_status()
+                stored = self._store(r)
+                etag = r.headers.get("etag")
+                last_modified = r.headers.get("last-modified")
+        except httpx.HTTPError:
+            if cached is None:
+                raise
+            # 再検証に失敗しても手元のコピーがあればそれを使う
+            log.warning("Revalidation failed, serving cached copy uri=%s", uri, exc_info=True)
+            record_cache("source_image", hit=True)
+            self._touch(cached.path)
+            return cached
+
+        record_cache("source_image", hit=False)
+        self._write_ref(
+            uri,
+            {
+                "uri": uri,
+                "sha256": stored.sha256,
+                "size": stored.size,
+                "etag": etag,
+                "last_modified": last_modified,
+            },
+        )
+        self._evict()
+        return stored
+
+    # --- 内部処理 ---
+
+    def _ref_path(self, uri: str) -> Path:
+        return self._refs / f"{hashlib.sha256(uri.encode('utf-8')).hexdigest()}.json"
+
+    def _read_ref(self, uri: str) -> dict[str, Any] | None:
+        try:
+            with open(self._ref_path(uri), encoding="utf-8") as f:
+                ref: dict[str, Any] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return ref if ref.get("uri") == uri else None
+
+    def _write_ref(self, uri: str, ref: dict[str, Any]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self._refs, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(ref, f)
+        os.replace(tmp, self._ref_path(uri))
+
+    def _lookup(self, ref: dict[str, Any] | None) -> CachedImage | None:
+        if ref is None:
+            return None
+        path = self._objects / ref["sha256"]
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return None
+        return CachedImage(path=path, sha256=ref["sha256"], size=size)
+
+    def _store(self, response: "httpx.Response") -> CachedImage:
+        """レスポンス本体を一時ファイルへストリーミングし、内容ハッシュの名前で確定する"""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self._objects, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_bytes(_CHUNK_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            sha = digest.hexdigest()
+            path = self._objects / sha
+            # 同じ内容がすでにあれば置き換えるだけ（重複しない）
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        return CachedImage(path=path, sha256=sha, size=size)
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self) -> None:
+        if self.max_bytes <= 0:
+            return
+        with self._evict_lock:
+            entries: list[tuple[float, int, Path]] = []
+            total = 0
+            for path in self._objects.iterdir():
+                if path.suffix == ".tmp":
+                    continue
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            # 最終アクセスが古い順に消す（参照 json は本体が無ければミス扱いになる）
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                log.info("Evicted cached image %s", path.name)
+
+
+_cache: ImageCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache | None:
+    """プロセス共通のキャッシュを返す（無効化されていれば None）"""
+    global _cache
+    if IMAGE_CACHE_MAX_BYTES <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES)
+    return _cache
@@ -0,0 +1,109 @@
+"""
+生成画像の配信用エンコード
+
+Gemini が返した画像（たいてい 1024px 前後の PNG で 1〜2MB）を、そのまま
+フロントに配らずに、1 回だけデコードして次の変種を作る。
+
+  - 本体: 受け取ったバイト列が WebP / JPEG / AVIF で GENERATED_PASSTHROUGH_MAX_BYTES
+    以下なら再エンコードせずにそのまま使う。それ以外は WebP に変換する
+  - 本体の AVIF 版（Pillow が AVIF に対応していれば）
+  - サムネイル: GENERATED_THUMBNAIL_SIZES の長辺ごとに WebP（と AVIF）
+
+サムネイルは大きい順に、1 つ前の縮小結果から縮小する（毎回フルサイズから縮めない）。
+CPU を使う処理なのでワーカーから呼ぶ。
+
+環境変数:
+  - GENERATED_THUMBNAIL_SIZES (default: 256,512) サムネイルの長辺（カンマ区切り）
+  - GENERATED_WEBP_QUALITY (default: 82)
+  - GENERATED_AVIF_QUALITY (default: 60)
+  - GENERATED_AVIF_ENABLED (default: true) AVIF も作る（Pillow が対応していなければ作らない）
+  - GENERATED_PASSTHROUGH_MAX_BYTES (default: 1048576 = 1MB) これ以下ならそのまま使う
+"""
+
+import os
+from dataclasses import dataclass
+from io import BytesIO
+
+from PIL import Image, UnidentifiedImageError, features
+from PIL.Image import Image as PILImage
+
+from app.utils.encode_image import normalize_mode
+
+GENERATED_THUMBNAIL_SIZES = tuple(
+    sorted(
+        {int(s) for s in os.getenv("GENERATED_THUMBNAIL_SIZES", "256,512").split(",") if s.strip()},
+        reverse=True,
+    )
+)
+GENERATED_WEBP_QUALITY = int(os.getenv("GENERATED_WEBP_QUALITY", "82"))
+GENERATED_AVIF_QUALITY = int(os.getenv("GENERATED_AVIF_QUALITY", "60"))
+GENERATED_AVIF_ENABLED = os.getenv("GENERATED_AVIF_ENABLED", "true").lower() == "true"
+GENERATED_PASSTHROUGH_MAX_BYTES = int(
+    os.getenv("GENERATED_PASSTHROUGH_MAX_BYTES", str(1024 * 1024))
+)
+
+# 配信にそのまま使ってよい形式（PNG は大きいので変換する）
+_PASSTHROUGH_FORMATS = {"WEBP", "JPEG", "AVIF"}
+
+
+@dataclass(frozen=True)
+class EncodedVariant:
+    data: bytes
+    format: str  # "webp" / "avif" / "jpeg"
+    width: int
+    height: int
+    # 本体（images.uri に入れるもの）なら True、サムネイル・別形式なら False
+    primary: bool = False
+
+
+def avif_available() -> bool:
+    return GENERATED_AVIF_ENABLED and bool(features.check("avif"))
+
+
+def _encode(img: PILImage, fmt: str) -> bytes:
+    buf = BytesIO()
+    if fmt == "avif":
+        img.save(buf, format="AVIF", quality=GENERATED_AVIF_QUALITY)
+    else:
+        img.save(buf, format="WEBP", quality=GENERATED_WEBP_QUALITY, method=4)
+    return buf.getvalue()
+
+
+def encode_variants(
+    data: bytes, *, sizes: tuple[int, ...] = GENERATED_THUMBNAIL_SIZES
+) -> list[EncodedVariant]:
+    """生成画像のバイト列から配信用の変種を作る（先頭が本体）
+
+    Raises:
+        ValueError: 画像として読めない場合
+    """
+    try:
+        src: PILImage = Image.open(BytesIO(data))
+        src.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"生成画像を読み込めませんでした: {e}") from e
+
+    source_format = (src.format or "").upper()
+    img = normalize_mode(src)
+    width, height = img.size
+    formats = ["webp", "avif"] if avif_available() else ["webp"]
+
+    variants: list[EncodedVariant] = []
+    if source_format in _PASSTHROUGH_FORMATS and len(data) <= GENERATED_PASSTHROUGH_MAX_BYTES:
+        # 既に配信に向いた形式なので、再エンコードしない（画質も落ちない）
+        variants.append(EncodedVariant(data, source_format.lower(), width, height, primary=True))
+    else:
+        variants.append(EncodedVariant(_encode(img, "webp"), "webp", width, height, primary=True))
+    for fmt in formats:
+        if fmt != variants[0].format:
+            variants.append(EncodedVariant(_encode(img, fmt), fmt, width, height))
+
+    thumb = img
+    for size in sizes:
+        if size >= max(thumb.size):
+            continue
+        thumb = thumb.copy()
+        thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            variants.append(EncodedVariant(_encode(thumb, fmt), fmt, *thumb.size))
+    return variants
@@ -0,0 +1,369 @@
+"""
+ローカル（CPU）で動く日記スコアラー
+
+日本語の感情語彙（語 → 極性 -1.0〜1.0）を文字 n-gram（2, 3 文字）に分解して
+ハッシュした重みベクトルを作っておき、日記も同じように n-gram に分解して
+重みを足し合わせる。分かち書きをしないので、活用形（嬉しい / 嬉しかった）や
+表記の揺れにもある程度効く。
+
+  p = (正の重み - 負の重み) / (正の重み + 負の重み) * 確信度
+  score = 100 * tanh(GAIN * p) / tanh(GAIN)
+
+確信度は感情語の量が少ない日記でスコアが振り切れないようにするための係数。
+tanh は Gemini のスコアの付け方（はっきりした日記は ±80 以上）に寄せるため。
+
+否定（ない / なかった / なくて / ません）は、同じ節（句読点・「けど」等まで）の中で
+直前 NEGATION_WINDOW 文字にある n-gram の重みの符号を反転して弱める
+（「楽しくなかった」は負、「痛くなかった」は弱い正）。「情けない」「つまらない」の
+ような、ないで終わる形容詞は否定として扱わない。
+
+語彙は一般的な感情語から作り、評価に使う日記（サンプルの日記や
+tools/bench/scorer_eval.jsonl）の言い回しは入れない。精度は
+`python -m tools.bench_scorer` で、語彙の作成に使っていない評価用の日記に対して測る。
+
+n-gram の抽出と重みの集計は NumPy でまとめて行うので、1 件あたり 0.1 ミリ秒程度で
+返る。Gemini の代わり（オフライン運用）、Gemini が落ちているときの代替、
+ワーカーより先に付ける仮スコアとして使う（app.utils.scorers を参照）。
+"""
+
+import re
+from collections.abc import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from app.utils.text import normalize_body
+
+LOCAL_SCORER_NAME = "local-lexicon"
+# 語彙や計算式を変えたら上げる（スコアラーの名前 local-lexicon-v2 としてログに出る。
+# ローカルのスコアはキャッシュしないので、上げても付け直しは起きない）
+LOCAL_SCORER_VERSION = "v2"
+
+# 極性辞書（語 → -1.0〜1.0）。語幹だけでよい（n-gram で活用形にも当たる）
+# 否定は別に扱うので「眠れない」は入れない（「眠れ」の否定）。ないで終わる形容詞は
+# _NOT_NEGATION にも入れる
+LEXICON: dict[str, float] = {
+    # 喜び・満足
+    "嬉し": 1.0,
+    "うれし": 1.0,
+    "楽し": 1.0,
+    "たのし": 1.0,
+    "幸せ": 1.0,
+    "しあわせ": 1.0,
+    "最高": 1.0,
+    "素晴らし": 1.0,
+    "すばらし": 1.0,
+    "喜": 0.8,
+    "よろこ": 0.8,
+    "充実": 0.9,
+    "満足": 0.8,
+    "満喫": 0.9,
+    "感動": 0.8,
+    "素敵": 0.8,
+    "すてき": 0.8,
+    "大好き": 0.9,
+    "好き": 0.5,
+    "面白": 0.7,
+    "おもしろ": 0.7,
+    "わくわく": 0.8,
+    "ワクワク": 0.8,
+    "楽しみ": 0.8,
+    "待ち遠し": 0.7,
+    "笑": 0.6,
+    "笑顔": 0.8,
+    "美味し": 0.6,
+    "おいし": 0.6,
+    "きれい": 0.4,
+    "綺麗": 0.4,
+    "可愛": 0.5,
+    "かわい": 0.5,
+    # 達成・前進
+    "達成": 0.8,
+    "成功": 0.8,
+    "合格": 0.9,
+    "成長": 0.6,
+    "上達": 0.6,
+    "順調": 0.8,
+    "好調": 0.8,
+    "はかど": 0.7,
+    "捗": 0.7,
+    "うまくい": 0.8,
+    "上手くい": 0.8,
+    "うまく": 0.4,
+    "上手く": 0.4,
+    "できた": 0.4,
+    "でき": 0.2,
+    "集中": 0.3,
+    "自信": 0.6,
+    "誇らし": 0.7,
+    "褒め": 0.7,
+    "ほめ": 0.6,
+    "頑張": 0.4,
+    "がんば": 0.4,
+    "やる気": 0.6,
+    "前向き": 0.8,
+    "希望": 0.7,
+    # 安らぎ・体調
+    "安心": 0.7,
+    "ほっと": 0.6,
+    "落ち着": 0.5,
+    "穏やか": 0.6,
+    "癒": 0.7,
+    "リラックス": 0.7,
+    "すっきり": 0.6,
+    "スッキリ": 0.6,
+    "リフレッシュ": 0.7,
+    "気分転換": 0.5,
+    "気持ちい": 0.8,
+    "気持ちよ": 0.8,
+    "心地よ": 0.7,
+    "爽やか": 0.7,
+    "さわやか": 0.7,
+    "快適": 0.7,
+    "元気": 0.7,
+    "健康": 0.5,
+    "回復": 0.6,
+    "ぐっすり": 0.7,
+    "眠れ": 0.3,
+    "休め": 0.3,
+    "晴れ晴れ": 0.8,
+    "明る": 0.4,
+    # 人とのつながり
+    "感謝": 0.8,
+    "ありがと": 0.8,
+    "ありがた": 0.7,
+    "助か": 0.6,
+    "優し": 0.6,
+    "やさし": 0.6,
+    "励ま": 0.5,
+    "仲良": 0.6,
+    # 悲しみ・落ち込み
+    "最悪": -1.0,
+    "最低": -0.9,
+    "悲し": -1.0,
+    "かなし": -1.0,
+    "寂し": -0.8,
+    "さみし": -0.8,
+    "さびし": -0.8,
+    "孤独": -0.9,
+    "泣": -0.8,
+    "落ち込": -0.9,
+    "凹": -0.7,
+    "へこ": -0.6,
+    "憂鬱": -0.9,
+    "ゆううつ": -0.9,
+    "絶望": -1.0,
+    "虚し": -0.8,
+    "むなし": -0.8,
+    "惨め": -0.9,
+    "みじめ": -0.9,
+    "がっかり": -0.7,
+    "ガッカリ": -0.7,
+    "残念": -0.6,
+    "後悔": -0.8,
+    "悔し": -0.7,
+    "くやし": -0.7,
+    "自己嫌悪": -1.0,
+    "情けな": -0.8,
+    "つまらな": -0.7,
+    "退屈": -0.6,
+    "暗い": -0.4,
+    "気が重": -0.8,
+    "散々": -0.8,
+    "台無し": -0.8,
+    # 不安・怒り・ストレス
+    "不安": -0.8,
+    "心配": -0.6,
+    "怖": -0.7,
+    "こわ": -0.5,
+    "恐": -0.6,
+    "緊張": -0.4,
+    "焦": -0.6,
+    "あせ": -0.5,
+    "ストレス": -0.8,
+    "イライラ": -0.8,
+    "いらいら": -0.8,
+    "怒": -0.7,
+    "腹が立": -0.8,
+    "むかつ": -0.8,
+    "ムカつ": -0.8,
+    "不満": -0.6,
+    "喧嘩": -0.7,
+    "けんか": -0.7,
+    "叱": -0.6,
+    "嫌": -0.6,
+    "面倒": -0.5,
+    "めんどう": -0.5,
+    "めんどくさ": -0.6,
+    "迷惑": -0.6,
+    "失敗": -0.8,
+    "ミス": -0.6,
+    "負け": -0.6,
+    "遅刻": -0.6,
+    "寝坊": -0.5,
+    # 疲れ・体調
+    "辛い": -0.9,
+    "つら": -0.9,
+    "苦し": -0.9,
+    "くるし": -0.9,
+    "しんど": -0.8,
+    "疲れ": -0.7,
+    "つかれ": -0.7,
+    "疲労": -0.7,
+    "へとへと": -0.8,
+    "ヘトヘト": -0.8,
+    "だる": -0.7,
+    "倦怠": -0.8,
+    "寝不足": -0.6,
+    "眠い": -0.3,
+    "限界": -0.8,
+    "痛": -0.6,
+    "頭痛": -0.8,
+    "吐き気": -0.8,
+    "風邪": -0.6,
+    "熱っぽ": -0.6,
+    "体調不良": -0.8,
+    "体調を崩": -0.8,
+    "具合が悪": -0.9,
+    "体調が悪": -0.9,
+    "不調": -0.7,
+}
+
+# 否定の助動詞（「ない」「なかった」「なくて」「ません」）
+_NEGATION = re.compile(r"な(?:かった|くて|い)|ません")
+# 「ない」で終わるが否定ではない語の前半（情けない・つまらない など）
+_NOT_NEGATION = (
+    "情け",
+    "つまら",
+    "くだら",
+    "もったい",
+    "少",
+    "すく",
+    "危",
+    "あぶ",
+    "切",
+    "せつ",
+    "仕方",
+    "しかた",
+    "しょうが",
+    "申し訳",
+    "間違い",
+    "たまら",
+    "だらし",
+    "やるせ",
+)
+# 否定の前のどこまでを打ち消すか（同じ節の中の直前の文字数）
+NEGATION_WINDOW = 8
+# 打ち消した語の重み（符号を反転して弱める）
+_NEGATION_FACTOR = -0.7
+# 節の区切り（否定はこれを越えて前に効かない）
+_CLAUSE_BREAK = re.compile(r"[。、.,!?！？\n]|けど|けれど|のに|でも")
+
+_NGRAM_SIZES = (2, 3)
+_NGRAM_WEIGHTS = {2: 0.5, 3: 1.0}
+_DIM = 1 << 18
+_P = np.uint64(1_000_003)
+# 感情語の重みの合計がこれ以上あれば確信度 1
+_SATURATION = 6.0
+_GAIN = 1.6
+
+
+def _codepoints(text: str) -> npt.NDArray[np.uint64]:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+
+def _ngram_ids(cp: npt.NDArray[np.uint64], n: int) -> npt.NDArray[np.int64]:
+    """コードポイント列から長さ n の n-gram のハッシュ（0..DIM-1）を一括で作る"""
+    if len(cp) < n:
+        return np.empty(0, dtype=np.int64)
+    h = np.full(len(cp) - n + 1, np.uint64(n), dtype=np.uint64)
+    for k in range(n):
+        h = h * _P + cp[k : len(cp) - n + 1 + k]
+    return (h % np.uint64(_DIM)).astype(np.int64)
+
+
+def _is_hiragana(cp: npt.NDArray[np.uint64]) -> npt.NDArray[np.bool_]:
+    return (cp >= 0x3041) & (cp <= 0x309F)
+
+
+def _term_ngrams(cp: npt.NDArray[np.uint64], n: int) -> npt.NDArray[np.int64]:
+    """語の n-gram。ひらがなだけの 2-gram（「った」「かっ」など活用語尾）は使わない"""
+    ids = _ngram_ids(cp, n)
+    if n != 2 or len(cp) == 2:
+        return ids
+    kana = _is_hiragana(cp)
+    return ids[~(kana[:-1] & kana[1:])]
+
+
+def _negation_factors(text: str) -> npt.NDArray[np.float64]:
+    """文字ごとの係数。否定の直前（同じ節の NEGATION_WINDOW 文字以内）は _NEGATION_FACTOR"""
+    factors = np.ones(len(text), dtype=np.float64)
+    for m in _NEGATION.finditer(text):
+        end = m.start()
+        if text[:end].endswith(_NOT_NEGATION):
+            continue
+        start = max(0, end - NEGATION_WINDOW)
+        breaks = [b.end() for b in _CLAUSE_BREAK.finditer(text, start, end)]
+        if breaks:
+            start = breaks[-1]
+        factors[start:end] = _NEGATION_FACTOR
+    return factors
+
+
+def _build_weights(lexicon: dict[str, float]) -> npt.NDArray[np.float64]:
+    """語彙を n-gram の重みベクトルに展開する（語の長さで割って語ごとの重みをそろえる）"""
+    weights = np.zeros(_DIM, dtype=np.float64)
+    for term, polarity in lexicon.items():
+        cp = _codepoints(term)
+        if len(cp) == 1:
+            # 1 文字の語はそのまま 1-gram として扱う
+            np.add.at(weights, _ngram_ids(cp, 1), polarity)
+            continue
+        ids = [(_term_ngrams(cp, n), _NGRAM_WEIGHTS[n]) for n in _NGRAM_SIZES]
+        total = sum(len(i) * w for i, w in ids)
+        for i, w in ids:
+            np.add.at(weights, i, polarity * w / total)
+    return weights
+
+
+class LexiconScorer:
+    """語彙 + 文字 n-gram による日記スコアラー（-100〜100）"""
+
+    name = LOCAL_SCORER_NAME
+    version = LOCAL_SCORER_VERSION
+
+    def __init__(self, lexicon: dict[str, float] | None = None) -> None:
+        lexicon = lexicon or LEXICON
+        self._weights = _build_weights(lexicon)
+        self._has_unigrams = any(len(term) == 1 for term in lexicon)
+
+    def _features(self, text: str) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+        """n-gram のハッシュと、それぞれに掛ける係数（否定されていれば負）"""
+        text = normalize_body(text)
+        cp = _codepoints(text)
+        factors = _negation_factors(text)
+        sizes = ((1,) if self._has_unigrams else ()) + _NGRAM_SIZES
+        ids = [_ngram_ids(cp, n) for n in sizes]
+        # n-gram の係数は先頭の文字のもの
+        return np.concatenate(ids), np.concatenate([factors[: len(i)] for i in ids])
+
+    def score_many(self, bodies: Sequence[str]) -> list[int]:
+        """まとめて採点する（n-gram を連結して bincount で日記ごとに集計）"""
+        if not bodies:
+            return []
+        features = [self._features(body) for body in bodies]
+        owner = np.repeat(np.arange(len(bodies)), [len(ids) for ids, _ in features])
+        ids = np.concatenate([ids for ids, _ in features])
+        w = self._weights[ids] * np.concatenate([f for _, f in features])
+        pos = np.bincount(owner, weights=np.clip(w, 0, None), minlength=len(bodies))
+        neg = np.bincount(owner, weights=np.clip(-w, 0, None), minlength=len(bodies))
+
+        mass = pos + neg
+        polarity = np.divide(pos - neg, mass, out=np.zeros_like(mass), where=mass > 0)
+        confidence = np.minimum(1.0, mass / _SATURATION)
+        stretched = np.tanh(_GAIN * polarity * confidence) / np.tanh(_GAIN)
+        scores = np.clip(np.rint(100 * stretched), -100, 100)
+        return [int(s) for s in scores]
+
+    def score(self, body: str) -> int:
+        return self.score_many([body])[0]
@@ -0,0 +1,224 @@
+"""
+読み取り API のレスポンスキャッシュ
+
+フロントは同じ一覧を何度も取り直すので、シリアライズ済みの JSON を
+プロセス内の LRU に TTL 付きで持ち、変わっていなければ DB に触らず返す。
+
+  - 書き込みは、そのデータを返すスコープ（日記一覧 / 全画像一覧 / ユーザーの最新画像）の
+    バージョンだけを上げる。エントリは作ったときのバージョンと違えば使わない
+  - バージョンは cache_versions テーブルに置き、書き込みを commit した後に
+    `bump_versions` が別の短いトランザクションで上げる（行ロックをすぐ放す）。
+    先に commit するので、上げる前に読んだ古い内容は次のバージョンで捨てられる
+  - 読み取りはバージョンを RESPONSE_CACHE_VERSION_TTL 秒だけプロセス内で覚えておき、
+    その間のキャッシュヒットは DB に触らない。このプロセスで上げたものはすぐ読み直し、
+    ワーカーや他の API プロセスの書き込みは長くても RESPONSE_CACHE_VERSION_TTL 秒で届く
+  - ETag は本文のハッシュから作る弱い ETag。`If-None-Match` が一致すれば 304
+
+環境変数:
+  - RESPONSE_CACHE_SIZE (default: 512) 保持するレスポンスの件数上限（0 で無効）
+  - RESPONSE_CACHE_TTL (default: 5) 1 件を使い回す秒数
+  - RESPONSE_CACHE_VERSION_TTL (default: 1) バージョンをプロセス内で覚えておく秒数
+    （0 なら毎回 DB を読む）
+"""
+
+import hashlib
+import logging
+import os
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.metrics import record_cache
+from app.models.cache_version import CacheVersion
+from app.utils.lru_cache import LRUCache
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "5"))
+RESPONSE_CACHE_VERSION_TTL = float(os.getenv("RESPONSE_CACHE_VERSION_TTL", "1"))
+
+# 全ユーザーの内容を含むレスポンスのスコープ（ユーザーの最新画像はユーザー ID）
+DIARIES_SCOPE = "diaries"  # 日記一覧（本文・スコア）
+IMAGES_SCOPE = "images"  # 日記ごとの最新画像の一覧
+
+log = logging.getLogger("app.response_cache")
+
+# ブラウザには毎回 If-None-Match で確認させる
+_CACHE_CONTROL = "private, no-cache"
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    version: int
+    expires_at: float
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+def scope_key(scope: int | str) -> str:
+    """cache_versions.scope の値（ユーザー ID なら "user:<id>"）"""
+    return f"user:{scope}" if isinstance(scope, int) else scope
+
+
+def _upsert_mysql(rows: list[dict[str, Any]]) -> Any:
+    stmt = mysql.insert(CacheVersion).values(rows)
+    return stmt.on_duplicate_key_update(version=CacheVersion.version + 1)
+
+
+def _upsert_sqlite(rows: list[dict[str, Any]]) -> Any:
+    stmt = sqlite.insert(CacheVersion).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[CacheVersion.scope], set_={"version": CacheVersion.version + 1}
+    )
+
+
+# 方言ごとの「無ければ 1 で作り、あれば 1 上げる」文
+_UPSERTS: dict[str, Callable[[list[dict[str, Any]]], Any]] = {
+    "mysql": _upsert_mysql,
+    "sqlite": _upsert_sqlite,
+}
+
+
+def bump_statement(dialect: str, scopes: Iterable[int | str]) -> Any:
+    """scopes のバージョンを上げる文（dialect はエンジンの方言名）"""
+    # 行ロックを取る順番をそろえる（デッドロックしないように）
+    keys = sorted({scope_key(scope) for scope in scopes})
+    rows = [{"scope": key, "version": 1} for key in keys]
+    return _UPSERTS[dialect](rows)
+
+
+async def bump_versions(db: AsyncSession, *scopes: int | str) -> None:
+    """書き込みを commit した後に、scopes のバージョンを別のトランザクションで上げる
+
+    失敗しても書き込みは確定しているので例外にしない（古い内容は長くても TTL で消える）。
+    """
+    try:
+        await db.execute(bump_statement(db.get_bind().dialect.name, scopes))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        log.exception("Failed to bump cache versions %s", scopes)
+    response_cache.forget_versions(scopes)
+
+
+def bump_versions_sync(db: Session, *scopes: int | str) -> None:
+    """bump_versions の同期版（ワーカー用）"""
+    try:
+        db.execute(bump_statement(db.get_bind().dialect.name, scopes))
+        db.commit()
+    except Exception:
+        db.rollback()
+        log.exception("Failed to bump cache versions %s", scopes)
+
+
+def make_etag(body: bytes) -> str:
+    return f'W/"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """弱い比較で If-None-Match と ETag を比べる"""
+    if not if_none_match:
+        return False
+    wanted = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == wanted:
+            return True
+    return False
+
+
+class ResponseCache:
+    """スコープごとのバージョンで無効化する TTL 付き LRU"""
+
+    def __init__(self, maxsize: int, ttl: float, version_ttl: float) -> None:
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self._entries: LRUCache[str, CachedResponse] = LRUCache(maxsize)
+        # scope_key → (バージョン, 覚えておく期限)
+        self._versions: dict[str, tuple[int, float]] = {}
+
+    async def version(self, db: AsyncSession, scope: int | str) -> int:
+        """スコープの今のバージョン（DB を読む前に取り、`get` / `put` に渡す）
+
+        RESPONSE_CACHE_VERSION_TTL 秒以内に読んだものがあれば、DB には触らない。
+        """
+        key = scope_key(scope)
+        known = self._versions.get(key)
+        now = time.monotonic()
+        if known is not None and known[1] > now:
+            return known[0]
+        version = (
+            await db.execute(select(CacheVersion.version).where(CacheVersion.scope == key))
+        ).scalar() or 0
+        if self.version_ttl > 0:
+            self._versions[key] = (version, now + self.version_ttl)
+        return version
+
+    def forget_versions(self, scopes: Iterable[int | str]) -> None:
+        """このプロセスで上げたスコープは、次の読み取りで DB から読み直す"""
+        for scope in scopes:
+            self._versions.pop(scope_key(scope), None)
+
+    def get(self, key: str, version: int) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            record_cache("response", hit=False)
+            return None
+        if entry.version != version or entry.expires_at <= time.monotonic():
+            self._entries.pop(key)
+            record_cache("response", hit=False)
+            return None
+        record_cache("response", hit=True)
+        return entry
+
+    def put(
+        self,
+        key: str,
+        version: int,
+        body: bytes,
+        headers: dict[str, str] | None = None,
+    ) -> CachedResponse:
+        """
+        レスポンスを保存する
+
+        version は DB を読む前に `version()` で取ったものを渡す。読んでいる間に
+        書き込みがあれば、次の `get` でバージョン違いとして捨てられる。
+        """
+        entry = CachedResponse(
+            body=body,
+            etag=make_etag(body),
+            version=version,
+            expires_at=time.monotonic() + self.ttl,
+            headers=headers or {},
+        )
+        if self.ttl > 0:
+            self._entries.set(key, entry)
+        return entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._versions.clear()
+
+
+def cache_key(request: Request) -> str:
+    """パスとクエリ（順序を無視）からキーを作る"""
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+def to_response(request: Request, entry: CachedResponse) -> Response:
+    """If-None-Match が一致すれば 304、それ以外は本文付きで返す"""
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": _CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_VERSION_TTL)
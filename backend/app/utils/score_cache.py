@@ -0,0 +1,75 @@
+"""
+日記スコアのキャッシュ
+
+本文を正規化したもののハッシュ + モデル名 + プロンプトバージョンをキーに、
+Gemini が返したスコアを保存する。
+
+  1. プロセス内 LRU（マイクロ秒で返る）
+  2. diary_score_cache テーブル（再起動・複数ワーカー間で共有）
+
+の順に参照し、どちらにも無ければ呼び出し側が Gemini を呼ぶ。
+
+環境変数:
+  - SCORE_CACHE_SIZE (default: 4096) プロセス内 LRU の件数上限
+"""
+
+import hashlib
+import logging
+import os
+
+from sqlalchemy.dialects.mysql import insert
+
+from app.core.metrics import record_cache
+from app.db import SessionLocal
+from app.models.score_cache import DiaryScoreCache
+from app.utils.lru_cache import LRUCache
+from app.utils.text import normalize_body
+
+SCORE_CACHE_SIZE = int(os.getenv("SCORE_CACHE_SIZE", "4096"))
+
+log = logging.getLogger("app.score_cache")
+
+_memory: LRUCache[str, int] = LRUCache(SCORE_CACHE_SIZE)
+
+
+def score_cache_key(body: str, model: str, prompt_version: str) -> str:
+    raw = f"{model}\0{prompt_version}\0{normalize_body(body)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_cached_score(key: str) -> int | None:
+    """LRU → テーブルの順に探す。見つからなければ None"""
+    score = _memory.get(key)
+    if score is not None:
+        record_cache("score", hit=True)
+        return score
+
+    try:
+        with SessionLocal() as db:
+            row = db.get(DiaryScoreCache, key)
+    except Exception:
+        # キャッシュが引けなくても本処理は続ける
+        log.exception("Score cache lookup failed")
+        record_cache("score", hit=False)
+        return None
+
+    record_cache("score", hit=row is not None)
+    if row is None:
+        return None
+    _memory.set(key, row.score)
+    return row.score
+
+
+def store_score(key: str, model: str, prompt_version: str, score: int) -> None:
+    _memory.set(key, score)
+
+    stmt = insert(DiaryScoreCache).values(
+        cache_key=key, model=model, prompt_version=prompt_version, score=score
+    )
+    stmt = stmt.on_duplicate_key_update(score=stmt.inserted.score)
+    try:
+        with SessionLocal() as db:
+            db.execute(stmt)
+            db.commit()
+    except Exception:
+        log.exception("Score cache store failed")
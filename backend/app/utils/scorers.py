@@ -0,0 +1,145 @@
+"""
+日記スコアラーの切り替え
+
+スコアを付ける側（ワーカーの画像生成ジョブ・一括再計算）は `get_scorer()` が返す
+スコアラーを使い、どれで採点するかは環境変数で選ぶ。
+
+環境変数:
+  - DIARY_SCORER (default: gemini)
+      gemini   : Gemini だけで採点する
+      fallback : Gemini で採点し、失敗したとき（ブレーカーが開いている・5xx・
+                 形式違いが続いた等）はローカルのスコアラーで代わりに付ける
+      local    : ローカルのスコアラーだけで採点する（オフライン運用）
+  - DIARY_PROVISIONAL_SCORE (default: false) 日記の保存時に、ローカルのスコアラーで
+    仮のスコアを付けておく（ワーカーの採点が終わると上書きされる）
+"""
+
+import logging
+import os
+from collections.abc import Sequence
+from functools import cache
+from typing import Protocol
+
+from app.core.rate_limit import RateLimited
+from app.utils.generate_diary_score import (
+    GEMINI_SCORE_MODEL,
+    generate_diary_score_using_Gemini,
+    generate_diary_scores_batch,
+)
+
+DIARY_SCORER = os.getenv("DIARY_SCORER", "gemini")
+DIARY_PROVISIONAL_SCORE = os.getenv("DIARY_PROVISIONAL_SCORE", "false").lower() == "true"
+
+log = logging.getLogger("app.score")
+
+
+class Scorer(Protocol):
+    name: str
+
+    def score(self, body: str) -> int:
+        """1 件を採点する（-100〜100）"""
+        ...
+
+    def score_batch(self, diaries: Sequence[tuple[int, str]]) -> dict[int, int]:
+        """(日記ID, 本文) をまとめて採点する。付けられなかった id は含めない"""
+        ...
+
+
+class GeminiScorer:
+    name = GEMINI_SCORE_MODEL
+
+    def score(self, body: str) -> int:
+        return generate_diary_score_using_Gemini(body)
+
+    def score_batch(self, diaries: Sequence[tuple[int, str]]) -> dict[int, int]:
+        return generate_diary_scores_batch(diaries)
+
+
+class LocalScorer:
+    def __init__(self) -> None:
+        # NumPy の読み込みはローカルのスコアラーを使うときだけ
+        from app.utils.local_score import LexiconScorer
+
+        self._impl = LexiconScorer()
+        self.name = f"{self._impl.name}-{self._impl.version}"
+
+    def score(self, body: str) -> int:
+        return self._impl.score(body)
+
+    def score_batch(self, diaries: Sequence[tuple[int, str]]) -> dict[int, int]:
+        scores = self._impl.score_many([body for _, body in diaries])
+        return {diary_id: score for (diary_id, _), score in zip(diaries, scores, strict=True)}
+
+
+class FallbackScorer:
+    """primary が失敗したら secondary で付ける
+
+    流量制御で断られた場合（RateLimited）は待てば Gemini で付けられるので、
+    代わりに付けずにそのまま投げる（ワーカーがジョブを積み直す）。
+    """
+
+    def __init__(self, primary: Scorer, secondary: Scorer) -> None:
+        self.primary = primary
+        self.secondary = secondary
+        self.name = f"{primary.name}+{secondary.name}"
+
+    def score(self, body: str) -> int:
+        try:
+            return self.primary.score(body)
+        except RateLimited:
+            raise
+        except Exception as e:
+            log.warning(
+                "Scoring with %s failed, using %s: %s", self.primary.name, self.secondary.name, e
+            )
+            return self.secondary.score(body)
+
+    def score_batch(self, diaries: Sequence[tuple[int, str]]) -> dict[int, int]:
+        try:
+            scores = self.primary.score_batch(diaries)
+        except RateLimited:
+            raise
+        except Exception as e:
+            log.warning("Batch scoring with %s failed: %s", self.primary.name, e)
+            scores = {}
+        missing = [(i, body) for i, body in diaries if i not in scores]
+        if missing:
+            scores.update(self.secondary.score_batch(missing))
+        return scores
+
+
+@cache
+def get_local_scorer() -> LocalScorer:
+    return LocalScorer()
+
+
+@cache
+def get_scorer() -> Scorer:
+    """DIARY_SCORER で選んだスコアラー（プロセス内で 1 つ）"""
+    if DIARY_SCORER == "local":
+        return get_local_scorer()
+    if DIARY_SCORER == "fallback":
+        return FallbackScorer(GeminiScorer(), get_local_scorer())
+    if DIARY_SCORER != "gemini":
+        raise RuntimeError(f"Unknown DIARY_SCORER: {DIARY_SCORER}")
+    return GeminiScorer()
+
+
+def score_diary(body: str) -> int:
+    """設定されたスコアラーで日記を採点する"""
+    return get_scorer().score(body)
+
+
+def provisional_score(body: str) -> int | None:
+    """保存時に付ける仮スコア（DIARY_PROVISIONAL_SCORE が無効なら None）"""
+    if not DIARY_PROVISIONAL_SCORE:
+        return None
+    return get_local_scorer().score(body)
+
+
+def provisional_scores(bodies: Sequence[str]) -> list[int] | None:
+    """provisional_score のまとめて版（一括インポート用。スレッドプールから呼ぶ）"""
+    if not DIARY_PROVISIONAL_SCORE:
+        return None
+    scores = get_local_scorer().score_batch(list(enumerate(bodies)))
+    return [scores[i] for i in range(len(bodies))]
@@ -0,0 +1,188 @@
+"""
+画像の保存先の切り替え
+
+アップロードされた元画像・生成画像の保存は `get_storage()` が返すバックエンドを通し、
+どこに置くかは環境変数で選ぶ。呼び出し側は返ってきた URL を DB に入れるだけでよい。
+
+  cloudinary : Cloudinary にアップロードする（デフォルト）
+  local      : ローカルのディレクトリに、内容の SHA-256 を名前にして置く。
+               同じバイト列は 1 つにまとまり、API の `GET /media/{名前}` で配信する
+               （Range / ETag / 長期の Cache-Control に対応。app.api.media）
+
+local は単一ノード・オンプレ向け。ワーカーと API が同じディレクトリを見られること
+（同じホストか共有ボリューム。compose.yml の media）。ワーカーが元画像を読むときは
+MEDIA_BASE_URL の URL を HTTP で取りに行かず、`local_path_for` でディスクから読む。
+内容で名前が決まるので、同じ画像を複数の行が指していることがあり、`delete` では消さない。
+
+環境変数:
+  - STORAGE_BACKEND (default: cloudinary) cloudinary / local
+  - LOCAL_STORAGE_DIR (default: /var/lib/app-media) local の保存先
+  - MEDIA_BASE_URL (default: http://localhost:8000/media) local の画像の URL の前半
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from functools import cache
+from io import BytesIO
+from pathlib import Path
+from typing import Any, NotRequired, Protocol, Required, TypedDict
+
+from app.core.clients import configure_cloudinary_pool
+from app.core.cloudinary_config import configure_cloudinary
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "/var/lib/app-media")
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "http://localhost:8000/media").rstrip("/")
+
+# local の名前: <sha256>.<拡張子>
+LOCAL_OBJECT_NAME = re.compile(r"^([0-9a-f]{64})\.(webp|avif|jpeg|jpg|png)$")
+
+CONTENT_TYPES = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "jpeg": "image/jpeg",
+    "jpg": "image/jpeg",
+    "png": "image/png",
+}
+
+log = logging.getLogger("app.storage")
+
+
+class CloudinaryUploadResult(TypedDict):
+    public_id: Required[str]
+    secure_url: Required[str]
+    width: NotRequired[int]
+    height: NotRequired[int]
+    format: NotRequired[str]
+    bytes: NotRequired[int]
+    resource_type: NotRequired[str]
+    url: NotRequired[str]
+    folder: NotRequired[str]
+    original_filename: NotRequired[str]
+    version: NotRequired[int]
+    placeholder: NotRequired[bool]
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    uri: str  # 配信用の URL
+    object_id: str  # delete に渡す ID（Cloudinary の public_id / local の名前）
+
+
+class Storage(Protocol):
+    name: str
+
+    def put(
+        self, data: bytes, *, fmt: str, public_id: str | None = None, folder: str | None = None
+    ) -> StoredObject:
+        """保存して URL を返す。public_id を省略したら folder の下に一意な名前で置く"""
+        ...
+
+    def delete(self, object_id: str) -> None:
+        """使われなくなったものを消す（失敗しても例外にしない）"""
+        ...
+
+
+class CloudinaryStorage:
+    name = "cloudinary"
+
+    def __init__(self) -> None:
+        configure_cloudinary()
+        configure_cloudinary_pool()
+
+    def put(
+        self, data: bytes, *, fmt: str, public_id: str | None = None, folder: str | None = None
+    ) -> StoredObject:
+        import cloudinary.uploader
+
+        options: dict[str, Any]
+        if public_id:
+            options = {"public_id": public_id}
+        else:
+            options = {"folder": folder, "unique_filename": True}
+        res: CloudinaryUploadResult = cloudinary.uploader.upload(
+            BytesIO(data), resource_type="image", format=fmt, overwrite=False, **options
+        )
+        if not res.get("secure_url"):
+            raise RuntimeError("Cloudinary response is missing secure_url")
+        return StoredObject(res["secure_url"], res["public_id"])
+
+    def delete(self, object_id: str) -> None:
+        import cloudinary.uploader
+
+        try:
+            cloudinary.uploader.destroy(object_id, resource_type="image")
+        except Exception:
+            log.warning("Failed to destroy %s", object_id)
+
+
+class LocalStorage:
+    """内容の SHA-256 で名前を付けてディレクトリに置く（同じ内容は 1 つだけ）"""
+
+    name = "local"
+
+    def __init__(self, root: str | Path, base_url: str) -> None:
+        self.root = Path(root)
+        self.base_url = base_url
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_of(self, name: str) -> Path | None:
+        """名前からファイルの場所（名前の形が違えば None。ディレクトリの外は指さない）"""
+        m = LOCAL_OBJECT_NAME.match(name)
+        if m is None:
+            return None
+        digest = m.group(1)
+        # 1 ディレクトリのファイル数が増えすぎないよう、先頭 2 文字ずつで分ける
+        return self.root / digest[:2] / digest[2:4] / name
+
+    def put(
+        self, data: bytes, *, fmt: str, public_id: str | None = None, folder: str | None = None
+    ) -> StoredObject:
+        name = f"{hashlib.sha256(data).hexdigest()}.{fmt.lower()}"
+        path = self.path_of(name)
+        if path is None:
+            raise ValueError(f"Unsupported format: {fmt}")
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 書きかけのファイルを配信しないよう、一時ファイルに書いてから置き換える
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+        return StoredObject(f"{self.base_url}/{name}", name)
+
+    def delete(self, object_id: str) -> None:
+        # 同じ内容を別の行が指しているかもしれないので消さない
+        pass
+
+
+@cache
+def get_storage() -> Storage:
+    """STORAGE_BACKEND で選んだ保存先（プロセス内で 1 つ）"""
+    if STORAGE_BACKEND == "local":
+        return LocalStorage(LOCAL_STORAGE_DIR, MEDIA_BASE_URL)
+    if STORAGE_BACKEND != "cloudinary":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return CloudinaryStorage()
+
+
+def get_local_storage() -> LocalStorage | None:
+    storage = get_storage()
+    return storage if isinstance(storage, LocalStorage) else None
+
+
+def local_path_for(uri: str) -> Path | None:
+    """local に保存した画像の URL（MEDIA_BASE_URL の下）なら、そのファイルの場所"""
+    prefix = f"{MEDIA_BASE_URL}/"
+    if not uri.startswith(prefix):
+        return None
+    storage = get_local_storage()
+    return storage.path_of(uri.removeprefix(prefix)) if storage is not None else None
@@ -0,0 +1,9 @@
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_body(body: str) -> str:
+    """表記ゆれ（全角/半角・前後や連続する空白）をそろえる"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", body)).strip()
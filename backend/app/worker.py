@@ -0,0 +1,220 @@
+"""
+ジョブワーカー
+
+jobs テーブルからジョブを取り出して実行するプロセス。API とは別プロセスで動かす。
+
+    python -m app.worker
+
+環境変数:
+  - WORKER_CONCURRENCY (default: 2) 同時に実行するジョブ数（スレッド数）
+  - WORKER_POLL_INTERVAL (default: 1.0) ジョブが無いときの待機秒数
+  - JOB_MAX_ATTEMPTS / JOB_VISIBILITY_TIMEOUT / JOB_RETRY_BASE_SECONDS
+    （app.core.jobs を参照）
+  - GEMINI_* の流量制御（app.core.rate_limit を参照）。Gemini が混んでいるときは
+    ジョブを失敗にせず、バックオフ後に積み直す
+  - IMAGE_PREWARM_*（app.core.prewarm を参照）。事前生成ジョブは他のジョブが無いときだけ進む
+  - WORKER_METRICS_PORT (default: 9101) /metrics を開くポート（app.core.metrics を参照）
+
+SIGTERM / SIGINT を受けると新しいジョブの取得をやめ、実行中のジョブが終わるのを
+待ってから終了する。途中で強制終了された場合も、可視性タイムアウトが切れた時点で
+別のワーカーが取り直す。
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+from collections.abc import Callable
+from typing import Any
+
+from app.core.clients import close_clients, init_clients
+from app.core.events import STAGE_FAILED, publish_progress
+from app.core.generation import process_generated_image
+from app.core.jobs import (
+    JOB_KIND_GENERATE_IMAGE,
+    JOB_KIND_PREWARM_IMAGES,
+    JOB_KIND_RESCORE,
+    JobDeferred,
+    JobLeaseLost,
+    JobSuperseded,
+    cancel_job,
+    claim_job,
+    complete_job,
+    defer_job,
+    fail_job,
+    raise_if_superseded,
+)
+from app.core.metrics import JOB_DURATION_SECONDS, JOBS_TOTAL, start_metrics_server
+from app.core.prewarm import run_prewarm_job
+from app.core.rate_limit import UpstreamBusy
+from app.core.rescore import run_rescore_job
+from app.db import SessionLocal, init_db
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))
+
+log = logging.getLogger("app.worker")
+
+
+# 処理関数は (payload, ensure_current) を受け取る。ensure_current は段階の区切りで呼び、
+# 新しいジョブに置き換えられていれば JobSuperseded、リースが切れて他のワーカーに
+# 取り直されていれば JobLeaseLost を投げる。呼ぶたびにリースが延びる
+Handler = Callable[[dict[str, Any], Callable[[], None]], None]
+
+
+def _run_generate_image(payload: dict[str, Any], ensure_current: Callable[[], None]) -> None:
+    process_generated_image(
+        payload["user_id"], payload["diary_id"], payload["body"], ensure_current=ensure_current
+    )
+
+
+def _run_rescore(payload: dict[str, Any], _ensure_current: Callable[[], None]) -> None:
+    run_rescore_job(payload)
+
+
+# ジョブ種別 -> 処理関数
+HANDLERS: dict[str, Handler] = {
+    JOB_KIND_GENERATE_IMAGE: _run_generate_image,
+    JOB_KIND_RESCORE: _run_rescore,
+    JOB_KIND_PREWARM_IMAGES: run_prewarm_job,
+}
+
+
+class Worker:
+    """jobs テーブルをポーリングして実行するスレッドの集まり"""
+
+    def __init__(
+        self,
+        concurrency: int = WORKER_CONCURRENCY,
+        poll_interval: float = WORKER_POLL_INTERVAL,
+    ) -> None:
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self) -> None:
+        for i in range(self.concurrency):
+            t = threading.Thread(
+                target=self._loop, args=(f"{self._name}:{i}",), name=f"worker-{i}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+        log.info("Worker started concurrency=%s", self.concurrency)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """新規取得を止め、実行中のジョブが終わるまで待つ"""
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        log.info("Worker stopped")
+
+    def wait(self) -> None:
+        for t in self._threads:
+            t.join()
+
+    def _loop(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                ran = self._run_once(worker_id)
+            except Exception:
+                log.exception("Worker loop error worker_id=%s", worker_id)
+                ran = False
+            if not ran:
+                self._stop.wait(self.poll_interval)
+
+    def _run_once(self, worker_id: str) -> bool:
+        db = SessionLocal()
+        try:
+            job = claim_job(db, worker_id)
+            if job is None:
+                return False
+            job_id, kind, payload, key = job.id, job.kind, job.payload, job.coalesce_key
+        finally:
+            db.close()
+
+        log.info("Job start id=%s kind=%s", job_id, kind)
+        handler = HANDLERS.get(kind)
+        try:
+            if handler is None:
+                raise RuntimeError(f"Unknown job kind: {kind}")
+            with JOB_DURATION_SECONDS.time(kind=kind):
+                handler(payload, lambda: raise_if_superseded(job_id, worker_id, key))
+        except JobLeaseLost:
+            # 取り直したワーカーが結果を書くので、ここでは何も記録しない
+            log.warning("Job lease lost id=%s kind=%s", job_id, kind)
+            JOBS_TOTAL.inc(kind=kind, outcome="lease_lost")
+            return True
+        except JobSuperseded as e:
+            log.info("Job superseded id=%s kind=%s", job_id, kind)
+            JOBS_TOTAL.inc(kind=kind, outcome="cancelled")
+            db = SessionLocal()
+            try:
+                cancel_job(db, job_id, worker_id, str(e))
+            finally:
+                db.close()
+            return True
+        except (UpstreamBusy, JobDeferred) as e:
+            # スレッドで待たずに、バックオフ後に積み直す
+            log.info("Job deferred id=%s kind=%s retry_after=%.1fs", job_id, kind, e.retry_after)
+            JOBS_TOTAL.inc(kind=kind, outcome="deferred")
+            db = SessionLocal()
+            try:
+                defer_job(db, job_id, worker_id, e.retry_after, f"{type(e).__name__}: {e}")
+            finally:
+                db.close()
+            return True
+        except Exception as e:
+            log.exception("Job failed id=%s kind=%s", job_id, kind)
+            db = SessionLocal()
+            try:
+                failed = fail_job(db, job_id, worker_id, f"{type(e).__name__}: {e}")
+            finally:
+                db.close()
+            JOBS_TOTAL.inc(kind=kind, outcome="failed" if failed else "retried")
+            if failed and kind == JOB_KIND_GENERATE_IMAGE:
+                # リトライを使い切ったので、待っているクライアントに終わりを知らせる
+                publish_progress(payload["diary_id"], STAGE_FAILED, error=type(e).__name__)
+            return True
+
+        db = SessionLocal()
+        try:
+            completed = complete_job(db, job_id, worker_id)
+        finally:
+            db.close()
+        if not completed:
+            log.warning("Job lease lost before completion id=%s kind=%s", job_id, kind)
+            JOBS_TOTAL.inc(kind=kind, outcome="lease_lost")
+            return True
+        JOBS_TOTAL.inc(kind=kind, outcome="done")
+        log.info("Job done id=%s kind=%s", job_id, kind)
+        return True
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    # Gemini・Cloudinary の SDK は初めて使うジョブで読み込む
+    init_db()
+    init_clients()
+    start_metrics_server()
+
+    worker = Worker()
+    worker.start()
+
+    def _handle_signal(signum: int, _frame: object) -> None:
+        log.info("Received signal %s, shutting down", signum)
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, _handle_signal)
+    signal.signal(signal.SIGINT, _handle_signal)
+    worker.wait()
+    close_clients()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,8 @@ CREATE TABLE IF NOT EXISTS users (
   image_url VARCHAR(255) NOT NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  is_deleted BOOLEAN DEFAULT FALSE
+  is_deleted BOOLEAN DEFAULT FALSE,
+  current_image_id INT NULL
 );
 
 CREATE TABLE IF NOT EXISTS diaries (
@@ -21,19 +22,94 @@ CREATE TABLE IF NOT EXISTS diaries (
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   is_deleted BOOLEAN DEFAULT FALSE,
-  FOREIGN KEY (user_id) REFERENCES users(id)
+  latest_image_id INT NULL,
+  FOREIGN KEY (user_id) REFERENCES users(id),
+  INDEX ix_diaries_is_deleted_date (is_deleted, date),
+  INDEX ix_diaries_user_id_is_deleted_updated_at (user_id, is_deleted, updated_at)
 );
 
 CREATE TABLE IF NOT EXISTS images (
   id INT AUTO_INCREMENT PRIMARY KEY,
   diary_id INT NOT NULL,
   uri VARCHAR(255) NOT NULL,
+  variants JSON NULL,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   is_deleted BOOLEAN DEFAULT FALSE,
-  FOREIGN KEY (diary_id) REFERENCES diaries(id)
+  FOREIGN KEY (diary_id) REFERENCES diaries(id),
+  INDEX ix_images_diary_id_is_deleted_updated_at_id (diary_id, is_deleted, updated_at, id),
+  INDEX ix_images_is_deleted_updated_at (is_deleted, updated_at)
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  kind VARCHAR(32) NOT NULL,
+  payload JSON NOT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'queued',
+  attempts INT NOT NULL DEFAULT 0,
+  max_attempts INT NOT NULL DEFAULT 3,
+  run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  locked_until TIMESTAMP NULL,
+  locked_by VARCHAR(64) NULL,
+  last_error TEXT NULL,
+  coalesce_key VARCHAR(64) NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  INDEX ix_jobs_status_run_after (status, run_after),
+  INDEX ix_jobs_status_locked_until (status, locked_until),
+  INDEX ix_jobs_coalesce_key (coalesce_key)
 );
 
+CREATE TABLE IF NOT EXISTS diary_score_cache (
+  cache_key CHAR(64) PRIMARY KEY,
+  model VARCHAR(64) NOT NULL,
+  prompt_version VARCHAR(16) NOT NULL,
+  score INT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS generated_image_cache (
+  cache_key CHAR(64) PRIMARY KEY,
+  source_hash CHAR(64) NOT NULL,
+  bucket INT NOT NULL,
+  model VARCHAR(64) NOT NULL,
+  prompt_version VARCHAR(16) NOT NULL,
+  uri VARCHAR(255) NOT NULL,
+  variants JSON NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX ix_generated_image_cache_source_hash (source_hash)
+);
+
+CREATE TABLE IF NOT EXISTS generation_events (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  diary_id INT NOT NULL,
+  stage VARCHAR(16) NOT NULL,
+  data JSON NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX ix_generation_events_diary_id_id (diary_id, id),
+  INDEX ix_generation_events_created_at (created_at)
+);
+
+CREATE TABLE IF NOT EXISTS cache_versions (
+  scope VARCHAR(64) PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0
+);
+
+-- 適用済みのマイグレーション（db/migrations）。新規作成時は全て適用済み扱い
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version VARCHAR(128) PRIMARY KEY,
+  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT IGNORE INTO schema_migrations (version) VALUES
+  ('001_jobs_and_score_cache'),
+  ('002_composite_indexes'),
+  ('003_current_image_pointers'),
+  ('004_job_coalescing'),
+  ('005_generated_image_cache'),
+  ('006_image_variants'),
+  ('007_generation_events'),
+  ('008_cache_versions');
+
 INSERT INTO items (name) VALUES ('hello'), ('fastapi');
 INSERT INTO users (name, image_url) VALUES ('Alice', 'https://res.cloudinary.com/dj7kgegji/image/upload/v1760238558/young-woman-walking-through-neighborhood_scgxhd.jpg');
 INSERT INTO diaries (user_id, body, score, date) 
@@ -49,4 +125,16 @@ VALUES
   (2, 'https://res.cloudinary.com/dj7kgegji/image/upload/v1760238526/20251012_tagvbs.png'),
   (3, 'https://res.cloudinary.com/dj7kgegji/image/upload/v1760238526/20251013_xar1xq.png'),
   (4, 'https://res.cloudinary.com/dj7kgegji/image/upload/v1760238526/20251014_crdqr4.png'),
-  (5, 'https://res.cloudinary.com/dj7kgegji/image/upload/v1760238527/20251015_bi71dv.png');
\ No newline at end of file
+  (5, 'https://res.cloudinary.com/dj7kgegji/image/upload/v1760238527/20251015_bi71dv.png');
+
+-- サンプルデータの「表示する画像」ポインタを埋める（db/migrations/003 と同じ）
+UPDATE diaries d
+SET d.latest_image_id = (
+      SELECT MAX(i.id) FROM images i WHERE i.diary_id = d.id AND i.is_deleted = FALSE
+    ),
+    d.updated_at = d.updated_at;
+UPDATE users u
+SET u.current_image_id = (
+      SELECT MAX(d.latest_image_id) FROM diaries d WHERE d.user_id = u.id AND d.is_deleted = FALSE
+    ),
+    u.updated_at = u.updated_at;
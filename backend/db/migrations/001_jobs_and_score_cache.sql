@@ -0,0 +1,25 @@
+-- ジョブキュー（jobs）とスコアキャッシュ（diary_score_cache）を追加する
+CREATE TABLE IF NOT EXISTS jobs (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  kind VARCHAR(32) NOT NULL,
+  payload JSON NOT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'queued',
+  attempts INT NOT NULL DEFAULT 0,
+  max_attempts INT NOT NULL DEFAULT 3,
+  run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  locked_until TIMESTAMP NULL,
+  locked_by VARCHAR(64) NULL,
+  last_error TEXT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  INDEX ix_jobs_status_run_after (status, run_after),
+  INDEX ix_jobs_status_locked_until (status, locked_until)
+);
+
+CREATE TABLE IF NOT EXISTS diary_score_cache (
+  cache_key CHAR(64) PRIMARY KEY,
+  model VARCHAR(64) NOT NULL,
+  prompt_version VARCHAR(16) NOT NULL,
+  score INT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,11 @@
+-- 実際のアクセスパスに合わせた複合インデックスを追加する
+--   diaries: 一覧・日付検索 (is_deleted, date) / ユーザーの最新日記 (user_id, is_deleted, updated_at)
+--   images : 日記ごとの最新画像 (diary_id, is_deleted, updated_at, id) / 全体の最新画像
+-- user_id / diary_id の外部キー用インデックスは、先頭が同じ列の複合インデックスで代替される
+ALTER TABLE diaries
+  ADD INDEX ix_diaries_is_deleted_date (is_deleted, date),
+  ADD INDEX ix_diaries_user_id_is_deleted_updated_at (user_id, is_deleted, updated_at);
+
+ALTER TABLE images
+  ADD INDEX ix_images_diary_id_is_deleted_updated_at_id (diary_id, is_deleted, updated_at, id),
+  ADD INDEX ix_images_is_deleted_updated_at (is_deleted, updated_at);
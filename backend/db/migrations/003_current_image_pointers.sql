@@ -0,0 +1,18 @@
+-- 「表示する画像」へのポインタ（app/core/current_image.py が更新する）
+--   diaries.latest_image_id : その日記の論理削除されていない画像のうち id が最大のもの
+--   users.current_image_id  : ユーザーの論理削除されていない日記の latest_image_id の最大
+-- 既存データは下の UPDATE で埋める。大きい表では python -m app.commands.backfill_current_images を使う
+ALTER TABLE diaries ADD COLUMN latest_image_id INT NULL;
+ALTER TABLE users ADD COLUMN current_image_id INT NULL;
+
+UPDATE diaries d
+SET d.latest_image_id = (
+      SELECT MAX(i.id) FROM images i WHERE i.diary_id = d.id AND i.is_deleted = FALSE
+    ),
+    d.updated_at = d.updated_at;
+
+UPDATE users u
+SET u.current_image_id = (
+      SELECT MAX(d.latest_image_id) FROM diaries d WHERE d.user_id = u.id AND d.is_deleted = FALSE
+    ),
+    u.updated_at = u.updated_at;
@@ -0,0 +1,4 @@
+-- 同じ日記の画像生成ジョブをまとめるためのキー（app/core/jobs.py を参照）
+ALTER TABLE jobs
+  ADD COLUMN coalesce_key VARCHAR(64) NULL,
+  ADD INDEX ix_jobs_coalesce_key (coalesce_key);
@@ -0,0 +1,11 @@
+-- スコアのバケットごとの生成画像キャッシュ（app/utils/generated_image_cache.py を参照）
+CREATE TABLE IF NOT EXISTS generated_image_cache (
+  cache_key CHAR(64) PRIMARY KEY,
+  source_hash CHAR(64) NOT NULL,
+  bucket INT NOT NULL,
+  model VARCHAR(64) NOT NULL,
+  prompt_version VARCHAR(16) NOT NULL,
+  uri VARCHAR(255) NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX ix_generated_image_cache_source_hash (source_hash)
+);
@@ -0,0 +1,4 @@
+-- 生成画像の配信用の変種（WebP / AVIF / サムネイル）。app/utils/image_variants.py を参照
+-- 既存の画像は NULL のまま（uri だけで表示する）
+ALTER TABLE images ADD COLUMN variants JSON NULL;
+ALTER TABLE generated_image_cache ADD COLUMN variants JSON NULL;
@@ -0,0 +1,11 @@
+-- 画像生成の進み具合（SSE 用。app/core/events.py を参照）
+-- 古い行は API プロセスが EVENTS_RETENTION_SECONDS を過ぎたら消す
+CREATE TABLE IF NOT EXISTS generation_events (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  diary_id INT NOT NULL,
+  stage VARCHAR(16) NOT NULL,
+  data JSON NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  INDEX ix_generation_events_diary_id_id (diary_id, id),
+  INDEX ix_generation_events_created_at (created_at)
+);
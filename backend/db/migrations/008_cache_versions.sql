@@ -0,0 +1,6 @@
+-- レスポンスキャッシュのバージョン（app/utils/response_cache.py を参照）
+-- 書き込んだプロセス以外（ワーカー・他の API プロセス）のキャッシュも無効にするため DB に置く
+CREATE TABLE IF NOT EXISTS cache_versions (
+  scope VARCHAR(64) PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,80 @@
+"""
+テスト用の DB とクライアント
+
+MySQL がなくても動くよう、同期（pysqlite）・非同期（aiosqlite）のエンジンを
+一時ファイルの SQLite に向けてセッションに結びつける（init_db は呼ばない）。
+"""
+
+import asyncio
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.db
+from app.core import query_stats
+from app.db import AsyncSessionLocal, Base, ReadSessionLocal, SessionLocal
+from app.main import create_app
+from app.models.diary import Diary
+from app.models.image import Image
+from app.models.user import User
+from app.utils.response_cache import response_cache
+
+# シードする日記の件数（N+1 があれば QUERY_N_PLUS_ONE_THRESHOLD 回以上同じ文が出る数）
+SEED_DIARIES = 8
+
+
+@pytest.fixture
+def sqlite_db(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    Base.metadata.create_all(engine)
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    ReadSessionLocal.configure(bind=async_engine)
+    query_stats.install(engine, async_engine.sync_engine)
+    monkeypatch.setattr(app.db, "_engines", (engine, async_engine))
+    yield
+    asyncio.run(async_engine.dispose())
+    engine.dispose()
+
+
+@pytest.fixture
+def seeded(sqlite_db: None) -> list[int]:
+    """ユーザー 1 人・日記 SEED_DIARIES 件（画像 2 件ずつ）を入れて日記の id を返す
+
+    日記の latest_image_id・ユーザーの current_image_id も、ワーカーが保存したときと
+    同じように最新の画像に向けておく（画像のエンドポイントが結合まで通るように）。
+    """
+    with SessionLocal() as db:
+        user = User(name="test", image_url="https://example.com/u.png")
+        db.add(user)
+        db.flush()
+        diaries = [
+            Diary(user_id=user.id, body=f"テストの日記 {i}", score=i, date=20240101 + i)
+            for i in range(SEED_DIARIES)
+        ]
+        db.add_all(diaries)
+        db.flush()
+        for d in diaries:
+            images = [
+                Image(diary_id=d.id, uri=f"https://example.com/{d.id}-{n}.png") for n in range(2)
+            ]
+            db.add_all(images)
+            db.flush()
+            d.latest_image_id = images[-1].id
+        user.current_image_id = diaries[-1].latest_image_id
+        db.commit()
+        return [d.id for d in diaries]
+
+
+@pytest.fixture
+def client(sqlite_db: None) -> Iterator[TestClient]:
+    # lifespan（外部クライアントの初期化）は不要なので with を使わない
+    response_cache.clear()
+    yield TestClient(create_app())
+    response_cache.clear()
@@ -0,0 +1,102 @@
+"""ルーターごとの SQL の件数（@query_budget）と N+1 のチェック"""
+
+import importlib
+import pkgutil
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+import app.api.v1
+from app.api.v1.diaries import read_diary
+from app.core import query_stats
+from app.core.query_stats import (
+    QueryBudgetExceeded,
+    assert_max_queries,
+    budget_of,
+    observe_requests,
+)
+from app.db import SessionLocal
+from app.models.diary import Diary
+from app.utils.response_cache import response_cache
+
+# 予算を付けたルーター関数 → 呼ぶパス
+BUDGETED_PATHS = {
+    "read_diaries": "/api/v1/diaries/?limit=50",
+    "read_diary": "/api/v1/diaries/{diary_id}",
+    "read_diary_by_date": "/api/v1/diaries/date/20240101",
+    "get_latest_image": "/api/v1/images/?user_id=1",
+    "get_latest_image_per_diary": "/api/v1/all_images/",
+}
+
+
+def _get(client: TestClient, path: str) -> None:
+    # レスポンスキャッシュに当たると SQL を発行しないので毎回空にする
+    response_cache.clear()
+    r = client.get(path)
+    # 404 や空の一覧では、予算で守りたい結合まで通らない
+    assert r.status_code == 200, f"{path}: {r.status_code} {r.text}"
+    assert r.content and r.content not in (b"[]", b""), path
+
+
+def test_every_budgeted_route_is_checked() -> None:
+    # 各ルーターのモジュールを直接見る（include_router の後の形は FastAPI の版で違う）
+    budgeted = set()
+    for module in pkgutil.iter_modules(app.api.v1.__path__, f"{app.api.v1.__name__}."):
+        router = getattr(importlib.import_module(module.name), "router", None)
+        for route in getattr(router, "routes", ()):
+            if isinstance(route, APIRoute) and budget_of(route.endpoint) is not None:
+                budgeted.add(route.endpoint.__name__)
+    assert budgeted == set(BUDGETED_PATHS)
+
+
+def test_routes_stay_within_budget(client: TestClient, seeded: list[int]) -> None:
+    with observe_requests() as reports:
+        for path in BUDGETED_PATHS.values():
+            _get(client, path.format(diary_id=seeded[0]))
+
+    assert {r.endpoint for r in reports} == set(BUDGETED_PATHS)
+    for r in reports:
+        assert r.budget is not None
+        assert 0 < r.stats.count <= r.budget, f"{r.label}: {r.stats.count} > {r.budget}"
+
+
+def test_routes_have_no_n_plus_one(client: TestClient, seeded: list[int]) -> None:
+    with observe_requests() as reports:
+        for path in BUDGETED_PATHS.values():
+            _get(client, path.format(diary_id=seeded[0]))
+        _get(client, "/api/v1/diaries/export")
+
+    for r in reports:
+        assert r.stats.duplicates(threshold=2) == [], r.label
+
+
+def test_cached_read_skips_the_database(client: TestClient, seeded: list[int]) -> None:
+    response_cache.clear()
+    with observe_requests() as reports:
+        client.get("/api/v1/diaries/?limit=50")
+        client.get("/api/v1/diaries/?limit=50")
+
+    # 2 回目はバージョンもプロセス内で覚えているので、SQL を 1 件も発行しない
+    assert [r.stats.count for r in reports] == [2, 0]
+
+
+def test_strict_mode_raises_when_over_budget(
+    client: TestClient, seeded: list[int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(query_stats, "QUERY_BUDGET_STRICT", True)
+    monkeypatch.setattr(read_diary, "__query_budget__", 0)
+    with pytest.raises(QueryBudgetExceeded, match="read_diary|diaries"):
+        client.get(f"/api/v1/diaries/{seeded[0]}")
+
+
+def test_assert_max_queries(seeded: list[int]) -> None:
+    with SessionLocal() as db:
+        with assert_max_queries(1) as stats:
+            db.get(Diary, seeded[0])
+        assert stats.count == 1
+
+        with pytest.raises(QueryBudgetExceeded):
+            with assert_max_queries(1):
+                for diary_id in seeded[:2]:
+                    db.get(Diary, diary_id)
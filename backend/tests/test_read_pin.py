@@ -0,0 +1,55 @@
+"""読み取りレプリカの read-your-writes（X-DB-Pin を送り返した読み取りはプライマリで行う）"""
+
+import asyncio
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.core.read_pin
+from app.core.read_pin import PIN_HEADER
+from app.db import Base, ReadSessionLocal
+from app.utils.response_cache import response_cache
+
+
+@pytest.fixture
+def replica(sqlite_db: None, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    """読み取りを空のレプリカ（別の SQLite ファイル）に向ける。まだ何も複製されていない状態"""
+    path = tmp_path / "replica.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    ReadSessionLocal.configure(bind=async_engine)
+    monkeypatch.setattr(app.core.read_pin, "DB_REPLICA_HOST", "replica")
+    yield
+    asyncio.run(async_engine.dispose())
+
+
+def _status(client: TestClient, path: str, headers: dict[str, str] | None = None) -> int:
+    response_cache.clear()
+    return client.get(path, headers=headers).status_code
+
+
+def test_echoed_pin_reads_from_the_primary(
+    replica: None, client: TestClient, seeded: list[int]
+) -> None:
+    r = client.delete(f"/api/v1/diaries/{seeded[-1]}")
+    assert r.status_code == 204, r.text
+    pin = r.headers[PIN_HEADER]
+
+    # クッキーを送らないクロスオリジンの fetch と同じく、ヘッダだけで送り返す
+    client.cookies.clear()
+    path = f"/api/v1/diaries/{seeded[0]}"
+    assert _status(client, path, {PIN_HEADER: pin}) == 200
+    # 送り返さないクライアントはレプリカ（まだ空）から読む
+    assert _status(client, path) == 404
+
+
+def test_reads_do_not_pin(replica: None, client: TestClient, seeded: list[int]) -> None:
+    r = client.get(f"/api/v1/diaries/{seeded[0]}")
+    assert r.status_code == 404
+    assert PIN_HEADER not in r.headers
@@ -0,0 +1,64 @@
+"""レスポンスキャッシュのバージョン（cache_versions）と無効化"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+
+from app.core.query_stats import observe_requests
+from app.db import SessionLocal
+from app.models.cache_version import CacheVersion
+from app.utils.response_cache import (
+    DIARIES_SCOPE,
+    bump_statement,
+    bump_versions_sync,
+    response_cache,
+)
+
+
+def _versions() -> dict[str, int]:
+    with SessionLocal() as db:
+        return {row.scope: row.version for row in db.scalars(select(CacheVersion))}
+
+
+def test_bump_statement_is_an_upsert_for_mysql() -> None:
+    sql = str(bump_statement("mysql", [1, DIARIES_SCOPE]).compile(dialect=mysql.dialect()))
+    assert "ON DUPLICATE KEY UPDATE" in sql
+
+
+def test_bump_creates_then_increments(sqlite_db: None) -> None:
+    with SessionLocal() as db:
+        bump_versions_sync(db, DIARIES_SCOPE, 1)
+        bump_versions_sync(db, DIARIES_SCOPE)
+    assert _versions() == {"diaries": 2, "user:1": 1}
+
+
+def test_write_invalidates_only_the_scopes_it_changes(
+    client: TestClient, seeded: list[int]
+) -> None:
+    before = client.get("/api/v1/diaries/?limit=50").json()
+    assert seeded[0] in [d["id"] for d in before]
+
+    assert client.delete(f"/api/v1/diaries/{seeded[0]}").status_code == 204
+
+    assert _versions() == {"diaries": 1, "images": 1, "user:1": 1}
+    # 同じプロセスで上げたバージョンはすぐ読み直すので、古い一覧は返らない
+    after = client.get("/api/v1/diaries/?limit=50").json()
+    assert seeded[0] not in [d["id"] for d in after]
+
+
+def test_other_process_writes_arrive_once_the_version_expires(
+    client: TestClient, seeded: list[int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # バージョンを覚えておかない（毎回 DB の cache_versions を読む）
+    monkeypatch.setattr(response_cache, "version_ttl", 0)
+    client.get("/api/v1/diaries/?limit=50")
+    with observe_requests() as reports:
+        client.get("/api/v1/diaries/?limit=50")
+        # ワーカーなど別のプロセスが上げた（このプロセスのキャッシュには触らない）
+        with SessionLocal() as db:
+            bump_versions_sync(db, DIARIES_SCOPE)
+        client.get("/api/v1/diaries/?limit=50")
+
+    # ヒットはバージョンの 1 件だけ、上がった後は一覧を読み直す
+    assert [r.stats.count for r in reports] == [1, 2]
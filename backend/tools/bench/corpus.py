@@ -0,0 +1,51 @@
+"""
+合成データの日記の本文
+
+日本語の文の断片を組み合わせて、長さ・語彙が実際の日記に近い本文を作る。
+DB に依存しないので、負荷テストの作成・更新のリクエストからも使う。
+"""
+
+import random
+
+_WHEN = ["朝から", "昼休みに", "仕事の後で", "夕方", "夜遅くまで", "久しぶりに", "週末なので"]
+_WHAT = [
+    "近所の公園を散歩した",
+    "友達とカフェでお茶をした",
+    "溜まっていた洗濯と掃除を片付けた",
+    "新しいレシピでカレーを作った",
+    "図書館で本を三冊借りた",
+    "ジムで一時間走った",
+    "会議の資料をまとめた",
+    "実家に電話をかけた",
+    "電車が遅れて会社に遅刻した",
+    "雨の中を自転車で帰った",
+    "締め切りに追われて残業した",
+    "歯医者に行った",
+]
+_FEEL = [
+    "とても気持ちがよかった。",
+    "思っていたより楽しかった。",
+    "少し疲れたけれど充実していた。",
+    "なんだか気分が晴れなかった。",
+    "体がだるくて何もしたくなかった。",
+    "久しぶりに心から笑った。",
+    "ちょっと落ち込んでしまった。",
+    "いい気分転換になった。",
+]
+_EXTRA = [
+    "空がきれいで写真をたくさん撮った。",
+    "帰り道にコンビニでアイスを買った。",
+    "明日は早起きしようと思う。",
+    "最近よく眠れていない気がする。",
+    "来週の旅行の計画を立て始めた。",
+    "夕飯は簡単にうどんで済ませた。",
+    "肩こりがひどいのでストレッチをした。",
+    "",
+]
+
+
+def make_body(rng: random.Random) -> str:
+    """2〜6 文の日記の本文"""
+    sentences = [f"{rng.choice(_WHEN)}{rng.choice(_WHAT)}。{rng.choice(_FEEL)}"]
+    sentences += [rng.choice(_EXTRA) for _ in range(rng.randint(1, 5))]
+    return "".join(sentences)
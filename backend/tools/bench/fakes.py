@@ -0,0 +1,259 @@
+"""
+Gemini / Cloudinary の偽サーバー
+
+ベンチマークをネットワークにも課金にも触れずに回すための HTTP サーバー。
+1 つのポートで次を受ける。
+
+  - POST /v1beta/models/{model}:generateContent  Gemini（GEMINI_BASE_URL に向ける）
+      画像モデル（名前に "image" を含む）なら PNG を inlineData で、JSON 出力の指定が
+      あれば [{"id", "score"}] を、それ以外はスコアの数字を返す
+  - POST /v1_1/{cloud}/image/upload | destroy   Cloudinary（CLOUDINARY_UPLOAD_PREFIX に向ける）
+  - GET  /media/{name}  アップロードされた画像・ユーザーの元画像（無ければ既定の PNG）
+
+サービスごとに遅延（平均 + 指数分布のばらつき）とエラー率を指定できる。
+Gemini のエラーは 429 / 503、Cloudinary のエラーは 500 を返す。
+
+    python -m tools.bench.fakes --port 9300 --gemini-latency 1.5 --gemini-error-rate 0.05
+"""
+
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email import message_from_bytes
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Any
+
+from PIL import Image
+
+# アップロードを覚えておく件数（超えたら古いものから既定の画像を返す）
+_MEDIA_LIMIT = 256
+
+_GEMINI_PATH = re.compile(r"^/v1(?:beta|alpha)?/models/([^/:]+):generateContent$")
+_CLOUDINARY_PATH = re.compile(r"^/v1_1/[^/]+/image/(upload|destroy)$")
+_BATCH_IDS = re.compile(r'"id":\s*(\d+)')
+
+
+@dataclass
+class Behavior:
+    latency: float = 0.0  # 平均の遅延（秒）
+    error_rate: float = 0.0  # 0〜1
+
+    def delay(self) -> None:
+        if self.latency > 0:
+            # 半分を固定、残りを指数分布にして裾の長い遅延にする
+            time.sleep(self.latency / 2 + random.expovariate(2 / self.latency))
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def _png(size: int = 512) -> bytes:
+    # 一様な画像は圧縮されすぎるので、ノイズにして生成画像に近いバイト数にする
+    img = Image.frombytes("RGB", (size, size), random.Random(0).randbytes(size * size * 3))
+    buf = BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class FakeServices:
+    def __init__(self, gemini: Behavior, cloudinary: Behavior) -> None:
+        self.gemini = gemini
+        self.cloudinary = cloudinary
+        self.image = _png()
+        self.media: OrderedDict[str, bytes] = OrderedDict()
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def store(self, name: str, data: bytes) -> None:
+        with self._lock:
+            self.media[name] = data
+            while len(self.media) > _MEDIA_LIMIT:
+                self.media.popitem(last=False)
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """別スレッドで起動し、ベース URL を返す"""
+        services = self
+
+        class Handler(_Handler):
+            fakes = services
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fakes", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fakes: FakeServices
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status: int, payload: Any) -> None:
+        self._send(status, json.dumps(payload).encode())
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_GET(self) -> None:  # noqa: N802
+        if not self.path.startswith("/media/"):
+            self._send(404, b"")
+            return
+        name = self.path.removeprefix("/media/").split("?")[0]
+        data = self.fakes.media.get(name, self.fakes.image)
+        self.fakes.count("media")
+        self._send(200, data, "image/png" if data is self.fakes.image else "image/webp")
+
+    def do_POST(self) -> None:  # noqa: N802
+        path = self.path.split("?")[0]
+        body = self._body()
+        if m := _GEMINI_PATH.match(path):
+            self._gemini(m.group(1), body)
+        elif m := _CLOUDINARY_PATH.match(path):
+            self._cloudinary(m.group(1), body)
+        else:
+            self._send(404, b"")
+
+    def _gemini(self, model: str, body: bytes) -> None:
+        behavior = self.fakes.gemini
+        self.fakes.count(f"gemini:{model}")
+        behavior.delay()
+        if behavior.fails():
+            status = random.choice((429, 503))
+            self._json(status, {"error": {"code": status, "message": "fake", "status": "FAKE"}})
+            return
+
+        request = json.loads(body or b"{}")
+        if "image" in model:
+            data = base64.b64encode(self.fakes.image).decode()
+            part: dict[str, Any] = {"inlineData": {"mimeType": "image/png", "data": data}}
+        else:
+            config = request.get("generationConfig") or {}
+            if config.get("responseMimeType") == "application/json":
+                prompt = json.dumps(request.get("contents"), ensure_ascii=False)
+                ids = {int(i) for i in _BATCH_IDS.findall(prompt.replace('\\"', '"'))}
+                text = json.dumps([{"id": i, "score": random.randint(-100, 100)} for i in ids])
+            else:
+                text = str(random.randint(-100, 100))
+            part = {"text": text}
+        self._json(
+            200,
+            {
+                "candidates": [
+                    {"content": {"role": "model", "parts": [part]}, "finishReason": "STOP"}
+                ],
+                "modelVersion": model,
+            },
+        )
+
+    def _cloudinary(self, action: str, body: bytes) -> None:
+        behavior = self.fakes.cloudinary
+        self.fakes.count(f"cloudinary:{action}")
+        behavior.delay()
+        if behavior.fails():
+            self._json(500, {"error": {"message": "fake upload failure"}})
+            return
+
+        fields, file = _parse_multipart(self.headers.get("Content-Type", ""), body)
+        if action == "destroy":
+            self._json(200, {"result": "ok"})
+            return
+
+        public_id = fields.get("public_id") or f"bench/{random.getrandbits(64):x}"
+        fmt = fields.get("format") or "webp"
+        width = height = 0
+        if file:
+            try:
+                with Image.open(BytesIO(file)) as img:
+                    width, height = img.size
+            except OSError:
+                pass
+        name = f"{public_id.replace('/', '_')}.{fmt}"
+        self.fakes.store(name, file)
+        host = self.headers.get("Host", "127.0.0.1")
+        url = f"http://{host}/media/{name}"
+        self._json(
+            200,
+            {
+                "public_id": public_id,
+                "secure_url": url,
+                "url": url,
+                "width": width,
+                "height": height,
+                "format": fmt,
+                "bytes": len(file),
+                "resource_type": "image",
+                "version": 1,
+            },
+        )
+
+
+def _parse_multipart(content_type: str, body: bytes) -> tuple[dict[str, str], bytes]:
+    """multipart/form-data をフィールドとファイルに分ける"""
+    if not content_type.startswith("multipart/"):
+        return {}, b""
+    msg = message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body, policy=HTTP)
+    fields: dict[str, str] = {}
+    file = b""
+    for part in msg.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True) or b""
+        if part.get_filename() is not None or name == "file":
+            file = payload
+        elif isinstance(name, str):
+            fields[name] = payload.decode("utf-8", "replace")
+    return fields, file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Gemini and Cloudinary servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9300)
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--cloudinary-latency", type=float, default=0.2)
+    parser.add_argument("--cloudinary-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fakes = FakeServices(
+        Behavior(args.gemini_latency, args.gemini_error_rate),
+        Behavior(args.cloudinary_latency, args.cloudinary_error_rate),
+    )
+    url = fakes.start(args.host, args.port)
+    print(f"GEMINI_BASE_URL={url}")
+    print(f"CLOUDINARY_UPLOAD_PREFIX={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fakes.stop()
+
+
+if __name__ == "__main__":
+    main()
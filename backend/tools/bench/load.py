@@ -0,0 +1,383 @@
+"""
+固定 RPS の負荷テスト
+
+app/api/v1 の各ルーターを 1 つずつ、決まった RPS で --duration 秒呼び続け、
+p50 / p95 / p99 のレイテンシ・スループット・エラー数と、サーバーの最大 RSS を測る。
+送信は完了を待たずに予定時刻どおり行い、レイテンシは予定時刻から数える
+（サーバーが詰まったときに送信が遅れて、遅さが隠れるのを防ぐ）。
+
+    python -m tools.bench.load --rps 50 --duration 20 [--with-worker] \\
+        [--endpoints read_diaries,read_diary] [--baseline bench-results/前回.json]
+
+--url を省くと、偽の Gemini / Cloudinary（tools.bench.fakes）を起動し、それに向けた
+API（uvicorn）を子プロセスで立ち上げる。ネットワークの外には一切出ない。
+--with-worker ならワーカーも起動し、作成・更新で積まれた生成ジョブも偽サーバーで流れる。
+DB は環境変数（DB_*）のものを使うので、先に tools.bench.seed で埋めておくこと。
+
+結果は bench-results/<日時>.json に保存する。--baseline を渡すと前回との差を表示する。
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from tools.bench.corpus import make_body
+from tools.bench.fakes import Behavior, FakeServices
+
+RESULTS_DIR = Path(__file__).resolve().parents[2] / "bench-results"
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+# ベンチマーク中に作る日記の日付（シードや実データと重ならない）
+_CREATE_START = date(9000, 1, 1)
+
+# 本文を作る乱数（--seed で固定する）
+_rng = random.Random(0)
+
+
+@dataclass
+class Context:
+    """シナリオが使う既存データ（開始前に API から集める）"""
+
+    diaries: list[dict[str, Any]]
+    user_ids: list[int]
+    upload: bytes
+    created: list[int] = field(default_factory=list)
+    next_date: int = 0
+    job_id: int | None = None
+
+    def diary(self) -> dict[str, Any]:
+        return random.choice(self.diaries)
+
+    def new_date(self) -> int:
+        self.next_date += 1
+        return int((_CREATE_START + timedelta(days=self.next_date)).strftime("%Y%m%d"))
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str  # ルーター関数の名前
+    method: str
+    build: Callable[[Context], tuple[str, dict[str, Any]]]
+    stream: bool = False  # 最初のチャンクが届くまでを測る（SSE）
+
+
+def _diaries_page(ctx: Context) -> tuple[str, dict[str, Any]]:
+    d = ctx.diary()
+    # カーソルを散らしてレスポンスキャッシュにばかり当たらないようにする
+    cursor = base64.urlsafe_b64encode(f"{d['date']}:{d['id']}".encode()).decode()
+    return f"/api/v1/diaries/?limit=100&cursor={cursor.rstrip('=')}", {}
+
+
+def _create(ctx: Context) -> tuple[str, dict[str, Any]]:
+    return "/api/v1/diaries/", {"json": {"body": make_body(_rng), "date": ctx.new_date()}}
+
+
+def _update(ctx: Context) -> tuple[str, dict[str, Any]]:
+    diary_id = random.choice(ctx.created) if ctx.created else ctx.diary()["id"]
+    return f"/api/v1/diaries/{diary_id}", {"json": {"body": make_body(_rng)}}
+
+
+def _delete(ctx: Context) -> tuple[str, dict[str, Any]]:
+    diary_id = ctx.created.pop() if ctx.created else 0
+    return f"/api/v1/diaries/{diary_id}", {}
+
+
+def _upload(ctx: Context) -> tuple[str, dict[str, Any]]:
+    return "/api/v1/images/", {"files": {"file": ("bench.png", ctx.upload, "image/png")}}
+
+
+def _read_job(ctx: Context) -> tuple[str, dict[str, Any]]:
+    return f"/api/v1/admin/jobs/{ctx.job_id or 0}", {}
+
+
+# 読み取りを先に、書き込みは作成 → 更新 → 削除の順に流す
+SCENARIOS: list[Scenario] = [
+    Scenario("read_diaries", "GET", _diaries_page),
+    Scenario("read_diary", "GET", lambda c: (f"/api/v1/diaries/{c.diary()['id']}", {})),
+    Scenario(
+        "read_diary_by_date", "GET", lambda c: (f"/api/v1/diaries/date/{c.diary()['date']}", {})
+    ),
+    Scenario(
+        "get_latest_image",
+        "GET",
+        lambda c: (f"/api/v1/images/?user_id={random.choice(c.user_ids)}", {}),
+    ),
+    Scenario("get_latest_image_per_diary", "GET", lambda c: ("/api/v1/all_images/", {})),
+    Scenario(
+        "stream_diary_events",
+        "GET",
+        lambda c: (f"/api/v1/diaries/{c.diary()['id']}/events", {}),
+        stream=True,
+    ),
+    Scenario("read_job", "GET", _read_job),
+    Scenario("create_diary", "POST", _create),
+    Scenario("update_diary", "PUT", _update),
+    Scenario("delete_diary", "DELETE", _delete),
+    Scenario("upload_image", "POST", _upload),
+]
+
+
+@dataclass
+class Result:
+    latencies: list[float] = field(default_factory=list)
+    ok: int = 0
+    client_errors: int = 0  # 4xx
+    errors: int = 0  # 5xx / 接続エラー / タイムアウト
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(result: Result, elapsed: float) -> dict[str, Any]:
+    values = sorted(result.latencies)
+    return {
+        "requests": len(values),
+        "ok": result.ok,
+        "client_errors": result.client_errors,
+        "errors": result.errors,
+        "throughput_rps": round(result.ok / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(_percentile(values, 50) * 1000, 2),
+        "p95_ms": round(_percentile(values, 95) * 1000, 2),
+        "p99_ms": round(_percentile(values, 99) * 1000, 2),
+        "max_ms": round((values[-1] if values else 0.0) * 1000, 2),
+    }
+
+
+async def _one(
+    client: httpx.AsyncClient, scenario: Scenario, ctx: Context, scheduled: float, result: Result
+) -> None:
+    path, kwargs = scenario.build(ctx)
+    try:
+        if scenario.stream:
+            async with client.stream(scenario.method, path, **kwargs) as r:
+                async for _ in r.aiter_bytes():
+                    break
+                status = r.status_code
+        else:
+            r = await client.request(scenario.method, path, **kwargs)
+            status = r.status_code
+            if scenario.name == "create_diary" and status == 200:
+                ctx.created.append(r.json()["id"])
+    except httpx.HTTPError:
+        status = 0
+    result.latencies.append(time.perf_counter() - scheduled)
+    if 200 <= status < 400:
+        result.ok += 1
+    elif 400 <= status < 500:
+        result.client_errors += 1
+    else:
+        result.errors += 1
+
+
+async def run_phase(
+    client: httpx.AsyncClient, scenario: Scenario, ctx: Context, rps: float, duration: float
+) -> dict[str, Any]:
+    result = Result()
+    total = int(rps * duration)
+    started = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        scheduled = started + i / rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_one(client, scenario, ctx, scheduled, result)))
+    await asyncio.gather(*tasks)
+    return summarize(result, time.perf_counter() - started)
+
+
+async def prepare(client: httpx.AsyncClient, upload: bytes) -> Context:
+    r = await client.get("/api/v1/diaries/", params={"limit": 500})
+    r.raise_for_status()
+    diaries = r.json()
+    if not diaries:
+        sys.exit("No diaries found. Run `python -m tools.bench.seed` first.")
+    ctx = Context(
+        diaries=diaries,
+        user_ids=sorted({d["user_id"] for d in diaries}),
+        upload=upload,
+        next_date=random.randrange(0, 300_000),
+    )
+    # 末尾より後から始めるので、ワーカーがいても再計算はすぐ終わる
+    last_id = max(d["id"] for d in diaries)
+    r = await client.post(
+        "/api/v1/admin/rescore",
+        json={"after_id": last_id + 10_000_000},
+        headers={"X-Admin-Token": os.getenv("ADMIN_TOKEN", "bench")},
+    )
+    if r.status_code == 202:
+        ctx.job_id = r.json()["id"]
+    return ctx
+
+
+def _peak_rss_mb(pid: int) -> float | None:
+    """プロセスの最大 RSS（Linux の VmHWM）"""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _spawn(args: list[str], env: dict[str, str]) -> subprocess.Popen[bytes]:
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/docs", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    sys.exit(f"API did not become ready at {url}")
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> None:
+    print(f"\n{'endpoint':<28} {'p95 base':>9} {'p95 now':>9} {'change':>8}")
+    for name, now in current["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base or not base["p95_ms"]:
+            continue
+        change = (now["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+        print(f"{name:<28} {base['p95_ms']:>9.1f} {now['p95_ms']:>9.1f} {change:>+7.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fixed-RPS load test for every v1 router")
+    parser.add_argument("--url", help="既に起動している API（省略時は偽サーバーと API を起動）")
+    parser.add_argument("--server-pid", type=int, help="--url のときに RSS を測るプロセス")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--endpoints", help="カンマ区切りのルーター関数名（省略時はすべて）")
+    parser.add_argument("--with-worker", action="store_true")
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--cloudinary-latency", type=float, default=0.2)
+    parser.add_argument("--cloudinary-error-rate", type=float, default=0.0)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--out", type=Path)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    _rng.seed(args.seed)
+
+    selected = set(args.endpoints.split(",")) if args.endpoints else None
+    scenarios = [s for s in SCENARIOS if selected is None or s.name in selected]
+
+    fakes = FakeServices(
+        Behavior(args.gemini_latency, args.gemini_error_rate),
+        Behavior(args.cloudinary_latency, args.cloudinary_error_rate),
+    )
+    fake_url = fakes.start()
+    processes: list[subprocess.Popen[bytes]] = []
+    url = args.url
+    server_pid = args.server_pid
+    if url is None:
+        env = {
+            "GEMINI_API_KEY": "bench",
+            "GEMINI_BASE_URL": fake_url,
+            "CLOUDINARY_UPLOAD_PREFIX": fake_url,
+            "CLOUDINARY_CLOUD_NAME": "bench",
+            "CLOUDINARY_API_KEY": "bench",
+            "CLOUDINARY_API_SECRET": "bench",
+            "ADMIN_TOKEN": os.getenv("ADMIN_TOKEN", "bench"),
+        }
+        server = _spawn(["-m", "uvicorn", "app.main:app", "--port", str(args.port)], env)
+        processes.append(server)
+        server_pid = server.pid
+        if args.with_worker:
+            processes.append(_spawn(["-m", "app.worker"], {**env, "WORKER_METRICS_PORT": "0"}))
+        url = f"http://127.0.0.1:{args.port}"
+        _wait_ready(url)
+
+    async def run() -> dict[str, Any]:
+        limits = httpx.Limits(max_connections=512, max_keepalive_connections=128)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+            ctx = await prepare(client, fakes.image)
+            results = {}
+            for scenario in scenarios:
+                print(f"{scenario.name} ...", flush=True)
+                results[scenario.name] = await run_phase(
+                    client, scenario, ctx, args.rps, args.duration
+                )
+            return results
+
+    try:
+        endpoints = asyncio.run(run())
+    finally:
+        peaks = {p.pid: _peak_rss_mb(p.pid) for p in processes}
+        server_peak = _peak_rss_mb(server_pid) if server_pid else None
+        for p in processes:
+            p.terminate()
+            p.wait(timeout=30)
+        fakes.stop()
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "rps": args.rps,
+            "duration": args.duration,
+            "with_worker": args.with_worker,
+            "gemini": {"latency": args.gemini_latency, "error_rate": args.gemini_error_rate},
+            "cloudinary": {
+                "latency": args.cloudinary_latency,
+                "error_rate": args.cloudinary_error_rate,
+            },
+        },
+        "peak_rss_mb": {
+            "server": server_peak,
+            "worker": peaks.get(processes[1].pid) if len(processes) > 1 else None,
+            "load_generator": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        "fake_calls": dict(sorted(fakes.calls.items())),
+        "endpoints": endpoints,
+    }
+
+    header = f"{'endpoint':<28} {'ok':>6} {'4xx':>5} {'err':>5} {'rps':>7}"
+    print(f"\n{header} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, s in endpoints.items():
+        print(
+            f"{name:<28} {s['ok']:>6} {s['client_errors']:>5} {s['errors']:>5} "
+            f"{s['throughput_rps']:>7.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+            f"{s['p99_ms']:>8.1f}"
+        )
+    print(f"peak RSS (MB): {report['peak_rss_mb']}")
+
+    out = args.out or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Saved {out}")
+    if args.baseline:
+        compare(report, json.loads(args.baseline.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+ベンチマーク用の合成データ
+
+users / diaries / images を指定の件数まで埋める（日記は 100 万件程度まで想定）。
+本文は日本語の文の断片を組み合わせて作るので、長さ・語彙が実際の日記に近い。
+乱数の種を固定しているので、同じ引数なら同じデータになる。
+
+    python -m tools.bench.seed --users 100 --diaries 1000000 --images-per-diary 2 \\
+        --image-base-url http://127.0.0.1:9300/media
+
+  - 既に --diaries 件以上あれば何もしない（足りない分だけ追加する）
+  - 日付は 1000-01-01 から 1 日ずつ（実データ・ベンチマーク中の作成と重ならない）
+  - 画像を入れた後に「表示する画像」ポインタを範囲ごとに計算し直す
+  - 使い捨ての DB で実行すること
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app.core.current_image import backfill_diaries, backfill_users
+from app.db import engine
+from app.models.diary import Diary
+from app.models.image import Image
+from app.models.user import User
+from tools.bench.corpus import make_body
+
+SEED_START = date(1000, 1, 1)
+BENCH_USER_PREFIX = "bench-user-"
+_BATCH = 5000
+
+
+def _ensure_users(n_users: int, image_base_url: str) -> list[int]:
+    with engine.begin() as conn:
+        ids = list(
+            conn.execute(
+                select(User.id).where(User.name.startswith(BENCH_USER_PREFIX)).order_by(User.id)
+            ).scalars()
+        )
+        missing = n_users - len(ids)
+        if missing > 0:
+            conn.execute(
+                insert(User),
+                [
+                    {
+                        "name": f"{BENCH_USER_PREFIX}{len(ids) + i}",
+                        "image_url": f"{image_base_url}/user-{len(ids) + i}.png",
+                    }
+                    for i in range(missing)
+                ],
+            )
+            ids = list(
+                conn.execute(
+                    select(User.id).where(User.name.startswith(BENCH_USER_PREFIX)).order_by(User.id)
+                ).scalars()
+            )
+    return ids[:n_users]
+
+
+def _backfill_pointers(first_diary_id: int, last_diary_id: int) -> None:
+    for first in range(first_diary_id, last_diary_id + 1, _BATCH):
+        with engine.begin() as conn:
+            conn.execute(backfill_diaries(first, min(first + _BATCH - 1, last_diary_id)))
+    with engine.begin() as conn:
+        max_user = conn.execute(select(func.max(User.id))).scalar() or 0
+        conn.execute(backfill_users(1, max_user))
+
+
+def seed(
+    n_users: int,
+    n_diaries: int,
+    images_per_diary: int,
+    image_base_url: str,
+    *,
+    seed_value: int = 0,
+) -> int:
+    """足りない分を追加し、追加した日記の件数を返す"""
+    with engine.connect() as conn:
+        count = conn.execute(select(func.count()).select_from(Diary)).scalar_one()
+        start_id = conn.execute(select(func.coalesce(func.max(Diary.id), 0))).scalar_one()
+    missing = n_diaries - count
+    if missing <= 0:
+        print(f"diaries already has {count} rows")
+        return 0
+
+    user_ids = _ensure_users(n_users, image_base_url)
+    rng = random.Random(seed_value + count)
+    started = time.perf_counter()
+    for offset in range(0, missing, _BATCH):
+        rows = []
+        for i in range(count + offset, count + min(offset + _BATCH, missing)):
+            rows.append(
+                {
+                    "user_id": user_ids[i % len(user_ids)],
+                    "body": make_body(rng),
+                    "score": max(-100, min(100, int(rng.gauss(10, 40)))),
+                    "date": int((SEED_START + timedelta(days=i)).strftime("%Y%m%d")),
+                }
+            )
+        with engine.begin() as conn:
+            conn.execute(insert(Diary), rows)
+        done = offset + len(rows)
+        rate = done / (time.perf_counter() - started)
+        print(f"diaries {done}/{missing} ({rate:.0f} rows/s)")
+
+    with engine.connect() as conn:
+        last_id = conn.execute(select(func.max(Diary.id))).scalar_one()
+
+    if images_per_diary > 0:
+        for first in range(start_id + 1, last_id + 1, _BATCH):
+            images = [
+                {"diary_id": diary_id, "uri": f"{image_base_url}/diary-{diary_id}-{n}.webp"}
+                for diary_id in range(first, min(first + _BATCH, last_id + 1))
+                for n in range(images_per_diary)
+            ]
+            with engine.begin() as conn:
+                conn.execute(insert(Image), images)
+            print(f"images for diaries <= {min(first + _BATCH - 1, last_id)} / {last_id}")
+        _backfill_pointers(start_id + 1, last_id)
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE TABLE users, diaries, images")
+    print(f"Seeded {missing} diaries in {time.perf_counter() - started:.1f}s")
+    return missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed synthetic users, diaries and images")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--diaries", type=int, default=100_000)
+    parser.add_argument("--images-per-diary", type=int, default=2)
+    parser.add_argument("--image-base-url", default="http://127.0.0.1:9300/media")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    seed(
+        args.users,
+        args.diaries,
+        args.images_per_diary,
+        args.image_base_url,
+        seed_value=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+ローカルスコアラーのベンチマーク
+
+評価用の日記（tools/bench/scorer_eval.jsonl。1 行 1 件の {"body", "score"}、
+スコアは -100〜100 を手で付けたもの）に対して、ローカルのスコアラーの精度と速度を
+測る。DB も Gemini も使わない。
+
+評価用の日記は語彙（app/utils/local_score.py の LEXICON）を作るのに使わないこと。
+語彙に評価用の言い回しを足すと、ここの数字は当てにならなくなる。
+
+    python -m tools.bench_scorer [--dataset PATH] [--repeat 200] [--min-sign-accuracy 0.8]
+
+符号の一致率が --min-sign-accuracy を下回ったら終了コード 1（語彙を変えたときの確認用）。
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.utils.local_score import LexiconScorer
+
+EVAL_SET = Path(__file__).resolve().parent / "bench" / "scorer_eval.jsonl"
+
+
+def load_samples(path: Path = EVAL_SET) -> list[tuple[int, str, int]]:
+    """(行番号, body, score) の一覧"""
+    samples = []
+    with path.open(encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                row = json.loads(line)
+                samples.append((line_no, row["body"], int(row["score"])))
+    return samples
+
+
+def _rank(x: np.ndarray) -> np.ndarray:
+    return np.argsort(np.argsort(x)).astype(np.float64)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the local diary scorer")
+    parser.add_argument("--dataset", type=Path, default=EVAL_SET)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--min-sign-accuracy", type=float, default=0.8)
+    args = parser.parse_args()
+
+    samples = load_samples(args.dataset)
+    if not samples:
+        sys.exit(f"No labelled diaries found in {args.dataset}")
+    bodies = [body for _, body, _ in samples]
+    expected = np.array([score for _, _, score in samples], dtype=np.float64)
+
+    started = time.perf_counter()
+    scorer = LexiconScorer()
+    build_ms = (time.perf_counter() - started) * 1000
+
+    predicted = np.array(scorer.score_many(bodies), dtype=np.float64)
+
+    print(f"{'line':>4}  {'label':>6}  {'local':>6}  body")
+    for (line_no, body, score), local in zip(samples, predicted, strict=True):
+        print(f"{line_no:>4}  {score:>6}  {int(local):>6}  {body[:24]}")
+
+    mae = float(np.mean(np.abs(predicted - expected)))
+    sign_accuracy = float(np.mean(np.sign(predicted) == np.sign(expected)))
+    spearman = (
+        float(np.corrcoef(_rank(predicted), _rank(expected))[0, 1]) if len(samples) > 1 else 1.0
+    )
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for body in bodies:
+            scorer.score(body)
+    single_us = (time.perf_counter() - started) / (args.repeat * len(bodies)) * 1e6
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        scorer.score_many(bodies)
+    batch_us = (time.perf_counter() - started) / (args.repeat * len(bodies)) * 1e6
+
+    print()
+    print(f"samples          {len(samples)}")
+    print(f"MAE              {mae:.1f}")
+    print(f"sign accuracy    {sign_accuracy:.2f}")
+    print(f"spearman         {spearman:.2f}")
+    print(f"build weights    {build_ms:.1f} ms")
+    print(f"score (single)   {single_us:.0f} us/diary")
+    print(f"score (batch)    {batch_us:.0f} us/diary")
+
+    if sign_accuracy < args.min_sign_accuracy:
+        print(f"FAIL sign accuracy {sign_accuracy:.2f} < {args.min_sign_accuracy}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
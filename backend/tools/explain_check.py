@@ -0,0 +1,197 @@
+"""
+ルーターが発行する SQL の実行計画チェック
+
+シード済みの DB に対して各エンドポイントを呼び、実際に発行された SELECT / UPDATE を
+すべて `EXPLAIN` にかける。ベーステーブルのフルスキャン（type=ALL）が 1 つでもあれば
+終了コード 1 で失敗する（CI で実行する想定）。全件のインデックススキャン
+（type=index）は警告として表示する。
+
+    python -m tools.explain_check [--seed-diaries 20000] [--with-writes]
+
+件数が少ないとオプティマイザがフルスキャンを選ぶので、足りなければ合成データを
+投入してから確認する（1900 年代の日付で作るので実データとは重ならない）。
+--with-writes を付けると作成・更新・削除も実行するので、使い捨ての DB で行うこと。
+"""
+
+import argparse
+import sys
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, text
+from sqlalchemy.engine import Connection
+
+from app.db import async_engine, engine
+from app.main import app
+from app.models.diary import Diary
+from app.models.image import Image
+from app.models.user import User
+
+_SEED_START = date(1900, 1, 1)
+_BATCH = 1000
+
+
+@dataclass
+class Captured:
+    label: str
+    statement: str
+    parameters: Any
+
+
+@dataclass
+class Report:
+    failures: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+
+
+def seed(n_diaries: int) -> None:
+    """diaries が n_diaries 件に満たなければ、日記 1 件につき画像 2 件で埋める"""
+    with engine.begin() as conn:
+        count = conn.execute(text("SELECT COUNT(*) FROM diaries")).scalar_one()
+        if count >= n_diaries:
+            return
+
+        user_id = conn.execute(text("SELECT id FROM users ORDER BY id LIMIT 1")).scalar()
+        if user_id is None:
+            user_id = conn.execute(
+                insert(User.__table__).values(name="seed", image_url="https://example.com/u.png")
+            ).inserted_primary_key[0]
+
+        start_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM diaries")).scalar_one()
+        missing = n_diaries - count
+        print(f"Seeding {missing} diaries ...")
+        for offset in range(0, missing, _BATCH):
+            rows = [
+                {
+                    "user_id": user_id,
+                    "body": f"シード用の日記 {i}",
+                    "score": (i * 37) % 201 - 100,
+                    "date": int((_SEED_START + timedelta(days=i)).strftime("%Y%m%d")),
+                }
+                for i in range(offset, min(offset + _BATCH, missing))
+            ]
+            conn.execute(insert(Diary.__table__), rows)
+
+        diary_ids = conn.execute(
+            text("SELECT id FROM diaries WHERE id > :start ORDER BY id"), {"start": start_id}
+        ).scalars()
+        images = [
+            {"diary_id": diary_id, "uri": f"https://example.com/{diary_id}-{n}.png"}
+            for diary_id in diary_ids
+            for n in range(2)
+        ]
+        for offset in range(0, len(images), _BATCH):
+            conn.execute(insert(Image.__table__), images[offset : offset + _BATCH])
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE TABLE users, diaries, images")
+
+
+# 今どのエンドポイントを呼んでいるか（キャプチャした SQL に付けるラベル）
+_current_label = ["?"]
+
+
+def run_scenario(client: TestClient, with_writes: bool) -> None:
+    """ルーターを一通り呼ぶ"""
+
+    def call(label: str, method: str, path: str, **kwargs: Any) -> Any:
+        _current_label[0] = label
+        r = client.request(method, path, **kwargs)
+        if r.status_code >= 500:
+            raise RuntimeError(f"{label} {path} -> {r.status_code}: {r.text}")
+        return r
+
+    first = call("read_diaries", "GET", "/api/v1/diaries/?limit=50")
+    cursor = first.headers.get("X-Next-Cursor")
+    if cursor:
+        call("read_diaries(cursor)", "GET", f"/api/v1/diaries/?limit=50&cursor={cursor}")
+    call("read_diaries(range)", "GET", "/api/v1/diaries/?from_date=19100101&to_date=19101231")
+
+    diaries = first.json()
+    if diaries:
+        call("read_diary", "GET", f"/api/v1/diaries/{diaries[0]['id']}")
+        call("read_diary_by_date", "GET", f"/api/v1/diaries/date/{diaries[0]['date']}")
+    call("get_latest_image", "GET", "/api/v1/images/?user_id=1")
+    call("get_latest_image_per_diary", "GET", "/api/v1/all_images/")
+
+    if with_writes:
+        r = call(
+            "create_diary", "POST", "/api/v1/diaries/", json={"body": "explain", "date": 29991231}
+        )
+        if r.status_code == 200:
+            diary_id = r.json()["id"]
+            path = f"/api/v1/diaries/{diary_id}"
+            call("update_diary", "PUT", path, json={"body": "explain 2"})
+            call("delete_diary", "DELETE", path)
+
+
+def explain(captured: list[Captured]) -> Report:
+    report = Report()
+    seen: set[str] = set()
+    with engine.connect() as conn:
+        for c in captured:
+            if c.statement in seen:
+                continue
+            seen.add(c.statement)
+            result = conn.exec_driver_sql("EXPLAIN " + c.statement, c.parameters)
+            for row in result.mappings():
+                table = row.get("table") or ""
+                access = row.get("type")
+                line = (
+                    f"[{c.label}] table={table} type={access} key={row.get('key')} "
+                    f"rows={row.get('rows')}\n    {c.statement.splitlines()[0][:120]}"
+                )
+                if table.startswith("<"):
+                    # 派生テーブル・UNION の結果などは対象外
+                    continue
+                if access == "ALL":
+                    report.failures.append(line)
+                elif access == "index":
+                    report.warnings.append(line)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EXPLAIN every router query")
+    parser.add_argument("--seed-diaries", type=int, default=20000)
+    parser.add_argument("--with-writes", action="store_true")
+    args = parser.parse_args()
+
+    if args.seed_diaries > 0:
+        seed(args.seed_diaries)
+
+    captured: list[Captured] = []
+
+    def _capture(
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append(Captured(_current_label[0], statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _capture)
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        # lifespan（外部クライアントの初期化）は不要なので with を使わない
+        run_scenario(TestClient(app), args.with_writes)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", _capture)
+        event.remove(engine, "before_cursor_execute", _capture)
+
+    report = explain(captured)
+    print(f"Checked {len({c.statement for c in captured})} distinct statements")
+    for w in report.warnings:
+        print(f"WARN full index scan {w}")
+    for f in report.failures:
+        print(f"FAIL full table scan {f}")
+    sys.exit(1 if report.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
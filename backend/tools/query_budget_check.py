@@ -0,0 +1,60 @@
+"""
+ルーターごとの SQL の件数チェック
+
+シード済みの DB に対して tools.explain_check と同じ順に各エンドポイントを呼び、
+1 リクエストで発行した SQL の件数を数える。`@query_budget(n)` を付けたルーター関数が
+n 件を超えるか、どのエンドポイントでも同じ文が QUERY_N_PLUS_ONE_THRESHOLD 回以上
+（N+1）あれば終了コード 1 で失敗する（CI で実行する想定）。
+
+    python -m tools.query_budget_check [--seed-diaries 2000] [--with-writes]
+
+レスポンスキャッシュに当たると SQL を発行しないので、各リクエストの前に空にする。
+--with-writes を付けると作成・更新・削除も実行するので、使い捨ての DB で行うこと。
+"""
+
+import argparse
+import sys
+
+from fastapi.testclient import TestClient
+
+from app.core.query_stats import QUERY_N_PLUS_ONE_THRESHOLD, observe_requests
+from app.main import app
+from app.utils.response_cache import response_cache
+from tools.explain_check import run_scenario, seed
+
+
+class _NoCacheClient(TestClient):
+    def request(self, *args, **kwargs):  # type: ignore[no-untyped-def]
+        response_cache.clear()
+        return super().request(*args, **kwargs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check SQL query counts per router function")
+    parser.add_argument("--seed-diaries", type=int, default=2000)
+    parser.add_argument("--with-writes", action="store_true")
+    args = parser.parse_args()
+
+    if args.seed_diaries > 0:
+        seed(args.seed_diaries)
+
+    with observe_requests() as reports:
+        # lifespan（外部クライアントの初期化）は不要なので with を使わない
+        run_scenario(_NoCacheClient(app), args.with_writes)
+
+    failed = False
+    print(f"{'queries':>7}  {'budget':>6}  {'db ms':>7}  endpoint")
+    for r in reports:
+        budget = "-" if r.budget is None else str(r.budget)
+        print(f"{r.stats.count:>7}  {budget:>6}  {r.stats.seconds * 1000:>7.1f}  {r.label}")
+        if r.over_budget:
+            failed = True
+            print(f"FAIL {r.endpoint} issued {r.stats.count} queries (budget {r.budget})")
+        for statement, n in r.stats.duplicates(QUERY_N_PLUS_ONE_THRESHOLD):
+            failed = True
+            print(f"FAIL possible N+1 in {r.endpoint}: {n}x {statement.splitlines()[0][:120]}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
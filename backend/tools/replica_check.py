@@ -0,0 +1,80 @@
+"""
+読み取りレプリカの振り分けチェック
+
+レプリケーションしていない 2 つの DB（プライマリとレプリカ役）を使い、読み取りの
+エンドポイントがレプリカに向くこと、書き込んだクライアントだけ DB_REPLICA_PIN_SECONDS 秒は
+プライマリに向くこと（自分の書き込みが見える。db_pin クッキーで見分ける）を確かめる。
+
+    DB_REPLICA_HOST=127.0.0.1 DB_REPLICA_PORT=3307 python -m tools.replica_check
+
+  1. プライマリにだけ日記を 1 件入れる
+  2. GET /diaries/{id} → レプリカには無いので 404
+  3. PUT /diaries/{id}（本文は同じ）→ GET は 200（プライマリに固定）
+  4. 書き込んでいない別のクライアントの GET は 404（レプリカのまま）
+  5. 受け取った X-DB-Pin をヘッダで送る（クッキーなし）→ GET は 200
+  6. DB_REPLICA_PIN_SECONDS 秒待つ → GET は再び 404（レプリカに戻る）
+
+入れた日記は最後に消す。失敗したら終了コード 1。
+"""
+
+import sys
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert, select
+
+from app.core.read_pin import PIN_HEADER
+from app.db import DB_REPLICA_HOST, DB_REPLICA_PIN_SECONDS, engine
+from app.main import app
+from app.models.diary import Diary
+from app.models.user import User
+
+# 実データ・他のチェックのシードと重ならない日付
+_CHECK_DATE = 29991231
+
+
+def main() -> None:
+    if not DB_REPLICA_HOST:
+        print("DB_REPLICA_HOST is not set")
+        sys.exit(2)
+
+    body = "replica check"
+    with engine.begin() as conn:
+        user_id = conn.execute(select(User.id).order_by(User.id).limit(1)).scalar_one()
+        conn.execute(delete(Diary).where(Diary.date == _CHECK_DATE))
+        diary_id = conn.execute(
+            insert(Diary).values(user_id=user_id, body=body, score=0, date=_CHECK_DATE)
+        ).inserted_primary_key[0]
+
+    # lifespan（外部クライアントの初期化）は不要なので with を使わない
+    client = TestClient(app)
+    other = TestClient(app)
+    header_only = TestClient(app)
+    url = f"/api/v1/diaries/{diary_id}"
+    steps: list[tuple[str, int, int]] = []
+    try:
+        steps.append(("read before write (replica)", 404, client.get(url).status_code))
+        written = client.put(url, json={"body": body})
+        written.raise_for_status()
+        steps.append(("read after write (primary)", 200, client.get(url).status_code))
+        steps.append(("read from another client (replica)", 404, other.get(url).status_code))
+        pin = {PIN_HEADER: written.headers.get(PIN_HEADER, "")}
+        steps.append(
+            ("read with pin header (primary)", 200, header_only.get(url, headers=pin).status_code)
+        )
+        time.sleep(DB_REPLICA_PIN_SECONDS + 0.5)
+        steps.append(("read after pin expires (replica)", 404, client.get(url).status_code))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(Diary).where(Diary.id == diary_id))
+
+    failed = False
+    for label, expected, actual in steps:
+        ok = expected == actual
+        failed = failed or not ok
+        print(f"{'OK' if ok else 'FAIL'} {label}: expected {expected}, got {actual}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
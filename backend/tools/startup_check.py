@@ -0,0 +1,77 @@
+"""
+起動時間（import）のチェック
+
+`python -X importtime -c "import app.main"` を新しいプロセスで何回か実行し、
+app.main の import にかかった時間（最小値）が予算を超えるか、import の時点で
+読み込まないはずの重い SDK（Gemini・Cloudinary・NumPy・httpx）が読み込まれていたら
+終了コード 1 で失敗する（CI で実行する想定）。DB・外部サービスには接続しない。
+
+    python -m tools.startup_check [--budget-ms 900] [--runs 5] [--top 15]
+
+-X importtime の計測自体で遅くなるので、値は普通に import したときより大きく出る。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# import app.main の時点で読み込まれていてはいけないもの（初めて使うときに読み込む）
+LAZY_MODULES = ("google.genai", "cloudinary", "numpy", "httpx")
+
+
+def measure_imports(module: str) -> dict[str, tuple[int, int]]:
+    """新しいプロセスで module を import し、モジュール名 → (self, cumulative) マイクロ秒"""
+    # DB の接続情報がなくても import できること（検証はエンジンを作るとき）も確かめる
+    env = {k: v for k, v in os.environ.items() if not k.startswith("DB_")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    timings: dict[str, tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # 見出しの行
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the import-time budget of app.main")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=900)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure_imports(args.module) for _ in range(args.runs)]
+    # 最小値を使う（他のプロセスに邪魔された回を除く）
+    best = min(runs, key=lambda t: t[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    print(f"{'self ms':>8}  {'cum ms':>8}  module")
+    slowest = sorted(best.items(), key=lambda kv: kv[1][1], reverse=True)[: args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{self_us / 1000:>8.1f}  {cumulative_us / 1000:>8.1f}  {name}")
+
+    failed = False
+    for name in LAZY_MODULES:
+        if name in best:
+            failed = True
+            print(f"FAIL {name} is imported by {args.module} (import it at first use)")
+    if total_ms > args.budget_ms:
+        failed = True
+        print(f"FAIL import {args.module} took {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    else:
+        print(f"OK import {args.module} took {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
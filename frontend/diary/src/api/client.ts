@@ -0,0 +1,44 @@
+// APIへの fetch（読み取りレプリカの read-your-writes 用）
+//
+// バックエンドは書き込みのレスポンスに、プライマリから読む期限（UNIX 時刻・秒）を
+// X-DB-Pin ヘッダで付ける。クロスオリジンの fetch はクッキーを送らないので、
+// 受け取った値を保存して期限まで毎回ヘッダで送り返す（書いた直後の読み取りがレプリカの遅れで古くならない）。
+
+const PIN_HEADER = 'X-DB-Pin';
+// ページを移動しても残るよう sessionStorage に置く（タブごと）
+const PIN_STORAGE_KEY = 'db_pin';
+
+// 期限の切れていない固定の期限を返す
+function loadPin(): string | null {
+  if (typeof window === 'undefined') return null;
+  const pin = window.sessionStorage.getItem(PIN_STORAGE_KEY);
+  if (!pin) return null;
+  if (Number(pin) * 1000 <= Date.now()) {
+    window.sessionStorage.removeItem(PIN_STORAGE_KEY);
+    return null;
+  }
+  return pin;
+}
+
+function savePin(pin: string): void {
+  if (typeof window === 'undefined') return;
+  window.sessionStorage.setItem(PIN_STORAGE_KEY, pin);
+}
+
+/**
+ * fetch と同じ使い方で、X-DB-Pin の保存と送り返しをする
+ * @param input リクエストのURL
+ * @param init fetch のオプション
+ * @returns レスポンス
+ */
+export async function apiFetch(input: string, init: RequestInit = {}): Promise<Response> {
+  const headers = new Headers(init.headers);
+  const pin = loadPin();
+  if (pin) headers.set(PIN_HEADER, pin);
+
+  const response = await fetch(input, { ...init, headers });
+
+  const newPin = response.headers.get(PIN_HEADER);
+  if (newPin) savePin(newPin);
+  return response;
+}
@@ -1,5 +1,7 @@
 // API関連の型定義とユーティリティ関数
 
+import { apiFetch } from './client';
+
 // APIベースURL（環境変数から取得、デフォルトはローカルFastAPI）
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000';
 
@@ -28,18 +30,26 @@ export interface DiaryEntry {
 // APIから日記一覧を取得
 export async function fetchDiaries(): Promise<DiaryEntry[]> {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/v1/diaries`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-    });
-
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
-    }
+    // 一覧はページング（X-Next-Cursor）されているので最後のページまでたどる
+    const apiData: DiaryApiEntry[] = [];
+    let cursor: string | null = null;
+    do {
+      const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response: Response = await apiFetch(`${API_BASE_URL}/api/v1/diaries${query}`, {
+        method: 'GET',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
 
-    const apiData: DiaryApiEntry[] = await response.json();
+      const page: DiaryApiEntry[] = await response.json();
+      apiData.push(...page);
+      cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
     
     // APIレスポンスを表示用の形式に変換
     return apiData
@@ -87,3 +97,39 @@ export function sortDiariesByDate(diaries: DiaryEntry[], ascending: boolean = fa
 export function getDiaryById(diaries: DiaryEntry[], id: string): DiaryEntry | undefined {
   return diaries.find(diary => diary.id === id);
 }
+
+// 画像生成の進み具合（GET /api/v1/diaries/{id}/events）
+export type GenerationStage = 'queued' | 'scored' | 'generated' | 'uploaded' | 'saved' | 'failed';
+
+export interface GenerationEvent {
+  diary_id: number;
+  stage: GenerationStage;
+  score?: number; // scored
+  image_id?: number; // saved
+  uri?: string; // saved
+  error?: string; // failed
+}
+
+const GENERATION_STAGES: GenerationStage[] = ['queued', 'scored', 'generated', 'uploaded', 'saved', 'failed'];
+
+/**
+ * 日記の画像生成の進み具合を SSE で購読する（saved / failed で自動的に閉じる）
+ * @param diaryId 日記ID
+ * @param onEvent 段階が進むたびに呼ばれる
+ * @returns 購読をやめる関数
+ */
+export function subscribeGenerationEvents(
+  diaryId: number,
+  onEvent: (event: GenerationEvent) => void,
+): () => void {
+  const source = new EventSource(`${API_BASE_URL}/api/v1/diaries/${diaryId}/events`);
+  const handle = (e: MessageEvent) => {
+    const event: GenerationEvent = JSON.parse(e.data);
+    onEvent(event);
+    if (event.stage === 'saved' || event.stage === 'failed') {
+      source.close();
+    }
+  };
+  GENERATION_STAGES.forEach(stage => source.addEventListener(stage, handle));
+  return () => source.close();
+}
@@ -1,6 +1,7 @@
 // 画像API関連の型定義とユーティリティ関数
 
-import { ImageData } from '@/types';
+import { ImageData, ImageVariant } from '@/types';
+import { apiFetch } from '@/api/client';
 
 // APIベースURL（環境変数から取得、デフォルトはローカルFastAPI）
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000';
@@ -11,7 +12,7 @@ const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8
  */
 export async function fetchAllImages(): Promise<ImageData[]> {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/v1/all_images`, {
+    const response = await apiFetch(`${API_BASE_URL}/api/v1/all_images`, {
       method: 'GET',
       headers: {
         'Content-Type': 'application/json',
@@ -55,3 +56,18 @@ export function createImageMapByDiaryId(images: ImageData[]): Map<number, ImageD
   });
   return map;
 }
+
+/**
+ * 指定した形式の変種から srcset を作る（幅の小さい順）
+ * @param image 画像データ
+ * @param format 形式（"webp" / "avif" など）
+ * @param withPrimary 形式が違っても本体（image.uri）を含める（<img> の srcset 用）
+ * @returns srcset 文字列。その形式の変種が無ければ undefined
+ */
+export function buildSrcSet(image: ImageData, format: string, withPrimary = false): string | undefined {
+  const variants = (image.variants ?? [])
+    .filter((v: ImageVariant) => v.format === format || (withPrimary && v.uri === image.uri))
+    .sort((a, b) => a.width - b.width);
+  if (variants.length === 0) return undefined;
+  return variants.map(v => `${v.uri} ${v.width}w`).join(', ');
+}
@@ -5,6 +5,8 @@ import DatePicker from "react-datepicker";
 import "react-datepicker/dist/react-datepicker.css";
 
 import { InputDiaryProps } from "../static";
+import { subscribeGenerationEvents } from "@/api/diaries";
+import { apiFetch } from "@/api/client";
 
 
 
@@ -26,20 +28,21 @@ export default function HomePage({ diary, isEdit }: HomePageProps = { diary: { i
   const defaultDateObj = diary.date ? new Date(diary.date) : today;
   const [date, setDate] = useState<Date>(defaultDateObj);
 
-  // バックエンドから最新の画像を取得
-  const fetchImage = async () => {
-    try {
-      const res = await fetch("http://localhost:8000/api/v1/images/?user_id=1");
-      if (!res.ok) throw new Error("画像取得に失敗しました");
-      const data = await res.json();
-      if (data.image_uri) {
-        setImageUri(data.image_uri);
+  // 画像生成の進み具合を SSE で受け取る（ポーリングしない）
+  const waitForImage = (diaryId: number) => {
+    subscribeGenerationEvents(diaryId, (event) => {
+      if (event.stage === "scored" && typeof event.score === "number") {
+        setScore(event.score);
+      } else if (event.stage === "saved") {
+        if (event.uri) setImageUri(event.uri);
+        setMessage("画像が生成されました！");
+        setIsGenerating(false);
+      } else if (event.stage === "failed") {
+        setMessageType("error");
+        setMessage("画像の生成に失敗しました。");
+        setIsGenerating(false);
       }
-    } catch (err) {
-      console.error(err);
-    } finally {
-      setIsGenerating(false); //  画像取得完了時に生成中フラグをOFF
-    }
+    });
   };
 
   // 日記送信処理
@@ -59,7 +62,7 @@ export default function HomePage({ diary, isEdit }: HomePageProps = { diary: { i
       
       let response;
       if (!isEdit) {
-        response = await fetch("http://localhost:8000/api/v1/diaries", {
+        response = await apiFetch("http://localhost:8000/api/v1/diaries", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
@@ -68,7 +71,7 @@ export default function HomePage({ diary, isEdit }: HomePageProps = { diary: { i
           }),
         });
       } else {
-        response = await fetch(`http://localhost:8000/api/v1/diaries/${diary.id}`, {
+        response = await apiFetch(`http://localhost:8000/api/v1/diaries/${diary.id}`, {
           method: "PUT",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
@@ -88,8 +91,8 @@ export default function HomePage({ diary, isEdit }: HomePageProps = { diary: { i
       //  スコアを受け取る場合
       if (typeof data.score === "number") setScore(data.score);
 
-      //  日記送信後に画像を再取得
-      await fetchImage();
+      //  日記送信後、画像ができるまで進み具合を購読
+      waitForImage(data.id);
     } catch (error) {
       console.error(error);
       setMessageType("error");
@@ -1,5 +1,7 @@
 // API関連の型定義とユーティリティ関数
 
+import { apiFetch } from '@/api/client';
+
 // APIベースURL（環境変数から取得、デフォルトはローカルFastAPI）
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000';
 
@@ -28,18 +30,26 @@ export interface DiaryEntry {
 // APIから日記一覧を取得
 export async function fetchDiaries(): Promise<DiaryEntry[]> {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/v1/diaries`, {
-      method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-    });
+    // 一覧はページング（X-Next-Cursor）されているので最後のページまでたどる
+    const apiData: DiaryApiEntry[] = [];
+    let cursor: string | null = null;
+    do {
+      const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response: Response = await apiFetch(`${API_BASE_URL}/api/v1/diaries${query}`, {
+        method: 'GET',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+      });
 
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
-    }
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
 
-    const apiData: DiaryApiEntry[] = await response.json();
+      const page: DiaryApiEntry[] = await response.json();
+      apiData.push(...page);
+      cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
     
     // APIレスポンスを表示用の形式に変換
     return apiData
@@ -8,6 +8,7 @@ import { DiaryEntry, fetchDiaries, getDiaryDates, sortDiariesByDate } from './ap
 import { InputDiaryForm } from '../utils';
 import { Diary } from '../static';
 import { formatDateToSimpleJapanese } from '../../utils/dateFormat';
+import { apiFetch } from '@/api/client';
 
 
 // int型日付をYYYY-MM-DD文字列に変換
@@ -34,7 +35,7 @@ export default function DiariesPage() {
       return;
     }
     try {
-      const res = await fetch(`http://localhost:8000/api/v1/diaries/date/${date}`, {
+      const res = await apiFetch(`http://localhost:8000/api/v1/diaries/date/${date}`, {
         method: "GET",
       });
 
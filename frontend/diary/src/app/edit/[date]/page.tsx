@@ -4,6 +4,7 @@ import { useParams } from "next/navigation";
 import { use, useEffect, useState } from "react";
 import HomePage from "../../create/page";
 import { Diary } from "../../static";
+import { apiFetch } from "@/api/client";
 
 function intToDateString(dateInt: number): string {
   const s = dateInt.toString();
@@ -21,7 +22,7 @@ export default function EditPage() {
      
     const fetchDiary = async () => {
       try {
-        const res = await fetch(`http://localhost:8000/api/v1/diaries/date/${date}`, {
+        const res = await apiFetch(`http://localhost:8000/api/v1/diaries/date/${date}`, {
           method: "GET",
         });
 
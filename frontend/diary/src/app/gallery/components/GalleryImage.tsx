@@ -1,6 +1,9 @@
 import React from 'react';
-import Image from 'next/image';
 import { ImageData } from '@/types';
+import { buildSrcSet } from '@/api/images';
+
+// 画面幅の半分ほどで表示する
+const IMAGE_SIZES = '(max-width: 768px) 100vw, 50vw';
 
 interface Props {
   imageData?: ImageData | null;
@@ -12,14 +15,18 @@ export default function GalleryImage({ imageData }: Props) {
       <div className="aspect-square bg-gray-200 rounded-lg flex items-center justify-center border-4 border-gray-300 overflow-hidden">
         {imageData ? (
           <div className="relative w-full h-full">
-            <Image
-              src={imageData.uri}
-              alt="日記の画像"
-              fill
-              className="object-contain"
-              sizes="(max-width: 768px) 100vw, 50vw"
-              priority
-            />
+            {/* 表示サイズに合うサムネイルをブラウザに選ばせる（AVIF に対応していれば AVIF） */}
+            <picture>
+              <source type="image/avif" srcSet={buildSrcSet(imageData, 'avif')} sizes={IMAGE_SIZES} />
+              <img
+                src={imageData.uri}
+                srcSet={buildSrcSet(imageData, 'webp', true)}
+                sizes={IMAGE_SIZES}
+                alt="日記の画像"
+                className="absolute inset-0 w-full h-full object-contain"
+                fetchPriority="high"
+              />
+            </picture>
           </div>
         ) : (
           <div className="text-center">
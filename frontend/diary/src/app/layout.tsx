@@ -7,6 +7,7 @@ import { ChevronDown } from "lucide-react";
 import { devUserImage } from "./static";
 import Image from "next/image";
 import icon from "@/public/logo/logo.png"; // 変更
+import { apiFetch } from "@/api/client";
 
 type ImageResponse = {
   uri: string;
@@ -38,7 +39,7 @@ function Header() {
   useEffect(() => {
     const fetchImage = async () => {
       try {
-        const res = await fetch(`http://localhost:8000/api/v1/images?user_id=1`, { method: "GET" });
+        const res = await apiFetch(`http://localhost:8000/api/v1/images?user_id=1`, { method: "GET" });
         if (!res.ok) throw new Error("画像取得に失敗しました");
 
         // 画像のURLを生成（Blob → object URL）
@@ -1,6 +1,7 @@
 "use client";
 
 import { useState } from "react";
+import { apiFetch } from "@/api/client";
 
 export default function UploadPage() {
   const [name, setName] = useState("");
@@ -29,7 +30,7 @@ export default function UploadPage() {
     formData.append("email", email);
 
     try {
-      const response = await fetch("http://localhost:8000/api/v1/images", {
+      const response = await apiFetch("http://localhost:8000/api/v1/images", {
         method: "POST",
         body: formData,
       });
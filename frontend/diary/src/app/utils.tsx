@@ -2,6 +2,7 @@
 
 import { useState } from "react";
 import { InputDiaryProps } from "./static";
+import { apiFetch } from "@/api/client";
 
 export async function getDiaryByDate(date: string): Promise<string> {
   try {
@@ -63,7 +64,7 @@ export function InputDiaryForm({diary, isEdit, writeDiaryDate, onSuccess}: Input
       
       let response;
       if (!isEdit) {
-        response = await fetch("http://localhost:8000/api/v1/diaries", {
+        response = await apiFetch("http://localhost:8000/api/v1/diaries", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
@@ -72,7 +73,7 @@ export function InputDiaryForm({diary, isEdit, writeDiaryDate, onSuccess}: Input
           }),
         });
       } else {
-        response = await fetch(`http://localhost:8000/api/v1/diaries/${diary.id}`, {
+        response = await apiFetch(`http://localhost:8000/api/v1/diaries/${diary.id}`, {
           method: "PUT",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
@@ -8,9 +8,19 @@ export interface DiaryEntry {
   createdAt: string;
 }
 
+// 画像の配信用の変種（形式・サイズ違い）
+export interface ImageVariant {
+  uri: string;
+  format: string; // "webp" | "avif" | "jpeg"
+  width: number;
+  height: number;
+  bytes: number;
+}
+
 // 画像データの型定義（APIレスポンス）
 export interface ImageData {
   uri: string;
+  variants?: ImageVariant[] | null; // 古い画像は無い（uri だけ）
   id: number;
   user_id: number;
   diary_id: number;